@@ -0,0 +1,113 @@
+"""
+Measure how HttpCompressionMiddleware decompresses brotli response bodies
+
+A brotli bomb (a small body that inflates to a huge one) is decompressed with
+a DOWNLOAD_MAXSIZE limit, and the time and the peak memory traced by
+tracemalloc until the limit is hit are reported. With brotli >= 1.2.0 the
+output of each decompression call is bounded, so the limit is hit after a few
+64 KiB chunks; older brotli versions inflate each 64 KiB of input at once,
+which is also measured, by decompressing without an output limit.
+
+A normal document is also decompressed without a limit, and compared with a
+one-shot brotli.decompress() call, to show the cost of decompressing in
+chunks. The same is done for a big deflate body with _inflate() and
+zlib.decompress().
+
+usage:
+
+    python decompressionbench.py [bomb size in MiB] [max size in MiB]
+
+Each time is the best of 5 runs.
+
+"""
+import sys
+import tracemalloc
+import zlib
+from time import time
+
+import brotli
+
+from scrapy.utils._compression import (
+    _brotli_output_is_bounded,
+    _check_max_size,
+    _CHUNK_SIZE,
+    _DecompressionMaxSizeExceeded,
+    _inflate,
+    _unbrotli,
+)
+
+
+def document(rows=12000):
+    rows = ''.join(f'<tr><td>{i}</td><td>item {i * 7919 % 10007}</td></tr>' for i in range(rows))
+    return f'<html><body><table>{rows}</table></body></html>'.encode()
+
+
+def bomb(bomb_size):
+    return brotli.compress(b'\0' * bomb_size, quality=11)
+
+
+def unbounded_unbrotli(data, *, max_size=0):
+    # what _unbrotli does with brotli < 1.2.0
+    decompressor = brotli.Decompressor()
+    output = bytearray()
+    for start in range(0, len(data), _CHUNK_SIZE):
+        output += decompressor.process(data[start:start + _CHUNK_SIZE])
+        _check_max_size(len(output), max_size)
+    return bytes(output)
+
+
+def decompress_bomb(unbrotli, data, max_size):
+    try:
+        unbrotli(data, max_size=max_size)
+    except _DecompressionMaxSizeExceeded:
+        pass
+    else:
+        raise AssertionError("the bomb did not exceed the maximum size")
+
+
+def best_of(runs, func, *args):
+    times = []
+    for _ in range(runs):
+        start = time()
+        func(*args)
+        times.append(time() - start)
+    return min(times)
+
+
+def main():
+    bomb_size = int(sys.argv[1]) if len(sys.argv) > 1 else 500
+    max_size = int(sys.argv[2]) if len(sys.argv) > 2 else 1
+    data = bomb(bomb_size * 1024 * 1024)
+    max_size *= 1024 * 1024
+    print(f"brotli {brotli.__version__}, output bounded: {_brotli_output_is_bounded()}")
+
+    print(f"bomb of {len(data)} B -> {bomb_size} MiB, max size {max_size // 1024 // 1024} MiB:")
+    for name, unbrotli in (('unbounded output', unbounded_unbrotli), ('_unbrotli', _unbrotli)):
+        elapsed = best_of(5, decompress_bomb, unbrotli, data, max_size)
+        tracemalloc.start()
+        decompress_bomb(unbrotli, data, max_size)
+        _, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+        print(f"  {name:<17} {elapsed * 1000:>8.2f} ms {peak / 1024 / 1024:>8.1f} MiB peak")
+
+    body = document()
+    data = brotli.compress(body)
+    assert _unbrotli(data) == body
+    chunked = best_of(5, _unbrotli, data)
+    oneshot = best_of(5, brotli.decompress, data)
+    print(f"document of {len(data)} B -> {len(body)} B:")
+    print(f"  {'_unbrotli':<17} {chunked * 1000:>8.2f} ms")
+    print(f"  {'brotli.decompress':<17} {oneshot * 1000:>8.2f} ms")
+
+    body = document(2000000)
+    data = zlib.compress(body)
+    assert _inflate(data) == body
+    chunked = best_of(5, _inflate, data)
+    oneshot = best_of(5, zlib.decompress, data)
+    print(f"deflate body of {len(data)} B -> {len(body)} B:")
+    print(f"  {'_inflate':<17} {chunked * 1000:>8.2f} ms")
+    print(f"  {'zlib.decompress':<17} {oneshot * 1000:>8.2f} ms")
+
+
+if __name__ == '__main__':
+    main()
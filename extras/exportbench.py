@@ -0,0 +1,85 @@
+"""
+Measure how many items per second the item exporters serialize, using the
+same items as tests/test_exporters.py
+
+usage:
+
+    python exportbench.py [items] [format ...]
+
+Formats are jsonlines (the default), jsonlines-utf8, jsonlines-orjson (both
+with the utf-8 encoding, which the orjson backend requires), json, csv, xml and
+parquet; items defaults to 1000000.
+
+"""
+import sys
+from dataclasses import make_dataclass, field
+from datetime import datetime
+from io import BytesIO
+from time import time
+
+from scrapy.exporters import (
+    CsvItemExporter, JsonItemExporter, JsonLinesItemExporter, ParquetItemExporter,
+    XmlItemExporter,
+)
+from scrapy.item import Field, Item
+
+
+class TestItem(Item):
+    name = Field()
+    age = Field()
+
+
+class CustomFieldItem(Item):
+    name = Field()
+    age = Field(serializer=lambda value: str(int(value) + 2))
+
+
+TestDataClass = make_dataclass("TestDataClass", [("name", str), ("age", int)])
+CustomFieldDataclass = make_dataclass(
+    "CustomFieldDataclass",
+    [("name", str), ("age", int, field(metadata={"serializer": lambda value: str(int(value) + 2)}))]
+)
+
+ITEMS = {
+    'dict': lambda i: {'name': f'John\xa3 {i}', 'age': '22'},
+    'nonstring dict': lambda i: {'boolean': False, 'number': i, 'time': datetime(2015, 1, 1, 1, 1, 1),
+                                 'float': 3.14},
+    'Item': lambda i: TestItem(name=f'John\xa3 {i}', age='22'),
+    'Item with serializer': lambda i: CustomFieldItem(name=f'John\xa3 {i}', age='22'),
+    'dataclass': lambda i: TestDataClass(name=f'John\xa3 {i}', age=22),
+    'dataclass with serializer': lambda i: CustomFieldDataclass(name=f'John\xa3 {i}', age=22),
+}
+
+EXPORTERS = {
+    'jsonlines': lambda f: JsonLinesItemExporter(f),
+    'jsonlines-utf8': lambda f: JsonLinesItemExporter(f, encoding='utf-8'),
+    'jsonlines-orjson': lambda f: JsonLinesItemExporter(f, encoding='utf-8', backend='orjson'),
+    'json': lambda f: JsonItemExporter(f),
+    'csv': lambda f: CsvItemExporter(f),
+    'xml': lambda f: XmlItemExporter(f),
+    'parquet': lambda f: ParquetItemExporter(f),
+}
+
+
+def bench(exporter_factory, items):
+    exporter = exporter_factory(BytesIO())
+    start = time()
+    exporter.start_exporting()
+    for item in items:
+        exporter.export_item(item)
+    exporter.finish_exporting()
+    return len(items) / (time() - start)
+
+
+def main():
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 1000000
+    formats = sys.argv[2:] or ['jsonlines']
+    for item_type, make_item in ITEMS.items():
+        items = [make_item(i) for i in range(count)]
+        for format in formats:
+            rate = bench(EXPORTERS[format], items)
+            print(f"{format:<18} {item_type:<26} {rate:>10.0f} items/s")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,68 @@
+"""
+Measure how long the reactor thread spends exporting items, and how long it
+takes until the feed is stored, with and without FEED_EXPORT_ASYNC, for each
+built-in exporter
+
+Items are scraped in chunks of 100, with the reactor waiting 5ms between
+chunks, as it would for the network in a crawl.
+
+usage:
+
+    python feedexportbench.py [items] [format ...]
+
+"""
+import os
+import sys
+import tempfile
+from time import time
+
+from twisted.internet import defer, reactor, task
+from w3lib.url import path_to_file_uri
+
+from scrapy.extensions.feedexport import FeedExporter
+from scrapy.spiders import Spider
+from scrapy.utils.test import get_crawler
+
+
+FORMATS = ['jsonlines', 'json', 'csv', 'xml', 'pickle', 'marshal']
+CHUNK_SIZE = 100
+
+
+@defer.inlineCallbacks
+def bench(format, count, async_):
+    path = tempfile.mktemp()
+    crawler = get_crawler(settings_dict={
+        'FEEDS': {path_to_file_uri(path): {'format': format}},
+        'FEED_EXPORT_ASYNC': async_,
+    })
+    spider = Spider('feedexportbench')
+    exporter = FeedExporter.from_crawler(crawler)
+    exporter.open_spider(spider)
+    items = [{'name': f'John\xa3 {i}', 'age': '22', 'tags': ['a', 'b']} for i in range(count)]
+    start = time()
+    in_reactor = 0
+    for i in range(0, count, CHUNK_SIZE):
+        chunk_start = time()
+        for item in items[i:i + CHUNK_SIZE]:
+            exporter.item_scraped(item, spider)
+        in_reactor += time() - chunk_start
+        yield task.deferLater(reactor, 0.005, lambda: None)
+    yield exporter.close_spider(spider)
+    stored = time() - start
+    os.remove(path)
+    return in_reactor, stored
+
+
+@defer.inlineCallbacks
+def main():
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 100000
+    formats = sys.argv[2:] or FORMATS
+    for format in formats:
+        for async_ in (False, True):
+            in_reactor, stored = yield bench(format, count, async_)
+            print(f"{format:<10} {'async' if async_ else 'sync':<6} "
+                  f"{in_reactor * 1e6 / count:>6.1f} us/item in the reactor, stored in {stored:.2f}s")
+
+
+if __name__ == '__main__':
+    task.react(lambda _: main())
@@ -0,0 +1,90 @@
+"""
+Compare scrapy.utils.gz.gunzip with a GzipFile based gunzip
+
+The GzipFile based function is the implementation that gunzip() had before
+it parsed gzip headers itself and inflated the members with
+zlib.decompressobj. Both are run on the gzip files of
+tests/sample_data/compressed, many times, and on a big synthetic payload.
+
+usage:
+
+    python gunzipbench.py [fixture rounds] [payload size in MB]
+
+Each time is the best of 5 runs.
+
+"""
+import os
+import struct
+import sys
+from gzip import GzipFile, compress
+from io import BytesIO
+from time import time
+
+from scrapy.utils._compression import _CHUNK_SIZE
+from scrapy.utils.gz import gunzip
+
+
+SAMPLES_DIR = os.path.join(os.path.dirname(__file__), '..', 'tests', 'sample_data', 'compressed')
+
+
+def gzipfile_gunzip(data):
+    f = GzipFile(fileobj=BytesIO(data))
+    output_list = []
+    chunk = b'.'
+    while chunk:
+        try:
+            chunk = f.read1(_CHUNK_SIZE)
+            output_list.append(chunk)
+        except (IOError, EOFError, struct.error):
+            if output_list or getattr(f, 'extrabuf', None):
+                try:
+                    output_list.append(f.extrabuf[-f.extrasize:])
+                finally:
+                    break
+            else:
+                raise
+    return b''.join(output_list)
+
+
+def samples():
+    result = []
+    for name in sorted(os.listdir(SAMPLES_DIR)):
+        if name.endswith('.gz') or name == 'html-gzip.bin':
+            with open(os.path.join(SAMPLES_DIR, name), 'rb') as f:
+                result.append(f.read())
+    return result
+
+
+def gunzip_all(func, datas, rounds):
+    for _ in range(rounds):
+        for data in datas:
+            func(data)
+
+
+def best_of(runs, *args):
+    times = []
+    for _ in range(runs):
+        start = time()
+        gunzip_all(*args)
+        times.append(time() - start)
+    return min(times)
+
+
+def main():
+    rounds = int(sys.argv[1]) if len(sys.argv) > 1 else 2000
+    size = int(sys.argv[2]) if len(sys.argv) > 2 else 100
+    fixtures = samples()
+    line = b'<tr><td>%d</td><td>some text for the table cell</td></tr>\n'
+    payload = b''.join(line % i for i in range(size * 1000 * 1000 // len(line % 0)))
+    payload = [compress(payload)]
+    for data in fixtures + payload:
+        assert gunzip(data) == gzipfile_gunzip(data)
+    print(f"{len(fixtures)} fixtures x {rounds}, {size} MB payload")
+    for name, func in (('GzipFile', gzipfile_gunzip), ('gunzip', gunzip)):
+        fixtures_time = best_of(5, func, fixtures, rounds)
+        payload_time = best_of(5, func, payload, 1)
+        print(f"{name:<10} {fixtures_time:>6.2f} s {payload_time:>6.2f} s")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,100 @@
+"""
+Measure how many items per second go through a CPU-heavy item pipeline when
+it runs in the reactor thread, in a thread pool and in a process pool
+
+Items are fed to the pipelines as Scraper.handle_spider_output does, at most
+CONCURRENT_ITEMS (100) at a time per response. The tokenize-batch pipeline
+does the same work as tokenize through process_items, to show how batches
+amortize the cost of sending items to the pools.
+
+usage:
+
+    python pipelinebench.py [items] [workers]
+
+"""
+import hashlib
+import sys
+from time import time
+
+from twisted.internet import defer, task
+
+from scrapy.pipelines import ItemPipelineManager
+from scrapy.spiders import Spider
+from scrapy.utils.defer import parallel
+
+
+CONCURRENT_ITEMS = 100
+ITEMS_PER_RESPONSE = 1000
+
+
+class TokenizePipeline:
+    """Pure Python text processing, which holds the GIL"""
+
+    def process_item(self, item, spider):
+        words = [word.strip('.,') for word in item['text'].lower().split()]
+        item['ngrams'] = [len(set(zip(*(words[i:] for i in range(n))))) for n in range(1, 6)]
+        return item
+
+
+class BatchTokenizePipeline(TokenizePipeline):
+
+    def process_items(self, items, spider):
+        return [self.process_item(item, spider) for item in items]
+
+
+class HashPipeline:
+    """Hashing, which releases the GIL"""
+
+    def process_item(self, item, spider):
+        item['hash'] = hashlib.pbkdf2_hmac('sha256', item['text'].encode(), b'salt', 2000).hex()
+        return item
+
+
+PIPELINES = {
+    'tokenize': {
+        'reactor': TokenizePipeline,
+        'thread': type('ThreadTokenizePipeline', (TokenizePipeline,), {'offload': 'thread'}),
+        'process': type('ProcessTokenizePipeline', (TokenizePipeline,), {'offload': 'process'}),
+    },
+    'tokenize-batch': {
+        'reactor': BatchTokenizePipeline,
+        'thread': type('ThreadBatchTokenizePipeline', (BatchTokenizePipeline,), {'offload': 'thread'}),
+        'process': type('ProcessBatchTokenizePipeline', (BatchTokenizePipeline,), {'offload': 'process'}),
+    },
+    'hash': {
+        'reactor': HashPipeline,
+        'thread': type('ThreadHashPipeline', (HashPipeline,), {'offload': 'thread'}),
+        'process': type('ProcessHashPipeline', (HashPipeline,), {'offload': 'process'}),
+    },
+}
+
+
+@defer.inlineCallbacks
+def bench(pipeline, count, workers):
+    spider = Spider('pipelinebench')
+    manager = ItemPipelineManager(pipeline, batch_max_linger=0, offload_workers=workers)
+    yield manager.open_spider(spider)
+    text = 'Lorem ipsum dolor sit amet, consectetur adipiscing elit. ' * 50
+    start = time()
+    responses = []
+    for i in range(0, count, ITEMS_PER_RESPONSE):
+        items = ({'id': j, 'text': text} for j in range(i, min(count, i + ITEMS_PER_RESPONSE)))
+        responses.append(parallel(items, CONCURRENT_ITEMS, manager.process_item, spider))
+    yield defer.DeferredList(responses)
+    rate = count / (time() - start)
+    yield manager.close_spider(spider)
+    return rate
+
+
+@defer.inlineCallbacks
+def main():
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 20000
+    workers = int(sys.argv[2]) if len(sys.argv) > 2 else None
+    for name, pipelines in PIPELINES.items():
+        for offload, pipeline_cls in pipelines.items():
+            rate = yield bench(pipeline_cls(), count, workers)
+            print(f"{name:<16} {offload:<8} {rate:>10.0f} items/s")
+
+
+if __name__ == '__main__':
+    task.react(lambda _: main())
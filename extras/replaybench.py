@@ -0,0 +1,72 @@
+"""
+A spider that fills an HTTP cache with generated pages and replays it, to
+measure how many pages per second can be parsed from the cache
+
+usage:
+
+    scrapy runspider replaybench.py --loglevel=INFO -s HTTPCACHE_REPLAY=True \
+        -s HTTPCACHE_STORAGE=scrapy.extensions.httpcache.SqliteCacheStorage -a pages=10000
+
+Any HTTPCACHE_STORAGE can be used. The cache is written to a temporary
+directory that is removed when the spider is closed.
+
+"""
+import shutil
+import tempfile
+from time import time
+
+from scrapy.http import HtmlResponse, Request
+from scrapy.spiders import Spider
+from scrapy.utils.misc import load_object
+
+
+class ReplayBenchSpider(Spider):
+
+    name = 'replaybench'
+    custom_settings = {
+        'HTTPCACHE_ENABLED': True,
+        'HTTPCACHE_DIR': tempfile.mkdtemp(),
+        'HTTPCACHE_IGNORE_MISSING': True,
+        'LOGSTATS_INTERVAL': 1,
+    }
+    # number of cached pages
+    pages = 10000
+    # approximate size in bytes of each cached page
+    size = 20000
+
+    @classmethod
+    def from_crawler(cls, crawler, *args, **kwargs):
+        spider = super().from_crawler(crawler, *args, **kwargs)
+        spider.pages = int(spider.pages)
+        spider.size = int(spider.size)
+        spider.fill_cache()
+        return spider
+
+    def fill_cache(self):
+        settings = self.crawler.settings
+        storage = load_object(settings['HTTPCACHE_STORAGE'])(settings)
+        storage.open_spider(self)
+        paragraph = b'<p>Lorem ipsum dolor sit amet, consectetur adipiscing elit.</p>'
+        body = b'<html><body>' + paragraph * (self.size // len(paragraph)) + b'</body></html>'
+        for url in self.urls():
+            response = HtmlResponse(url, body=body, headers={'Content-Type': 'text/html'})
+            storage.store_response(self, Request(url), response)
+        storage.close_spider(self)
+
+    def urls(self):
+        for i in range(self.pages):
+            yield f'http://replaybench.example/{i}'
+
+    def start_requests(self):
+        self.started = time()
+        for url in self.urls():
+            yield Request(url, dont_filter=True)
+
+    def parse(self, response):
+        yield {'url': response.url, 'size': len(response.body)}
+
+    def closed(self, reason):
+        elapsed = time() - self.started
+        self.logger.info("Replayed %(pages)d pages in %(elapsed).2fs (%(rate).0f pages/s)",
+                         {'pages': self.pages, 'elapsed': elapsed, 'rate': self.pages / elapsed})
+        shutil.rmtree(self.settings['HTTPCACHE_DIR'])
@@ -0,0 +1,86 @@
+"""
+Measure the overhead that the spider middlewares of SPIDER_MIDDLEWARES_BASE
+add to each element (item or request) that a spider callback returns
+
+The overhead is the time it takes to go through the output of
+SpiderMiddlewareManager.scrape_response, minus the time it takes to go
+through the callback output directly. It is measured for a manager without
+middlewares, which shows the cost of the chain itself, and for the default
+middlewares.
+
+usage:
+
+    python spidermwbench.py [elements]
+
+Each measure is the best of 5 runs.
+
+"""
+import sys
+from time import time
+
+from twisted.internet import defer, task
+
+from scrapy.core.spidermw import SpiderMiddlewareManager
+from scrapy.http import HtmlResponse, Request
+from scrapy.spiders import Spider
+from scrapy.utils.test import get_crawler
+
+
+OUTPUTS = {
+    'items': lambda i: {'id': i, 'name': f'item {i}'},
+    'requests': lambda i: Request(f'https://example.com/page/{i}'),
+}
+
+
+def get_manager(settings_dict, spider):
+    crawler = get_crawler(Spider, settings_dict)
+    manager = SpiderMiddlewareManager.from_crawler(crawler)
+    for mw in manager.middlewares:
+        if hasattr(mw, 'spider_opened'):
+            mw.spider_opened(spider)
+    return manager
+
+
+@defer.inlineCallbacks
+def bench(manager, make_output, count, spider):
+    request = Request('https://example.com/')
+    response = HtmlResponse('https://example.com/', body=b'<html></html>', request=request)
+    outputs = [make_output(i) for i in range(count)]
+
+    def scrape_func(response, request, spider):
+        return (output for output in outputs)
+
+    if manager is None:
+        result = scrape_func(response, request, spider)
+    else:
+        result = yield manager.scrape_response(scrape_func, response, request, spider)
+    start = time()
+    for _ in result:
+        pass
+    return time() - start
+
+
+@defer.inlineCallbacks
+def best_of(runs, *args):
+    times = []
+    for _ in range(runs):
+        elapsed = yield bench(*args)
+        times.append(elapsed)
+    return min(times)
+
+
+@defer.inlineCallbacks
+def main():
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 100000
+    spider = Spider('spidermwbench', allowed_domains=['example.com'])
+    empty = get_manager({'SPIDER_MIDDLEWARES_BASE': {}}, spider)
+    default = get_manager({}, spider)
+    for name, make_output in OUTPUTS.items():
+        baseline = yield best_of(5, None, make_output, count, spider)
+        for stack, manager in (('no middlewares', empty), ('default', default)):
+            elapsed = yield best_of(5, manager, make_output, count, spider)
+            print(f"{name:<10} {stack:<16} {(elapsed - baseline) * 1e6 / count:>6.2f} us/element")
+
+
+if __name__ == '__main__':
+    task.react(lambda _: main())
@@ -0,0 +1,97 @@
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
+from time import time
+
+from scrapy.commands import ScrapyCommand
+from scrapy.exceptions import UsageError
+from scrapy.spiders import Spider
+from scrapy.utils.httpobj import urlparse_cached
+from scrapy.utils.misc import load_object
+
+
+class Command(ScrapyCommand):
+
+    requires_project = False
+    default_settings = {'LOG_ENABLED': False,
+                        'SPIDER_LOADER_WARN_ONLY': True}
+
+    def syntax(self):
+        return "[options] [spider ...]"
+
+    def short_desc(self):
+        return "Inspect and clean up the HTTP cache"
+
+    def long_desc(self):
+        return ("Report the number and size of the responses in the HTTP cache of "
+                "the given spiders (all of them by default), per spider and domain. "
+                "Expired responses are those older than HTTPCACHE_EXPIRATION_SECS, "
+                "uncacheable ones are those that HTTPCACHE_POLICY would not cache.")
+
+    def add_options(self, parser):
+        ScrapyCommand.add_options(self, parser)
+        parser.add_option("--delete-expired", action="store_true",
+                          help="delete expired responses")
+        parser.add_option("--delete-uncacheable", action="store_true",
+                          help="delete uncacheable responses")
+        parser.add_option("--compact", action="store_true",
+                          help="reclaim the space of deleted responses, if the storage supports it")
+
+    def run(self, args, opts):
+        storagecls = load_object(self.settings['HTTPCACHE_STORAGE'])
+        if not hasattr(storagecls, 'iter_entries'):
+            raise UsageError(f"{self.settings['HTTPCACHE_STORAGE']} does not support "
+                             f"listing its cached responses", print_help=False)
+        names = storagecls(self.settings).spider_names()
+        if args:
+            # opening the storage of a spider without a cache would create one
+            missing = [name for name in args if name not in names]
+            if missing:
+                raise UsageError(f"No HTTP cache found for: {', '.join(missing)}", print_help=False)
+            names = args
+        with ThreadPoolExecutor() as executor:
+            results = list(executor.map(lambda name: self._process_spider(name, opts), names))
+
+        row = "{:<20} {:<30} {:>10} {:>14} {:>10} {:>12}"
+        print(row.format('spider', 'domain', 'responses', 'bytes', 'expired', 'uncacheable'))
+        totals = [0, 0, 0, 0]
+        deleted = 0
+        for name, domains, spider_deleted in results:
+            for domain, counts in sorted(domains.items()):
+                print(row.format(name, domain, *counts))
+                totals = [a + b for a, b in zip(totals, counts)]
+            deleted += spider_deleted
+        print(row.format('total', '', *totals))
+        if opts.delete_expired or opts.delete_uncacheable:
+            print(f"Deleted {deleted} responses")
+
+    def _process_spider(self, name, opts):
+        storage = load_object(self.settings['HTTPCACHE_STORAGE'])(self.settings)
+        policy = load_object(self.settings['HTTPCACHE_POLICY'])(self.settings)
+        expiration_secs = self.settings.getint('HTTPCACHE_EXPIRATION_SECS')
+        spider = Spider(name)
+        # domain -> [responses, bytes, expired, uncacheable]
+        domains = defaultdict(lambda: [0, 0, 0, 0])
+        to_delete = []
+        now = time()
+        storage.open_spider(spider)
+        try:
+            for key, timestamp, size, request, response in storage.iter_entries(spider):
+                counts = domains[urlparse_cached(request).hostname or '']
+                counts[0] += 1
+                counts[1] += size
+                if 0 < expiration_secs < now - timestamp:
+                    counts[2] += 1
+                    if opts.delete_expired:
+                        to_delete.append(key)
+                elif (not policy.should_cache_request(request)
+                        or not policy.should_cache_response(response, request)):
+                    counts[3] += 1
+                    if opts.delete_uncacheable:
+                        to_delete.append(key)
+            if to_delete:
+                storage.delete_entries(spider, to_delete)
+            if opts.compact and hasattr(storage, 'compact'):
+                storage.compact()
+        finally:
+            storage.close_spider(spider)
+        return name, domains, len(to_delete)
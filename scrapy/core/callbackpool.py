@@ -0,0 +1,152 @@
+"""
+Run spider callbacks in a pool of worker processes
+
+See documentation in docs/topics/spiders.rst
+"""
+import multiprocessing
+import pickle
+from concurrent.futures import ProcessPoolExecutor
+
+from scrapy.http import Request
+from scrapy.spiders import Spider
+from scrapy.utils.defer import deferred_from_concurrent_future
+from scrapy.utils.misc import load_object
+from scrapy.utils.reqser import request_from_dict, request_to_dict
+from scrapy.utils.spider import iterate_spider_output
+
+
+# spider of the current process, when it is a worker of the pool
+_worker_spider = None
+
+# spider attributes that are only available in the main process
+_MAIN_PROCESS_ATTRIBUTES = ('crawler', 'settings')
+
+
+def _picklable(value):
+    try:
+        pickle.dumps(value)
+    except Exception:
+        return False
+    return True
+
+
+def _spider_state(spider):
+    return {
+        name: value for name, value in vars(spider).items()
+        if name not in _MAIN_PROCESS_ATTRIBUTES and _picklable(value)
+    }
+
+
+def _spider_arguments(args, kwargs):
+    return (
+        tuple(value if _picklable(value) else None for value in args),
+        {name: value for name, value in kwargs.items() if _picklable(value)},
+    )
+
+
+def _init_worker(spidercls, args, kwargs, state):
+    global _worker_spider
+    _worker_spider = spidercls(*args, **kwargs)
+    _worker_spider.__dict__.update(state)
+
+
+def _serialize_request(request, spider):
+    d = request_to_dict(request, spider)
+    d['meta'] = {key: value for key, value in d['meta'].items() if _picklable(value)}
+    return d
+
+
+def _serialize_response(response, spider):
+    d = {
+        'cls': response.__module__ + '.' + response.__class__.__name__,
+        'url': response.url,
+        'status': response.status,
+        'headers': dict(response.headers),
+        'body': response.body,
+        'flags': response.flags,
+        'request': _serialize_request(response.request, spider),
+    }
+    if hasattr(response, 'encoding'):
+        d['encoding'] = response.encoding
+    return d
+
+
+def _deserialize_response(d, spider):
+    kwargs = {'encoding': d['encoding']} if 'encoding' in d else {}
+    return load_object(d['cls'])(
+        url=d['url'],
+        status=d['status'],
+        headers=d['headers'],
+        body=d['body'],
+        flags=d['flags'],
+        request=request_from_dict(d['request'], spider),
+        **kwargs
+    )
+
+
+def _run_callback(callback_name, response_dict):
+    """Run a spider callback in a worker process, and return its output with
+    requests as dicts"""
+    spider = _worker_spider
+    response = _deserialize_response(response_dict, spider)
+    callback = getattr(spider, callback_name)
+    output = []
+    for result in iterate_spider_output(callback(response, **response.request.cb_kwargs)):
+        if isinstance(result, Request):
+            result = ('request', _serialize_request(result, spider))
+        else:
+            result = ('output', result)
+        output.append(result)
+    return output
+
+
+class CallbackPool:
+    """Pool of worker processes that run the spider callbacks listed in the
+    ``offloaded_callbacks`` attribute of the spider"""
+
+    def __init__(self, spider, max_workers=None, spider_args=(), spider_kwargs=None):
+        self.spider = spider
+        self.callbacks = frozenset(getattr(spider, 'offloaded_callbacks', ()))
+        self.executor = None
+        if self.callbacks:
+            # spiders are created again in the worker processes, with the
+            # arguments that can be pickled, and get the attributes of the
+            # spider but not its crawler. Workers are spawned instead of
+            # forked, forking a process that runs the reactor is not safe.
+            args, kwargs = _spider_arguments(spider_args, spider_kwargs or {})
+            self.executor = ProcessPoolExecutor(
+                max_workers, mp_context=multiprocessing.get_context('spawn'),
+                initializer=_init_worker,
+                initargs=(type(spider), args, kwargs, _spider_state(spider)))
+
+    def _get_callback_name(self, callback):
+        if getattr(callback, '__self__', None) is not self.spider:
+            return None
+        name = callback.__name__
+        if name == '_parse' and getattr(type(self.spider), '_parse', None) is Spider._parse:
+            # requests without a callback, which Spider._parse sends to parse
+            name = 'parse'
+        return name
+
+    def offloads(self, callback):
+        """Return True if ``callback`` has to run in the pool"""
+        return self.executor is not None and self._get_callback_name(callback) in self.callbacks
+
+    def call(self, response, callback):
+        """Run ``callback`` with ``response`` in a worker process and return a
+        Deferred that fires with the list of its results"""
+        response_dict = _serialize_response(response, self.spider)
+        future = self.executor.submit(_run_callback, self._get_callback_name(callback), response_dict)
+        dfd = deferred_from_concurrent_future(future)
+        dfd.addCallback(self._deserialize_output)
+        return dfd
+
+    def _deserialize_output(self, output):
+        return [
+            request_from_dict(value, self.spider) if kind == 'request' else value
+            for kind, value in output
+        ]
+
+    def close(self):
+        if self.executor is not None:
+            self.executor.shutdown()
@@ -8,10 +8,44 @@ from twisted.internet import defer
 from scrapy.exceptions import _InvalidOutput
 from scrapy.http import Request, Response
 from scrapy.middleware import MiddlewareManager
-from scrapy.utils.defer import mustbe_deferred, deferred_from_coro
+from scrapy.utils.defer import deferred_from_coro
 from scrapy.utils.conf import build_component_list
 
 
+def _run_chain(chain):
+    """Run a generator that yields the results of middleware methods and
+    returns the output of the chain
+
+    Results are sent back to the generator right away as long as they are
+    plain values, so that no Deferred is created for them. Once a method
+    returns a Deferred or a coroutine, the rest of the chain runs through
+    _run_chain_async and a Deferred is returned.
+    """
+    result = None
+    try:
+        while True:
+            result = chain.send(result)
+            # most methods return one of these, which are cheaper to check
+            # than whether the result is awaitable
+            if result is None or isinstance(result, (Request, Response)):
+                continue
+            result = deferred_from_coro(result)
+            if isinstance(result, defer.Deferred):
+                return _run_chain_async(chain, result)
+    except StopIteration as e:
+        return e.value
+
+
+@defer.inlineCallbacks
+def _run_chain_async(chain, deferred):
+    result = yield deferred
+    try:
+        while True:
+            result = yield deferred_from_coro(chain.send(result))
+    except StopIteration as e:
+        return e.value
+
+
 class DownloaderMiddlewareManager(MiddlewareManager):
 
     component_name = 'downloader middleware'
@@ -29,56 +63,72 @@ class DownloaderMiddlewareManager(MiddlewareManager):
         if hasattr(mw, 'process_exception'):
             self.methods['process_exception'].appendleft(mw.process_exception)
 
-    def download(self, download_func, request, spider): # 这里的 download_func 实际就是downloader的_enqueue_request
-        @defer.inlineCallbacks
-        def process_request(request):
-            for method in self.methods['process_request']:
-                response = yield deferred_from_coro(method(request=request, spider=spider)) # 这个deferred_from_coro方法是将 middleware的方法 从 asyncio 转化为 recator方法 并yield出去
-                if response is not None and not isinstance(response, (Response, Request)):
-                    raise _InvalidOutput(
-                        f"Middleware {method.__self__.__class__.__name__}"
-                        ".process_request must return None, Response or "
-                        f"Request, got {response.__class__.__name__}"
-                    )
-                if response:
-                    return response
-            return (yield download_func(request=request, spider=spider))
-
-        @defer.inlineCallbacks
-        def process_response(response):
-            if response is None:
-                raise TypeError("Received None in process_response")
-            elif isinstance(response, Request):
+    def _process_request(self, request, spider):
+        for method in self.methods['process_request']:
+            response = yield method(request=request, spider=spider)
+            if response is not None and not isinstance(response, (Response, Request)):
+                raise _InvalidOutput(
+                    f"Middleware {method.__self__.__class__.__name__}"
+                    ".process_request must return None, Response or "
+                    f"Request, got {response.__class__.__name__}"
+                )
+            if response:
                 return response
 
-            for method in self.methods['process_response']:
-                response = yield deferred_from_coro(method(request=request, response=response, spider=spider))
-                if not isinstance(response, (Response, Request)):
-                    raise _InvalidOutput(
-                        f"Middleware {method.__self__.__class__.__name__}"
-                        ".process_response must return Response or Request, "
-                        f"got {type(response)}"
-                    )
-                if isinstance(response, Request):
-                    return response
+    def _process_response(self, response, request, spider):
+        if response is None:
+            raise TypeError("Received None in process_response")
+        elif isinstance(response, Request):
             return response
 
-        @defer.inlineCallbacks
+        for method in self.methods['process_response']:
+            response = yield method(request=request, response=response, spider=spider)
+            if not isinstance(response, (Response, Request)):
+                raise _InvalidOutput(
+                    f"Middleware {method.__self__.__class__.__name__}"
+                    ".process_response must return Response or Request, "
+                    f"got {type(response)}"
+                )
+            if isinstance(response, Request):
+                return response
+        return response
+
+    def _process_exception(self, failure, request, spider):
+        exception = failure.value
+        for method in self.methods['process_exception']:
+            response = yield method(request=request, exception=exception, spider=spider)
+            if response is not None and not isinstance(response, (Response, Request)):
+                raise _InvalidOutput(
+                    f"Middleware {method.__self__.__class__.__name__}"
+                    ".process_exception must return None, Response or "
+                    f"Request, got {type(response)}"
+                )
+            if response:
+                return response
+        return failure
+
+    def download(self, download_func, request, spider): # 这里的 download_func 实际就是downloader的_enqueue_request
+        def process_request_output(response):
+            if response is None:
+                return download_func(request=request, spider=spider)
+            return response
+
+        def process_response(response):
+            return _run_chain(self._process_response(response, request, spider))
+
         def process_exception(failure):
-            exception = failure.value
-            for method in self.methods['process_exception']:
-                response = yield deferred_from_coro(method(request=request, exception=exception, spider=spider))
-                if response is not None and not isinstance(response, (Response, Request)):
-                    raise _InvalidOutput(
-                        f"Middleware {method.__self__.__class__.__name__}"
-                        ".process_exception must return None, Response or "
-                        f"Request, got {type(response)}"
-                    )
-                if response:
-                    return response
-            return failure
-
-        deferred = mustbe_deferred(process_request, request) #类似于maybedeffered 但是不在这轮次里 运行callback 和 errback
+            return _run_chain(self._process_exception(failure, request, spider))
+
+        try:
+            result = _run_chain(self._process_request(request, spider))
+            if isinstance(result, defer.Deferred):
+                result.addCallback(process_request_output)
+            else:
+                result = process_request_output(result)
+        except Exception:
+            deferred = defer.fail()
+        else:
+            deferred = result if isinstance(result, defer.Deferred) else defer.succeed(result)
         deferred.addErrback(process_exception)
         deferred.addCallback(process_response)
         return deferred
@@ -2,16 +2,18 @@
 extracts information from them"""
 
 import logging
+import sys
 from collections import deque
 
-from itemadapter import is_item
-from twisted.internet import defer
+from itemadapter import ItemAdapter, is_item
+from twisted.internet import defer, task
 from twisted.python.failure import Failure
 
 from scrapy import signals
+from scrapy.core.callbackpool import CallbackPool
 from scrapy.core.spidermw import SpiderMiddlewareManager
 from scrapy.exceptions import CloseSpider, DropItem, IgnoreRequest
-from scrapy.http import Request, Response
+from scrapy.http import Request, Response, TextResponse
 from scrapy.utils.defer import defer_fail, defer_succeed, iter_errback, parallel
 from scrapy.utils.log import failure_to_exc_info, logformatter_adapter
 from scrapy.utils.misc import load_object, warn_on_generator_with_return_value
@@ -20,56 +22,126 @@ from scrapy.utils.spider import iterate_spider_output
 
 logger = logging.getLogger(__name__)
 
+def _object_size(obj, depth=0):
+    """Estimate the memory used by ``obj``, following containers down to a
+    few levels"""
+    size = sys.getsizeof(obj)
+    if depth < 3:
+        if isinstance(obj, dict):
+            size += sum(_object_size(value, depth + 1) for value in obj.values())
+        elif isinstance(obj, (list, tuple, set, frozenset)):
+            size += sum(_object_size(value, depth + 1) for value in obj)
+    return size
+
+
+def _item_size(item):
+    """Estimate the memory used by a scraped item"""
+    return sys.getsizeof(item) + sum(_object_size(value) for value in ItemAdapter(item).values())
+
+
 # 内部数据处理类
 class Slot:
     """Scraper slot (one per running spider)"""
 
     MIN_RESPONSE_SIZE = 1024
+    # an lxml tree takes from 3 (text-heavy pages) to 20 (markup-heavy
+    # pages) times the size of the HTML it was parsed from
+    SELECTOR_SIZE_FACTOR = 8
 
-    def __init__(self, max_active_size=5000000):
+    def __init__(self, max_active_size=5000000, max_itemproc_size=0):
         self.max_active_size = max_active_size
+        self.max_itemproc_size = max_itemproc_size
         self.queue = deque()
         self.active = set()
+        # estimated size of each response being processed, by request
+        self.response_sizes = {}
         self.active_size = 0
         self.itemproc_size = 0
+        self.active_size_peak = 0
+        self.itemproc_size_peak = 0
         self.closing = None
+        # callables that return True while a component downstream, e.g. a
+        # feed writer, cannot keep up with the scraped items
+        self.backout_checks = []
+
+    def _response_size(self, response):
+        if not isinstance(response, Response):
+            return self.MIN_RESPONSE_SIZE
+        size = max(len(response.body), self.MIN_RESPONSE_SIZE)
+        if isinstance(response, TextResponse):
+            if response._cached_ubody is not None:
+                size += sys.getsizeof(response._cached_ubody)
+            if response._cached_selector is not None:
+                size += len(response.body) * self.SELECTOR_SIZE_FACTOR
+        return size
+
+    def _add_size(self, size):
+        self.active_size += size
+        if self.active_size > self.active_size_peak:
+            self.active_size_peak = self.active_size
     # 将respond 以(response, request, deferred) 格式压入self.queue
     def add_response_request(self, response, request):
         deferred = defer.Deferred()
         self.queue.append((response, request, deferred))
-        if isinstance(response, Response):
-            self.active_size += max(len(response.body), self.MIN_RESPONSE_SIZE)
-        else:
-            self.active_size += self.MIN_RESPONSE_SIZE
+        size = self.response_sizes[request] = self._response_size(response)
+        self._add_size(size)
         return deferred
     # 取出(response, request, deferred) 并将 request 加入到 self.active
     def next_response_request_deferred(self):
         response, request, deferred = self.queue.popleft()
         self.active.add(request)
         return response, request, deferred
+
+    def update_response(self, response, request):
+        """Account for the text and the selector of ``response`` once the
+        spider has decoded or parsed it"""
+        size = self._response_size(response)
+        previous = self.response_sizes.get(request, size)
+        if size != previous:
+            self.response_sizes[request] = size
+            self._add_size(size - previous)
     # 从self.active里移出 request 从 self.active_size中移出对应size
     def finish_response(self, response, request):
         self.active.remove(request)
-        if isinstance(response, Response):
-            self.active_size -= max(len(response.body), self.MIN_RESPONSE_SIZE)
-        else:
-            self.active_size -= self.MIN_RESPONSE_SIZE
+        self.active_size -= self.response_sizes.pop(request)
+
+    def add_item(self, item):
+        """Account for an item entering the item pipelines, and return its
+        estimated size"""
+        size = _item_size(item)
+        self.itemproc_size += 1
+        if self.itemproc_size > self.itemproc_size_peak:
+            self.itemproc_size_peak = self.itemproc_size
+        self._add_size(size)
+        return size
+
+    def finish_item(self, result, size):
+        self.itemproc_size -= 1
+        self.active_size -= size
+        return result
     # que 和 active 都为空 就是闲着
     def is_idle(self):
         return not (self.queue or self.active)
     # 当内部存的值已经大于定义的最大值
     def needs_backout(self):
-        return self.active_size > self.max_active_size
+        return (
+            self.active_size > self.max_active_size
+            or 0 < self.max_itemproc_size < self.itemproc_size
+            or any(check() for check in self.backout_checks)
+        )
 
 
 class Scraper:
     # 在engine初始化的时候 就将这个scraper初始化
     def __init__(self, crawler):
         self.slot = None #不同于 engine里的slot 这里主要处理返回的respond 和 request
+        self.callback_pool = None
+        self.slot_stats_task = None
         self.spidermw = SpiderMiddlewareManager.from_crawler(crawler)
         itemproc_cls = load_object(crawler.settings['ITEM_PROCESSOR'])
         self.itemproc = itemproc_cls.from_crawler(crawler) # 生成 ITEM_PROCESSOR 类实例
         self.concurrent_items = crawler.settings.getint('CONCURRENT_ITEMS') # 同时处理item个数
+        self.replay = crawler.settings.getbool('HTTPCACHE_REPLAY')
         self.crawler = crawler
         self.signals = crawler.signals
         self.logformatter = crawler.logformatter
@@ -77,17 +149,57 @@ class Scraper:
     @defer.inlineCallbacks
     def open_spider(self, spider):
         """Open the given spider for scraping and allocate resources for it"""
-        self.slot = Slot(self.crawler.settings.getint('SCRAPER_SLOT_MAX_ACTIVE_SIZE')) #从setting中 拿到slot最大处理空间设置（缓存设置）
+        self.slot = Slot(
+            self.crawler.settings.getint('SCRAPER_SLOT_MAX_ACTIVE_SIZE'),
+            self.crawler.settings.getint('SCRAPER_SLOT_MAX_ITEMPROC_SIZE'),
+        )
+        interval = self.crawler.settings.getfloat('SCRAPER_SLOT_STATS_INTERVAL')
+        if interval:
+            self.slot_stats_task = task.LoopingCall(self._log_slot_stats, spider)
+            self.slot_stats_task.start(interval, now=False)
+        args, kwargs = self.crawler.spider_arguments
+        self.callback_pool = CallbackPool(
+            spider, self.crawler.settings.getint('SPIDER_CALLBACK_WORKERS') or None,
+            spider_args=args, spider_kwargs=kwargs)
         yield self.itemproc.open_spider(spider) #调起 处理item的 .open_spider方法
 
     def close_spider(self, spider):
         """Close a spider being scraped and release its resources"""
         slot = self.slot
         slot.closing = defer.Deferred()
+        slot.closing.addCallback(self._close_slot_stats)
+        slot.closing.addCallback(self._close_callback_pool)
         slot.closing.addCallback(self.itemproc.close_spider)
         self._check_if_closing(spider, slot)
         return slot.closing
 
+    def _record_slot_stats(self, spider):
+        slot = self.slot
+        stats = self.crawler.stats
+        stats.max_value('scraper/slot/active_size_max', slot.active_size_peak, spider=spider)
+        stats.max_value('scraper/slot/itemproc_size_max', slot.itemproc_size_peak, spider=spider)
+
+    def _log_slot_stats(self, spider):
+        slot = self.slot
+        self._record_slot_stats(spider)
+        logger.debug(
+            "Scraper slot: %(responses)d responses and %(items)d items in "
+            "progress, %(active_size)d bytes (limit %(max_active_size)d)",
+            {'responses': len(slot.queue) + len(slot.active), 'items': slot.itemproc_size,
+             'active_size': slot.active_size, 'max_active_size': slot.max_active_size},
+            extra={'spider': spider},
+        )
+
+    def _close_slot_stats(self, spider):
+        if self.slot_stats_task and self.slot_stats_task.running:
+            self.slot_stats_task.stop()
+        self._record_slot_stats(spider)
+        return spider
+
+    def _close_callback_pool(self, spider):
+        self.callback_pool.close()
+        return spider
+
     def is_idle(self):
         """Return True if there isn't any more spiders to process"""
         return not self.slot
@@ -95,6 +207,9 @@ class Scraper:
     def _check_if_closing(self, spider, slot):
         if slot.closing and slot.is_idle():
             slot.closing.callback(spider)
+        elif slot.closing and hasattr(self.itemproc, 'flush_batches'):
+            # do not keep the spider open while items wait for a batch to fill up
+            self.itemproc.flush_batches()
     ###### response 实际的处理入口 也就是数据的实际返回后处理的位置 在 engine._handle_downloader_output 被 engine._next_request_from_scheduler 这块加入到request的回调链路里
     def enqueue_scrape(self, response, request, spider): # 这里的response 实际上是一个deferred对象
         slot = self.slot
@@ -147,8 +262,16 @@ class Scraper:
                 result.request = request
             callback = result.request.callback or spider._parse # 从request对象里面拿到 对应的callback 否则传入spider的_parse函数作为callback
             warn_on_generator_with_return_value(spider, callback)
-            dfd = defer_succeed(result)
-            dfd.addCallback(callback, **result.request.cb_kwargs)# 将spider的callback 添加到 deferred的回调链路上
+            if self._is_replayed(result):
+                dfd = defer.succeed(result)
+            else:
+                dfd = defer_succeed(result)
+            if self.callback_pool is not None and self.callback_pool.offloads(callback):
+                # responses stay in slot.active meanwhile, so that
+                # SCRAPER_SLOT_MAX_ACTIVE_SIZE limits how many are waiting
+                dfd.addCallback(self.callback_pool.call, callback)
+            else:
+                dfd.addCallback(callback, **result.request.cb_kwargs)# 将spider的callback 添加到 deferred的回调链路上
         else:  # result is a Failure
             result.request = request
             warn_on_generator_with_return_value(spider, request.errback)
@@ -179,21 +302,32 @@ class Scraper:
 
     def handle_spider_output(self, result, request, response, spider): #多线程处理 item
         if not result:
+            if self._is_replayed(response):
+                return defer.succeed(None)
             return defer_succeed(None)# 清空deferred
         it = iter_errback(result, self.handle_spider_error, request, response, spider)
         dfd = parallel(it, self.concurrent_items, self._process_spidermw_output,
                        request, response, spider)# 并行处理 self._process_spidermw_output
         return dfd
 
+    def _is_replayed(self, response):
+        # Responses replayed from the HTTP cache do not need to wait for the
+        # reactor to attend network connections
+        return self.replay and isinstance(response, Response) and 'cached' in response.flags
+
     def _process_spidermw_output(self, output, request, response, spider):
         """Process each Request/Item (given in the output parameter) returned
         from the given spider
         """
+        # the callback may have decoded or parsed the response by now
+        self.slot.update_response(response, request)
         if isinstance(output, Request):
             self.crawler.engine.crawl(request=output, spider=spider) #丢给 engine 处理
         elif is_item(output):
-            self.slot.itemproc_size += 1 # slot 正在处理 item计数器+1
+            slot = self.slot
+            item_size = slot.add_item(output) # slot 正在处理 item计数器+1
             dfd = self.itemproc.process_item(output, spider) #用处理ItemPipelineManager的类 output（item）
+            dfd.addBoth(slot.finish_item, item_size)
             dfd.addBoth(self._itemproc_finished, output, response, spider) # item回调链 添加self._itemproc_finished
             return dfd
         elif output is None:
@@ -234,7 +368,6 @@ class Scraper:
     def _itemproc_finished(self, output, item, response, spider):
         """ItemProcessor finished for the given ``item`` and returned ``output``
         """
-        self.slot.itemproc_size -= 1 #计数器减1
         if isinstance(output, Failure): # 处理item处理错误
             ex = output.value
             if isinstance(ex, DropItem):
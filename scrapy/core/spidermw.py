@@ -3,7 +3,7 @@ Spider Middleware manager
 
 See documentation in docs/topics/spider-middleware.rst
 """
-from itertools import islice
+from itertools import chain
 
 from twisted.python.failure import Failure
 
@@ -11,7 +11,6 @@ from scrapy.exceptions import _InvalidOutput
 from scrapy.middleware import MiddlewareManager
 from scrapy.utils.conf import build_component_list
 from scrapy.utils.defer import mustbe_deferred
-from scrapy.utils.python import MutableChain
 
 
 def _isiterable(possible_iterator):
@@ -40,87 +39,119 @@ class SpiderMiddlewareManager(MiddlewareManager):
         self.methods['process_spider_output'].appendleft(process_spider_output)
         process_spider_exception = getattr(mw, 'process_spider_exception', None)
         self.methods['process_spider_exception'].appendleft(process_spider_exception)
-
-    def scrape_response(self, scrape_func, response, request, spider): # 这里的scrape_func 是call_spider 这个函数
-
-        def process_spider_input(response):
-            for method in self.methods['process_spider_input']: #调用所有中间件 处理response
-                try:
-                    result = method(response=response, spider=spider)
-                    if result is not None: # 中间件的process_spider_input 方法需要返回None
-                        msg = (f"Middleware {_fname(method)} must return None "
-                               f"or raise an exception, got {type(result)}")
-                        raise _InvalidOutput(msg)
-                except _InvalidOutput:
-                    raise
-                except Exception:
-                    return scrape_func(Failure(), request, spider)
-            return scrape_func(response, request, spider)
-
-        def _evaluate_iterable(iterable, exception_processor_index, recover_to):
+        self._compile()
+
+    def __init__(self, *middlewares):
+        super().__init__(*middlewares)
+        self._compile()
+
+    def _compile(self):
+        """Precompute the hooks that scrape_response calls, so that it does
+        not go through middlewares that lack them"""
+        self._input_methods = list(self.methods['process_spider_input'])
+        self._output_methods = self._methods_by_start_index('process_spider_output')
+        self._exception_methods = self._methods_by_start_index('process_spider_exception')
+
+    def _methods_by_start_index(self, methodname):
+        """Return, for each start index of the ``methodname`` chain, the
+        (index, method) pairs of the middlewares from there on that have the
+        method"""
+        methods = [(index, method) for index, method in enumerate(self.methods[methodname])
+                   if method is not None]
+        return [
+            [(index, method) for index, method in methods if index >= start_index]
+            for start_index in range(len(self.methods[methodname]) + 1)
+        ]
+
+    def _process_spider_input(self, scrape_func, response, request, spider):
+        for method in self._input_methods: #调用所有中间件 处理response
             try:
-                for r in iterable:
-                    yield r
-            except Exception as ex:
-                exception_result = process_spider_exception(Failure(ex), exception_processor_index)
-                if isinstance(exception_result, Failure):
-                    raise
-                recover_to.extend(exception_result)
-
-        def process_spider_exception(_failure, start_index=0):
-            exception = _failure.value
-            # don't handle _InvalidOutput exception
-            if isinstance(exception, _InvalidOutput):
-                return _failure
-            method_list = islice(self.methods['process_spider_exception'], start_index, None)
-            for method_index, method in enumerate(method_list, start=start_index):
-                if method is None:
-                    continue
-                result = method(response=response, exception=exception, spider=spider)
-                if _isiterable(result):
-                    # stop exception handling by handing control over to the
-                    # process_spider_output chain if an iterable has been returned
-                    return process_spider_output(result, method_index + 1)
-                elif result is None:
-                    continue
-                else:
+                result = method(response=response, spider=spider)
+                if result is not None: # 中间件的process_spider_input 方法需要返回None
                     msg = (f"Middleware {_fname(method)} must return None "
-                           f"or an iterable, got {type(result)}")
+                           f"or raise an exception, got {type(result)}")
                     raise _InvalidOutput(msg)
+            except _InvalidOutput:
+                raise
+            except Exception:
+                return scrape_func(Failure(), request, spider)
+        return scrape_func(response, request, spider)
+
+    def _evaluate_iterable(self, response, spider, iterable, exception_processor_index, recover_to):
+        if not self._exception_methods[exception_processor_index]:
+            # exceptions would be raised again, there is no need to catch them
+            return iterable
+        return self._catch_iterable_exceptions(response, spider, iterable, exception_processor_index, recover_to)
+
+    def _catch_iterable_exceptions(self, response, spider, iterable, exception_processor_index, recover_to):
+        try:
+            for r in iterable:
+                yield r
+        except Exception as ex:
+            exception_result = self._process_spider_exception(response, spider, Failure(ex),
+                                                              exception_processor_index)
+            if isinstance(exception_result, Failure):
+                raise
+            recover_to.append(exception_result)
+
+    def _process_spider_exception(self, response, spider, _failure, start_index=0):
+        exception = _failure.value
+        # don't handle _InvalidOutput exception
+        if isinstance(exception, _InvalidOutput):
             return _failure
+        for method_index, method in self._exception_methods[start_index]:
+            result = method(response=response, exception=exception, spider=spider)
+            if _isiterable(result):
+                # stop exception handling by handing control over to the
+                # process_spider_output chain if an iterable has been returned
+                return self._process_spider_output(response, spider, result, method_index + 1)
+            elif result is None:
+                continue
+            else:
+                msg = (f"Middleware {_fname(method)} must return None "
+                       f"or an iterable, got {type(result)}")
+                raise _InvalidOutput(msg)
+        return _failure
+
+    def _process_spider_output(self, response, spider, result, start_index=0):
+        # items in this iterable do not need to go through the process_spider_output
+        # chain, they went through it already from the process_spider_exception method
+        recovered = []
+
+        for method_index, method in self._output_methods[start_index]:
+            try:
+                # might fail directly if the output value is not a generator
+                result = method(response=response, result=result, spider=spider)
+            except Exception as ex:
+                exception_result = self._process_spider_exception(response, spider, Failure(ex), method_index + 1)
+                if isinstance(exception_result, Failure):
+                    raise
+                return exception_result
+            if _isiterable(result):
+                result = self._evaluate_iterable(response, spider, result, method_index + 1, recovered)
+            else:
+                msg = (f"Middleware {_fname(method)} must return an "
+                       f"iterable, got {type(result)}")
+                raise _InvalidOutput(msg)
+
+        # recovered is only extended while result is being iterated, so
+        # chaining the list lazily keeps the output in order
+        return chain(result, chain.from_iterable(recovered))
+
+    def _process_callback_output(self, response, spider, result):
+        recovered = []
+        result = self._evaluate_iterable(response, spider, result, 0, recovered)
+        return chain(self._process_spider_output(response, spider, result), chain.from_iterable(recovered))
 
-        def process_spider_output(result, start_index=0):
-            # items in this iterable do not need to go through the process_spider_output
-            # chain, they went through it already from the process_spider_exception method
-            recovered = MutableChain()
-
-            method_list = islice(self.methods['process_spider_output'], start_index, None)
-            for method_index, method in enumerate(method_list, start=start_index):
-                if method is None:
-                    continue
-                try:
-                    # might fail directly if the output value is not a generator
-                    result = method(response=response, result=result, spider=spider)
-                except Exception as ex:
-                    exception_result = process_spider_exception(Failure(ex), method_index + 1)
-                    if isinstance(exception_result, Failure):
-                        raise
-                    return exception_result
-                if _isiterable(result):
-                    result = _evaluate_iterable(result, method_index + 1, recovered)
-                else:
-                    msg = (f"Middleware {_fname(method)} must return an "
-                           f"iterable, got {type(result)}")
-                    raise _InvalidOutput(msg)
-
-            return MutableChain(result, recovered)
+    def scrape_response(self, scrape_func, response, request, spider): # 这里的scrape_func 是call_spider 这个函数
 
         def process_callback_output(result):
-            recovered = MutableChain()
-            result = _evaluate_iterable(result, 0, recovered)
-            return MutableChain(process_spider_output(result), recovered)
+            return self._process_callback_output(response, spider, result)
+
+        def process_spider_exception(_failure):
+            return self._process_spider_exception(response, spider, _failure)
 
-        dfd = mustbe_deferred(process_spider_input, response)
+        dfd = mustbe_deferred(self._process_spider_input, scrape_func, response, request, spider)
         dfd.addCallbacks(callback=process_callback_output, errback=process_spider_exception)
         return dfd
 
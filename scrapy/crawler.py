@@ -80,6 +80,7 @@ class Crawler:
         self.settings.freeze()
         self.crawling = False
         self.spider = None
+        self.spider_arguments = ((), {})
         self.engine = None
     #defer.inlineCallbacks 装饰器 是指当使用异步调用该方法时候，
     # 该方法可以用类似同步语法的方法写异步的工作，其中yield deferred对象后
@@ -92,6 +93,7 @@ class Crawler:
         self.crawling = True
 
         try:
+            self.spider_arguments = (args, kwargs)
             self.spider = self._create_spider(*args, **kwargs)
             self.engine = self._create_engine()
             #从self.spider.start_requests()中拿到requests
@@ -1,5 +1,8 @@
+import heapq
+import logging
 from email.utils import formatdate
-from typing import Optional, Type, TypeVar
+from time import time
+from typing import Optional, Type, TypeVar, Union
 
 from twisted.internet import defer
 from twisted.internet.error import (
@@ -16,6 +19,7 @@ from twisted.web.client import ResponseFailed
 from scrapy import signals
 from scrapy.crawler import Crawler
 from scrapy.exceptions import IgnoreRequest, NotConfigured
+from scrapy.extensions.httpcache import MemoryCacheStorage, ThreadedCacheStorage
 from scrapy.http.request import Request
 from scrapy.http.response import Response
 from scrapy.settings import Settings
@@ -24,6 +28,9 @@ from scrapy.statscollectors import StatsCollector
 from scrapy.utils.misc import load_object
 
 
+logger = logging.getLogger(__name__)
+
+
 HttpCacheMiddlewareTV = TypeVar("HttpCacheMiddlewareTV", bound="HttpCacheMiddleware")
 
 
@@ -34,28 +41,123 @@ class HttpCacheMiddleware:
                            ConnectionLost, TCPTimedOutError, ResponseFailed,
                            IOError)
 
+    # Headers of a "304 Not Modified" response that describe its (empty) body
+    BODY_HEADERS = (b'Content-Length', b'Content-Encoding', b'Content-Range',
+                    b'Content-Type', b'Transfer-Encoding')
+
+    # Stale responses are revalidated in batches of this size, at most one
+    # batch every REVALIDATION_BATCH_INTERVAL seconds
+    REVALIDATION_BATCH_SIZE = 100
+    REVALIDATION_BATCH_INTERVAL = 1.0
+
     def __init__(self, settings: Settings, stats: StatsCollector) -> None:
         if not settings.getbool('HTTPCACHE_ENABLED'):
             raise NotConfigured
         self.policy = load_object(settings['HTTPCACHE_POLICY'])(settings)
         self.storage = load_object(settings['HTTPCACHE_STORAGE'])(settings)
-        self.ignore_missing = settings.getbool('HTTPCACHE_IGNORE_MISSING')
+        self._threaded_storage: Optional[ThreadedCacheStorage] = None
+        if settings.getbool('HTTPCACHE_ASYNC'):
+            self.storage = self._threaded_storage = ThreadedCacheStorage(self.storage)
+        if settings.getint('HTTPCACHE_MEMORY_SIZE'):
+            self.storage = MemoryCacheStorage(self.storage,
+                                              max_size=settings.getint('HTTPCACHE_MEMORY_SIZE'),
+                                              expiration_secs=settings.getint('HTTPCACHE_EXPIRATION_SECS'),
+                                              stats=stats)
+        self.ignore_missing = (settings.getbool('HTTPCACHE_IGNORE_MISSING')
+                               or settings.getbool('HTTPCACHE_REPLAY'))
         self.stats = stats
+        self.crawler: Optional[Crawler] = None
+
+        self.revalidate_ahead = settings.getbool('HTTPCACHE_REVALIDATE_AHEAD')
+        self.revalidate_priority = settings.getint('HTTPCACHE_REVALIDATE_PRIORITY')
+        self.expiration_secs = settings.getint('HTTPCACHE_EXPIRATION_SECS')
+        self._revalidations: list = []  # heap of (expiry, index, url, headers)
+        self._revalidation_call = None
+        # Bytes and time of the responses downloaded in full, to estimate
+        # the time saved by "304 Not Modified" responses
+        self._downloaded_bytes = 0
+        self._download_time = 0.0
 
     @classmethod
     def from_crawler(cls: Type[HttpCacheMiddlewareTV], crawler: Crawler) -> HttpCacheMiddlewareTV:
         o = cls(crawler.settings, crawler.stats)
+        o.crawler = crawler
         crawler.signals.connect(o.spider_opened, signal=signals.spider_opened)
         crawler.signals.connect(o.spider_closed, signal=signals.spider_closed)
         return o
 
-    def spider_opened(self, spider: Spider) -> None:
-        self.storage.open_spider(spider)
+    def spider_opened(self, spider: Spider) -> Optional[defer.Deferred]:
+        dfd = self.storage.open_spider(spider)
+        if not self.revalidate_ahead:
+            return dfd
+        if isinstance(dfd, defer.Deferred):
+            return dfd.addCallback(lambda _: self._index_revalidations(spider))
+        return self._index_revalidations(spider)
+
+    def spider_closed(self, spider: Spider) -> Optional[defer.Deferred]:
+        if self._revalidation_call is not None and self._revalidation_call.active():
+            self._revalidation_call.cancel()
+        self._revalidations = []
+        return self.storage.close_spider(spider)
 
-    def spider_closed(self, spider: Spider) -> None:
-        self.storage.close_spider(spider)
+    def _index_revalidations(self, spider: Spider) -> Optional[defer.Deferred]:
+        if not hasattr(self.policy, 'freshness_expiry') or not hasattr(self.storage, 'iter_entries'):
+            logger.warning("HTTPCACHE_REVALIDATE_AHEAD needs a policy that supports "
+                           "freshness_expiry() and a storage that supports iter_entries(), "
+                           "disabling it", extra={'spider': spider})
+            self.revalidate_ahead = False
+            return None
+        if self._threaded_storage is not None:
+            # storages are only used from the storage thread
+            dfd = self._threaded_storage._call(self._read_revalidations, self._threaded_storage.storage, spider)
+            return dfd.addCallback(self._start_revalidations, spider)
+        self._start_revalidations(self._read_revalidations(self.storage, spider), spider)
+        return None
+
+    def _read_revalidations(self, storage, spider: Spider) -> list:
+        # Only what is needed to build the revalidation requests is kept,
+        # requests are built when they are scheduled
+        revalidations = []
+        now = time()
+        for key, timestamp, size, request, response in storage.iter_entries(spider):
+            if request.method != 'GET' or 0 < self.expiration_secs < now - timestamp:
+                continue
+            expiry = self.policy.freshness_expiry(response, request)
+            if expiry is not None:
+                revalidations.append((expiry, len(revalidations), request.url, request.headers or None))
+        heapq.heapify(revalidations)
+        return revalidations
 
-    def process_request(self, request: Request, spider: Spider) -> Optional[Response]:
+    def _start_revalidations(self, revalidations: list, spider: Spider) -> None:
+        self._revalidations = revalidations
+        logger.debug("Indexed %(count)d cached responses for revalidation",
+                     {'count': len(self._revalidations)}, extra={'spider': spider})
+        self._schedule_revalidations(spider)
+
+    def _schedule_revalidations(self, spider: Spider) -> None:
+        """Schedule the revalidation of up to REVALIDATION_BATCH_SIZE cached
+        responses that are stale, and call itself again when the next batch
+        is due or the next response becomes stale"""
+        now = time()
+        for _ in range(self.REVALIDATION_BATCH_SIZE):
+            if not self._revalidations or self._revalidations[0][0] > now:
+                break
+            _, _, url, headers = heapq.heappop(self._revalidations)
+            request = Request(url, headers=headers, priority=self.revalidate_priority, dont_filter=True,
+                              meta={'_revalidate_ahead': True})
+            self.stats.inc_value('httpcache/revalidate_ahead/scheduled', spider=spider)
+            self.crawler.engine.crawl(request, spider)
+        if self._revalidations:
+            from twisted.internet import reactor
+            delay = self._revalidations[0][0] - now
+            if delay <= 0:
+                # the batch is full, more responses are already stale
+                delay = self.REVALIDATION_BATCH_INTERVAL
+            self._revalidation_call = reactor.callLater(delay, self._schedule_revalidations, spider)
+
+    def process_request(
+        self, request: Request, spider: Spider
+    ) -> Union[Optional[Response], defer.Deferred]:
         if request.meta.get('dont_cache', False):
             return None
 
@@ -66,6 +168,16 @@ class HttpCacheMiddleware:
 
         # Look for cached response and check if expired
         cachedresponse = self.storage.retrieve_response(spider, request)
+        if isinstance(cachedresponse, defer.Deferred):
+            return cachedresponse.addCallback(self._process_cached_response, request, spider)
+        return self._process_cached_response(cachedresponse, request, spider)
+
+    def _process_cached_response(
+        self, cachedresponse: Optional[Response], request: Request, spider: Spider
+    ) -> Optional[Response]:
+        if request.meta.get('_revalidate_ahead'):
+            return self._process_revalidation(cachedresponse, request, spider)
+
         if cachedresponse is None:
             self.stats.inc_value('httpcache/miss', spider=spider)
             if self.ignore_missing:
@@ -85,7 +197,24 @@ class HttpCacheMiddleware:
 
         return None
 
+    def _process_revalidation(
+        self, cachedresponse: Optional[Response], request: Request, spider: Spider
+    ) -> None:
+        # The spider may have requested the same URL in the meantime
+        if cachedresponse is None or self.policy.is_cached_response_fresh(cachedresponse, request):
+            raise IgnoreRequest(f"Ignored revalidation of cached response: {request}")
+        cachedresponse.flags.append('cached')
+        request.meta['cached_response'] = cachedresponse
+        return None
+
     def process_response(self, request: Request, response: Response, spider: Spider) -> Response:
+        response = self._process_response(request, response, spider)
+        # Revalidations scheduled ahead of time only update the cache
+        if request.meta.get('_revalidate_ahead'):
+            raise IgnoreRequest(f"Revalidated cached response: {request}")
+        return response
+
+    def _process_response(self, request: Request, response: Response, spider: Spider) -> Response:
         if request.meta.get('dont_cache', False):
             return response
 
@@ -103,14 +232,20 @@ class HttpCacheMiddleware:
         cachedresponse = request.meta.pop('cached_response', None)
         if cachedresponse is None:
             self.stats.inc_value('httpcache/firsthand', spider=spider)
+            self._track_download(request, response)
             self._cache_response(spider, response, request, cachedresponse)
             return response
 
         if self.policy.is_cached_response_valid(cachedresponse, response, request):
             self.stats.inc_value('httpcache/revalidate', spider=spider)
+            if response.status == 304:
+                self._track_savings(cachedresponse, spider)
+                if self.revalidate_ahead:
+                    cachedresponse = self._refresh_cached_response(spider, cachedresponse, response, request)
             return cachedresponse
 
         self.stats.inc_value('httpcache/invalidate', spider=spider)
+        self._track_download(request, response)
         self._cache_response(spider, response, request, cachedresponse)
         return response
 
@@ -118,6 +253,8 @@ class HttpCacheMiddleware:
         self, request: Request, exception: Exception, spider: Spider
     ) -> Optional[Response]:
         cachedresponse = request.meta.pop('cached_response', None)
+        if request.meta.get('_revalidate_ahead'):
+            raise IgnoreRequest(f"Failed revalidation of cached response: {request}")
         if cachedresponse is not None and isinstance(exception, self.DOWNLOAD_EXCEPTIONS):
             self.stats.inc_value('httpcache/errorrecovery', spider=spider)
             return cachedresponse
@@ -131,3 +268,31 @@ class HttpCacheMiddleware:
             self.storage.store_response(spider, request, response)
         else:
             self.stats.inc_value('httpcache/uncacheable', spider=spider)
+
+    def _refresh_cached_response(
+        self, spider: Spider, cachedresponse: Response, response: Response, request: Request
+    ) -> Response:
+        # Update the cached headers with those of the "304 Not Modified"
+        # response, so that the cached response is fresh again
+        headers = cachedresponse.headers.copy()
+        headers.pop(b'Age', None)
+        for name, values in response.headers.items():
+            if name not in self.BODY_HEADERS:
+                headers.setlist(name, values)
+        cachedresponse = cachedresponse.replace(headers=headers)
+        self.storage.store_response(spider, request, cachedresponse)
+        return cachedresponse
+
+    def _track_download(self, request: Request, response: Response) -> None:
+        if 'download_latency' in request.meta:
+            self._downloaded_bytes += len(response.body)
+            self._download_time += request.meta['download_latency']
+
+    def _track_savings(self, cachedresponse: Response, spider: Spider) -> None:
+        size = len(cachedresponse.body)
+        self.stats.inc_value('httpcache/revalidate/bytes_saved', size, spider=spider)
+        if self._downloaded_bytes:
+            # Estimated from the download rate of the responses downloaded
+            # in full during the crawl
+            time_saved = size * self._download_time / self._downloaded_bytes
+            self.stats.inc_value('httpcache/revalidate/time_saved', time_saved, spider=spider)
@@ -1,22 +1,35 @@
-import io
-import zlib
+import logging
 
+from twisted.internet import threads
+from twisted.python.threadpool import ThreadPool
+
+from scrapy import signals
+from scrapy.utils._compression import (
+    _brotli_output_is_bounded,
+    _DecompressionMaxSizeExceeded,
+    _inflate,
+    _unbrotli,
+    _unzstd,
+)
 from scrapy.utils.gz import gunzip
 from scrapy.http import Response, TextResponse
 from scrapy.responsetypes import responsetypes
-from scrapy.exceptions import NotConfigured
+from scrapy.exceptions import IgnoreRequest, NotConfigured
+
+
+logger = logging.getLogger(__name__)
 
 
 ACCEPTED_ENCODINGS = [b'gzip', b'deflate']
 
 try:
-    import brotli
+    import brotli  # noqa: F401
     ACCEPTED_ENCODINGS.append(b'br')
 except ImportError:
     pass
 
 try:
-    import zstandard
+    import zstandard  # noqa: F401
     ACCEPTED_ENCODINGS.append(b'zstd')
 except ImportError:
     pass
@@ -24,26 +37,112 @@ except ImportError:
 
 class HttpCompressionMiddleware:
     """This middleware allows compressed (gzip, deflate) traffic to be
-    sent/received from web sites"""
+    sent/received from web sites.
+
+    Bodies are decompressed incrementally, so that responses whose
+    decompressed size exceeds ``DOWNLOAD_MAXSIZE`` are dropped as soon as the
+    limit is reached instead of after the whole body has been inflated.
+
+    If ``threadpool_maxsize`` is set, decompression and the body decoding of
+    text responses run in a thread pool of that size instead of the reactor
+    thread, and ``process_response`` returns a Deferred."""
+
+    def __init__(self, max_size=0, warn_size=0, threadpool_maxsize=0):
+        self._max_size = max_size
+        self._warn_size = warn_size
+        self._threadpool_maxsize = threadpool_maxsize
+        self._threadpool = None
+
     @classmethod
     def from_crawler(cls, crawler):
         if not crawler.settings.getbool('COMPRESSION_ENABLED'):
             raise NotConfigured
-        return cls()
+        o = cls(
+            max_size=crawler.settings.getint('DOWNLOAD_MAXSIZE'),
+            warn_size=crawler.settings.getint('DOWNLOAD_WARNSIZE'),
+            threadpool_maxsize=crawler.settings.getint('COMPRESSION_THREADPOOL_MAXSIZE'),
+        )
+        if b'br' in ACCEPTED_ENCODINGS and not _brotli_output_is_bounded():
+            logger.warning(
+                "The installed brotli library cannot limit the size of "
+                "decompressed chunks, so DOWNLOAD_MAXSIZE is only checked "
+                "after each 64 KiB of compressed data of brotli responses. "
+                "Install brotli >= 1.2.0 to stop brotli decompression bombs "
+                "early.",
+                extra={'crawler': crawler},
+            )
+        if o._threadpool_maxsize:
+            crawler.signals.connect(o.spider_opened, signal=signals.spider_opened)
+            crawler.signals.connect(o.spider_closed, signal=signals.spider_closed)
+        return o
+
+    def spider_opened(self, spider):
+        self._threadpool = ThreadPool(minthreads=0,
+                                      maxthreads=self._threadpool_maxsize,
+                                      name='HttpCompressionMiddleware')
+        self._threadpool.start()
+
+    def spider_closed(self, spider):
+        if self._threadpool is not None:
+            # ThreadPool.stop() joins the threads, which may still be
+            # decompressing large bodies, so it must not run in the reactor
+            # thread
+            threadpool, self._threadpool = self._threadpool, None
+            return threads.deferToThread(threadpool.stop)
 
     def process_request(self, request, spider):
         request.headers.setdefault('Accept-Encoding',
                                    b", ".join(ACCEPTED_ENCODINGS))
 
     def process_response(self, request, response, spider):
+        if self._threadpool is None or request.method == 'HEAD':
+            return self._process_response(request, response, spider)
+        if not (isinstance(response, TextResponse)
+                or response.headers.get('Content-Encoding')):
+            return response
+        from twisted.internet import reactor
+        return threads.deferToThreadPool(reactor, self._threadpool,
+                                         self._process_response_in_thread,
+                                         request, response, spider)
 
+    def _process_response_in_thread(self, request, response, spider):
+        response = self._process_response(request, response, spider)
+        if isinstance(response, TextResponse):
+            # detect the encoding and decode the body here, where it does
+            # not block the reactor; the result is cached in the response
+            response.text
+        return response
+
+    def _process_response(self, request, response, spider):
         if request.method == 'HEAD':
             return response
         if isinstance(response, Response):
             content_encoding = response.headers.getlist('Content-Encoding')
             if content_encoding:
                 encoding = content_encoding.pop()
-                decoded_body = self._decode(response.body, encoding.lower())
+                max_size = request.meta.get(
+                    'download_maxsize',
+                    getattr(spider, 'download_maxsize', self._max_size))
+                warn_size = request.meta.get(
+                    'download_warnsize',
+                    getattr(spider, 'download_warnsize', self._warn_size))
+                try:
+                    decoded_body = self._decode(response.body, encoding.lower(), max_size)
+                except _DecompressionMaxSizeExceeded:
+                    raise IgnoreRequest(
+                        f"Ignored response {response} because its body "
+                        f"({len(response.body)} B compressed) exceeded "
+                        f"DOWNLOAD_MAXSIZE ({max_size} B) during decompression."
+                    )
+                if len(response.body) < warn_size <= len(decoded_body):
+                    logger.warning(
+                        "%(response)s body size after decompression "
+                        "(%(size)s B) is larger than the download warning "
+                        "size (%(warnsize)s B).",
+                        {'response': response, 'size': len(decoded_body),
+                         'warnsize': warn_size},
+                        extra={'spider': spider},
+                    )
                 respcls = responsetypes.from_args(
                     headers=response.headers, url=response.url, body=decoded_body
                 )
@@ -58,25 +157,13 @@ class HttpCompressionMiddleware:
 
         return response
 
-    def _decode(self, body, encoding):
+    def _decode(self, body, encoding, max_size=0):
         if encoding == b'gzip' or encoding == b'x-gzip':
-            body = gunzip(body)
-
+            body = gunzip(body, max_size=max_size)
         if encoding == b'deflate':
-            try:
-                body = zlib.decompress(body)
-            except zlib.error:
-                # ugly hack to work with raw deflate content that may
-                # be sent by microsoft servers. For more information, see:
-                # http://carsten.codimi.de/gzip.yaws/
-                # http://www.port80software.com/200ok/archive/2005/10/31/868.aspx
-                # http://www.gzip.org/zlib/zlib_faq.html#faq38
-                body = zlib.decompress(body, -15)
+            body = _inflate(body, max_size=max_size)
         if encoding == b'br' and b'br' in ACCEPTED_ENCODINGS:
-            body = brotli.decompress(body)
+            body = _unbrotli(body, max_size=max_size)
         if encoding == b'zstd' and b'zstd' in ACCEPTED_ENCODINGS:
-            # Using its streaming API since its simple API could handle only cases
-            # where there is content size data embedded in the frame
-            reader = zstandard.ZstdDecompressor().stream_reader(io.BytesIO(body))
-            body = reader.read()
+            body = _unzstd(body, max_size=max_size)
         return body
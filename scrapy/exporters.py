@@ -2,9 +2,11 @@
 Item Exporters are used to export/serialize items into different formats.
 """
 
+import codecs
 import csv
 import io
 import marshal
+import math
 import pickle
 import pprint
 import warnings
@@ -12,15 +14,30 @@ from xml.sax.saxutils import XMLGenerator
 
 from itemadapter import is_item, ItemAdapter
 
-from scrapy.exceptions import ScrapyDeprecationWarning
+from scrapy.exceptions import NotConfigured, ScrapyDeprecationWarning
 from scrapy.item import _BaseItem
 from scrapy.utils.python import is_listlike, to_bytes, to_unicode
 from scrapy.utils.serialize import ScrapyJSONEncoder
 
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
 
 __all__ = ['BaseItemExporter', 'PprintItemExporter', 'PickleItemExporter',
            'CsvItemExporter', 'XmlItemExporter', 'JsonLinesItemExporter',
-           'JsonItemExporter', 'MarshalItemExporter']
+           'JsonItemExporter', 'MarshalItemExporter', 'ParquetItemExporter']
+
+
+def _has_non_finite_float(value):
+    if isinstance(value, float):
+        return not math.isfinite(value)
+    if isinstance(value, dict):
+        return any(_has_non_finite_float(v) for v in value.values())
+    if isinstance(value, (list, tuple)):
+        return any(_has_non_finite_float(v) for v in value)
+    return False
 
 
 class BaseItemExporter:
@@ -60,11 +77,21 @@ class BaseItemExporter:
         (name, serialized_value)
         用serialize_field 序列化当前所选的item项
         """
-        item = ItemAdapter(item)
+        plan = self._get_serializer_plan(item)
 
         if include_empty is None:
             include_empty = self.export_empty_fields
 
+        if plan == {} and self.fields_to_export is None and not include_empty:
+            # Nothing to serialize, export the item as it is
+            if type(item) is dict:
+                return item.items()
+            return ItemAdapter(item).items()
+        return self._iter_serialized_fields(item, plan, default_value, include_empty)
+
+    def _iter_serialized_fields(self, item, plan, default_value, include_empty):
+        item = ItemAdapter(item)
+
         if self.fields_to_export is None:
             if include_empty:# 包含空值（item定义有但是传入没有的key）
                 field_iter = item.field_names()
@@ -78,25 +105,93 @@ class BaseItemExporter:
 
         for field_name in field_iter:
             if field_name in item:
-                field_meta = item.get_field_meta(field_name)
-                value = self.serialize_field(field_meta, field_name, item[field_name])
+                if plan is None:
+                    field_meta = item.get_field_meta(field_name)
+                    value = self.serialize_field(field_meta, field_name, item[field_name])
+                elif field_name in plan:
+                    value = plan[field_name](item[field_name])
+                else:
+                    value = item[field_name]
             else:
                 value = default_value
 
             yield field_name, value
 
+    def _get_serializer_plan(self, item):
+        """Return the custom serializers of the fields of the item class, or
+        ``None`` if :meth:`serialize_field` has been overridden and must be
+        called for every field
+        """
+        # item class -> {field name: serializer}, created here for subclasses
+        # that do not call BaseItemExporter.__init__
+        plans = self.__dict__.setdefault('_serializer_plans', {})
+        itemcls = type(item)
+        if itemcls not in plans:
+            if type(self).serialize_field is not BaseItemExporter.serialize_field:
+                plan = None
+            else:
+                # field metadata is declared in the item class, dicts have none
+                adapter = ItemAdapter(item)
+                plan = {}
+                for name in adapter.field_names():
+                    serializer = adapter.get_field_meta(name).get('serializer')
+                    if serializer is not None:
+                        plan[name] = serializer
+            plans[itemcls] = plan
+        return plans[itemcls]
+
 
 class JsonLinesItemExporter(BaseItemExporter):
 
-    def __init__(self, file, **kwargs):
+    def __init__(self, file, backend='json', **kwargs):
         super().__init__(dont_fail=True, **kwargs)
         self.file = file
         self._kwargs.setdefault('ensure_ascii', not self.encoding)
+        self._orjson_option = self._get_orjson_option(backend)
+        # orjson always encodes to UTF-8
+        self._transcode = bool(self.encoding) and codecs.lookup(self.encoding).name != 'utf-8'
         self.encoder = ScrapyJSONEncoder(**self._kwargs) #就是处理各种数据类型的 比如时间 集合这种json自己处理不了的
 
+    def _get_orjson_option(self, backend):
+        if backend == 'json':
+            return None
+        if backend != 'orjson':
+            raise ValueError(f"Unknown JSON backend: {backend}")
+        if orjson is None:
+            warnings.warn("The orjson JSON backend requires the orjson library, using json instead")
+            return None
+        if self._kwargs['ensure_ascii']:
+            warnings.warn("The orjson JSON backend does not escape non-ASCII characters, set an "
+                          "encoding to use it, using json instead")
+            return None
+        unsupported = set(self._kwargs) - {'sort_keys', 'ensure_ascii'}
+        if unsupported:
+            warnings.warn(f"The orjson JSON backend does not support {', '.join(sorted(unsupported))}, "
+                          f"using json instead")
+            return None
+        # datetimes and dataclasses are left to ScrapyJSONEncoder.default, so
+        # they are encoded as with the json backend
+        option = (orjson.OPT_APPEND_NEWLINE | orjson.OPT_NON_STR_KEYS
+                  | orjson.OPT_PASSTHROUGH_DATETIME | orjson.OPT_PASSTHROUGH_DATACLASS)
+        if self._kwargs.get('sort_keys'):
+            option |= orjson.OPT_SORT_KEYS
+        return option
+
     def export_item(self, item):
         #简单解释 将选出的项用serializer序列化后变成dict
         itemdict = dict(self._get_serialized_fields(item))
+        if self._orjson_option is not None:
+            try:
+                data = orjson.dumps(itemdict, default=self.encoder.default, option=self._orjson_option)
+            except orjson.JSONEncodeError:
+                data = None  # e.g. integers over 64 bits, let json deal with it
+            # orjson writes NaN and infinities as null, json as NaN, Infinity
+            # and -Infinity
+            if data is not None and not (b'null' in data and _has_non_finite_float(itemdict)):
+                if self._transcode:
+                    data = data.decode('utf-8').encode(self.encoding)
+                self.file.write(data)
+                return
         data = self.encoder.encode(itemdict) + '\n'
         #写到文件里
         self.file.write(to_bytes(data, self.encoding))
@@ -284,6 +379,128 @@ class MarshalItemExporter(BaseItemExporter):
         marshal.dump(dict(self._get_serialized_fields(item)), self.file)
 
 
+class ParquetItemExporter(BaseItemExporter):
+    """Exports items in the columnar `Parquet`_ format, using pyarrow_.
+
+    Items are buffered into columns, which are written as a row group every
+    ``row_group_size`` items, so memory usage does not grow with the number of
+    exported items.
+
+    :param file: The file-like object to use for exporting the data. Its
+                 ``write`` method should accept :class:`bytes`
+    :param row_group_size: The number of items of each row group
+    :param schema: The :class:`pyarrow.Schema` of the exported items. By
+                   default it is inferred from the first row group. The
+                   values of every row group are cast to it, and a row group
+                   with a value that cannot be cast is dropped with a
+                   :exc:`ValueError`
+    :param compression: The compression codec of the row groups
+
+    .. _Parquet: https://parquet.apache.org/
+    .. _pyarrow: https://arrow.apache.org/docs/python/
+    """
+
+    def __init__(self, file, row_group_size=10000, schema=None, compression='snappy', **kwargs):
+        super().__init__(**kwargs)
+        try:
+            import pyarrow
+            import pyarrow.parquet
+        except ImportError:
+            raise NotConfigured('missing pyarrow library')
+        self._pa = pyarrow
+        self._pq = pyarrow.parquet
+        self.file = file
+        self.row_group_size = row_group_size
+        self.schema = schema
+        self.compression = compression
+        self._writer = None
+        self._columns = {}
+        self._row_count = 0
+        self._dropped_fields = set()
+
+    def export_item(self, item):
+        fields = dict(self._get_serialized_fields(item))
+        for name, value in fields.items():
+            if name not in self._columns:
+                # backfill the rows exported before the field showed up
+                self._columns[name] = [None] * self._row_count
+            self._columns[name].append(self._to_arrow_value(value))
+        self._row_count += 1
+        for name, column in self._columns.items():
+            if name not in fields:
+                column.append(None)
+        if self._row_count >= self.row_group_size:
+            self._write_row_group()
+
+    def finish_exporting(self):
+        if self._row_count or self._writer is None:
+            # an empty feed is still written as a valid Parquet file
+            self._write_row_group()
+        if self._writer is not None:
+            self._writer.close()
+
+    def _to_arrow_value(self, value):
+        if isinstance(value, (str, bytes, int, float)) or value is None:
+            return value
+        if is_item(value):
+            return {k: self._to_arrow_value(v) for k, v in ItemAdapter(value).items()}
+        if is_listlike(value):
+            return [self._to_arrow_value(v) for v in value]
+        return value
+
+    def _write_row_group(self):
+        try:
+            if self.schema is None:
+                self.schema = self._infer_schema()
+            dropped = set(self._columns) - set(self.schema.names) - self._dropped_fields
+            if dropped:
+                warnings.warn(f"Fields not in the Parquet schema are not exported: {', '.join(sorted(dropped))}")
+                self._dropped_fields.update(dropped)
+            table = self._pa.Table.from_arrays(
+                [self._to_arrow_array(field) for field in self.schema], schema=self.schema)
+        finally:
+            # a row group that cannot be converted is dropped, so that its
+            # rows do not leak into the next one
+            self._columns = {}
+            self._row_count = 0
+        if self._writer is None:
+            self._writer = self._pq.ParquetWriter(self.file, self.schema, compression=self.compression)
+        self._writer.write_table(table)
+
+    def _to_arrow_array(self, field):
+        pa = self._pa
+        values = self._columns.get(field.name, [None] * self._row_count)
+        try:
+            try:
+                array = pa.array(values)
+            except (pa.ArrowInvalid, pa.ArrowTypeError):
+                # e.g. nested items whose fields are not always the same
+                return pa.array(values, type=field.type)
+            # a safe cast, so that values are never silently truncated
+            return array.cast(field.type)
+        except (pa.ArrowInvalid, pa.ArrowTypeError, pa.ArrowNotImplementedError) as e:
+            raise ValueError(f"Cannot export {self._row_count} items to Parquet: the values of "
+                             f"field {field.name!r} cannot be converted to {field.type}: {e}") from e
+
+    def _infer_schema(self):
+        pa = self._pa
+        names = self.fields_to_export or list(self._columns)
+        fields = []
+        for name in names:
+            column = self._columns.get(name, [None] * self._row_count)
+            try:
+                type_ = pa.array(column).type
+            except (pa.ArrowInvalid, pa.ArrowTypeError) as e:
+                raise ValueError(f"Cannot export {self._row_count} items to Parquet: the values of "
+                                 f"field {name!r} do not have a common type: {e}") from e
+            # the values of columns that are empty in the first row group can
+            # be anything, so they are exported as strings
+            if pa.types.is_null(type_):
+                type_ = pa.string()
+            fields.append(pa.field(name, type_))
+        return pa.schema(fields)
+
+
 class PprintItemExporter(BaseItemExporter):
 
     def __init__(self, file, **kwargs):
@@ -0,0 +1,119 @@
+"""
+DnsPrefetch extension
+
+Resolves the hostnames of newly scheduled requests in the background, so
+that the answer is already in the DNS cache of the installed resolver by the
+time the downloader opens a connection.
+
+See documentation in docs/topics/extensions.rst
+"""
+import logging
+from collections import deque
+
+from twisted.internet import defer
+from twisted.internet.abstract import isIPAddress, isIPv6Address
+from twisted.internet.error import DNSLookupError
+from twisted.internet.interfaces import IResolutionReceiver
+from zope.interface.declarations import provider
+
+from scrapy import signals
+from scrapy.exceptions import NotConfigured
+from scrapy.utils.datatypes import LocalCache
+from scrapy.utils.httpobj import urlparse_cached
+
+
+logger = logging.getLogger(__name__)
+
+
+@provider(IResolutionReceiver)
+class _PrefetchResolutionReceiver:
+    """Resolution receiver that fires ``deferred`` once the resolution is
+    complete"""
+
+    def __init__(self, hostname):
+        self.hostname = hostname
+        self.addresses = []
+        self.deferred = defer.Deferred()
+
+    def resolutionBegan(self, resolution):
+        pass
+
+    def addressResolved(self, address):
+        self.addresses.append(address)
+
+    def resolutionComplete(self):
+        if self.addresses:
+            self.deferred.callback(self.addresses)
+        else:
+            self.deferred.errback(DNSLookupError(self.hostname))
+
+
+class DnsPrefetch:
+
+    def __init__(self, crawler):
+        if not crawler.settings.getbool('DNS_PREFETCH_ENABLED'):
+            raise NotConfigured
+        self.stats = crawler.stats
+        self.concurrency = crawler.settings.getint('DNS_PREFETCH_CONCURRENCY')
+        self.seen = LocalCache(crawler.settings.getint('DNSCACHE_SIZE'))
+        self.queue = deque()
+        self.active = 0
+        self.spider = None
+        crawler.signals.connect(self.spider_opened, signal=signals.spider_opened)
+        crawler.signals.connect(self.spider_closed, signal=signals.spider_closed)
+        crawler.signals.connect(self.request_scheduled, signal=signals.request_scheduled)
+
+    @classmethod
+    def from_crawler(cls, crawler):
+        return cls(crawler)
+
+    def spider_opened(self, spider):
+        self.spider = spider
+
+    def spider_closed(self, spider):
+        self.spider = None
+        self.queue.clear()
+
+    def request_scheduled(self, request, spider):
+        if request.meta.get('proxy'):
+            # the proxy resolves the hostname
+            return
+        parsed = urlparse_cached(request)
+        hostname = parsed.hostname
+        if (not hostname or hostname in self.seen
+                or isIPAddress(hostname) or isIPv6Address(hostname)):
+            return
+        self.seen[hostname] = None
+        port = parsed.port or (443 if parsed.scheme == 'https' else 80)
+        self.queue.append((hostname, port))
+        self._process_queue()
+
+    def _resolve(self, hostname, port):
+        # reactor.resolve would ask an installed IHostnameResolver for IPv4
+        # addresses with port 0, and a caching resolver such as
+        # CachingHostnameResolver would keep those for the connections.
+        # reactor.nameResolver wraps an installed IResolverSimple otherwise.
+        from twisted.internet import reactor
+        receiver = _PrefetchResolutionReceiver(hostname)
+        reactor.nameResolver.resolveHostName(receiver, hostname, port)
+        return receiver.deferred
+
+    def _process_queue(self):
+        while self.queue and self.active < self.concurrency and self.spider is not None:
+            hostname, port = self.queue.popleft()
+            self.active += 1
+            self.stats.inc_value('dns_prefetch/count', spider=self.spider)
+            d = self._resolve(hostname, port)
+            d.addErrback(self._failed, hostname)
+            d.addBoth(self._done)
+
+    def _failed(self, failure, hostname):
+        logger.debug("DNS prefetch of %(hostname)s failed: %(error)s",
+                     {'hostname': hostname, 'error': failure.value},
+                     extra={'spider': self.spider})
+        if self.spider is not None:
+            self.stats.inc_value('dns_prefetch/failed', spider=self.spider)
+
+    def _done(self, _):
+        self.active -= 1
+        self._process_queue()
@@ -4,16 +4,26 @@ Feed Exports extension
 See documentation in docs/topics/feed-exports.rst
 """
 
+import bz2
+import gzip
+import io
 import logging
+import lzma
 import os
 import re
 import sys
+import threading
 import warnings
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime
+from queue import Full, Queue
 from tempfile import NamedTemporaryFile
+from time import time
 from urllib.parse import unquote, urlparse
 
 from twisted.internet import defer, threads
+from twisted.python.failure import Failure
 from w3lib.url import file_uri_to_path
 from zope.interface import implementer, Interface
 
@@ -27,9 +37,45 @@ from scrapy.utils.misc import create_instance, load_object
 from scrapy.utils.python import get_func_args, without_none_values
 
 
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+
 logger = logging.getLogger(__name__)
 
 
+def _gzip_file(file, level):
+    kwargs = {} if level is None else {'compresslevel': level}
+    # an empty filename keeps the temporary file name out of the header
+    return gzip.GzipFile(filename='', mode='wb', fileobj=file, **kwargs)
+
+
+def _bz2_file(file, level):
+    kwargs = {} if level is None else {'compresslevel': level}
+    return bz2.BZ2File(file, mode='wb', **kwargs)
+
+
+def _xz_file(file, level):
+    return lzma.LZMAFile(file, mode='wb', preset=level)
+
+
+def _zstd_file(file, level):
+    kwargs = {} if level is None else {'level': level}
+    return zstandard.ZstdCompressor(**kwargs).stream_writer(file, closefd=False)
+
+
+# compression feed option -> function returning a file object that compresses
+# what is written to it into the given file, without closing it when closed
+_FEED_COMPRESSIONS = {
+    'gzip': _gzip_file,
+    'bz2': _bz2_file,
+    'xz': _xz_file,
+    'zstd': _zstd_file,
+}
+
+
 def build_storage(builder, uri, *args, feed_options=None, preargs=(), **kwargs):
     argument_names = get_func_args(builder)
     if 'feed_options' in argument_names:
@@ -78,6 +124,183 @@ class BlockingFeedStorage:
         raise NotImplementedError
 
 
+class _StreamingUpload(io.RawIOBase):
+    """Writable file object that uploads its content in parts of
+    ``part_size`` bytes while it is being written, instead of keeping it in a
+    local temporary file until the feed is stored
+
+    Parts are uploaded one at a time in a background thread. At most
+    ``max_pending_parts`` parts are kept in memory: once that many are waiting
+    to be uploaded, writing blocks until the oldest one is done, so it must
+    not be written from the reactor thread.
+
+    Subclasses implement :meth:`_upload_part`, :meth:`_complete` and
+    :meth:`_abort`, which are never called concurrently.
+    """
+
+    max_pending_parts = 2
+
+    def __init__(self, part_size):
+        super().__init__()
+        self.part_size = part_size
+        self._buffer = bytearray()
+        self._position = 0
+        self._pending = deque()
+        self._submitted = 0
+        self._executor = ThreadPoolExecutor(max_workers=1)
+
+    def writable(self):
+        return True
+
+    def tell(self):
+        return self._position
+
+    def write(self, data):
+        self._buffer += data
+        self._position += len(data)
+        while len(self._buffer) >= self.part_size:
+            part = bytes(self._buffer[:self.part_size])
+            del self._buffer[:self.part_size]
+            self._submit(part)
+        return len(data)
+
+    def _submit(self, part):
+        while len(self._pending) >= self.max_pending_parts:
+            # re-raises any upload error in the writing thread
+            self._pending.popleft().result()
+        self._pending.append(self._executor.submit(self._upload_part, part))
+        self._submitted += 1
+
+    def finish(self):
+        """Upload the rest of the content and complete the upload, blocking
+        until it is done. The upload is aborted if any part failed."""
+        try:
+            while self._pending:
+                self._pending.popleft().result()
+            self._complete(bytes(self._buffer))
+        except Exception:
+            self._abort()
+            raise
+        finally:
+            self._buffer = bytearray()
+            self._executor.shutdown()
+
+    def _upload_part(self, data):
+        raise NotImplementedError
+
+    def _complete(self, data):
+        """Upload ``data``, which is smaller than a part and may be empty,
+        and complete the upload"""
+        raise NotImplementedError
+
+    def _abort(self):
+        raise NotImplementedError
+
+
+class _S3MultipartUpload(_StreamingUpload):
+    """Upload to S3 with a multipart upload, or with a single ``put_object``
+    call if the feed is smaller than a part
+
+    S3 allows up to ``max_parts`` parts per upload, so the part size doubles
+    every ``part_size_growth_interval`` parts, up to ``max_part_size``.
+    """
+
+    max_parts = 10000
+    max_part_size = 5 * 1024 ** 3
+    part_size_growth_interval = 1000
+
+    def __init__(self, client, bucket, key, acl, part_size):
+        super().__init__(part_size)
+        self.client = client
+        self.bucket = bucket
+        self.key = key
+        self.acl = acl
+        self.upload_id = None
+        self.parts = []
+
+    def _submit(self, part):
+        # the last part is uploaded when the upload is completed
+        if self._submitted >= self.max_parts - 1:
+            raise ValueError(f"The feed does not fit in the {self.max_parts} parts of an S3 multipart "
+                             f"upload, increase FEED_STORAGE_S3_PART_SIZE")
+        super()._submit(part)
+        if self._submitted % self.part_size_growth_interval == 0:
+            self.part_size = min(self.part_size * 2, self.max_part_size)
+
+    def _upload_part(self, data):
+        if self.upload_id is None:
+            kwargs = {'ACL': self.acl} if self.acl else {}
+            response = self.client.create_multipart_upload(
+                Bucket=self.bucket, Key=self.key, **kwargs)
+            self.upload_id = response['UploadId']
+        number = len(self.parts) + 1
+        response = self.client.upload_part(
+            Bucket=self.bucket, Key=self.key, UploadId=self.upload_id,
+            PartNumber=number, Body=data)
+        self.parts.append({'ETag': response['ETag'], 'PartNumber': number})
+
+    def _complete(self, data):
+        if self.upload_id is None:
+            kwargs = {'ACL': self.acl} if self.acl else {}
+            self.client.put_object(
+                Bucket=self.bucket, Key=self.key, Body=data, **kwargs)
+            return
+        if data:
+            # only the last part may be smaller than the minimum part size
+            self._upload_part(data)
+        self.client.complete_multipart_upload(
+            Bucket=self.bucket, Key=self.key, UploadId=self.upload_id,
+            MultipartUpload={'Parts': self.parts})
+
+    def _abort(self):
+        if self.upload_id is not None:
+            self.client.abort_multipart_upload(
+                Bucket=self.bucket, Key=self.key, UploadId=self.upload_id)
+
+
+class _GCSResumableUpload(_StreamingUpload):
+    """Upload to Google Cloud Storage with a resumable upload, or with a
+    single request if the feed is smaller than a part"""
+
+    # resumable upload chunks must be a multiple of 256 KiB
+    chunk_size_unit = 256 * 1024
+
+    def __init__(self, get_blob, acl, part_size):
+        part_size = -(-part_size // self.chunk_size_unit) * self.chunk_size_unit
+        super().__init__(part_size)
+        self.get_blob = get_blob
+        self.acl = acl
+        self.writer = None
+
+    def _upload_part(self, data):
+        if self.writer is None:
+            self.writer = self.get_blob().open(
+                'wb', chunk_size=self.part_size, predefined_acl=self.acl)
+        self.writer.write(data)
+
+    def _complete(self, data):
+        if self.writer is None:
+            self.get_blob().upload_from_string(data, predefined_acl=self.acl)
+            return
+        self.writer.write(data)
+        self.writer.close()
+
+    def _abort(self):
+        # unfinished resumable uploads expire on their own, and the blob
+        # is only created once the upload is complete
+        pass
+
+
+def _streaming_part_size(settings, name):
+    part_size = settings.getint(name)
+    if part_size and not settings.getbool('FEED_EXPORT_ASYNC'):
+        # streaming uploads block the thread that writes the feed
+        logger.warning("%(setting)s requires FEED_EXPORT_ASYNC, feeds are uploaded "
+                       "when they are closed instead", {'setting': name})
+        return 0
+    return part_size
+
+
 @implementer(IFeedStorage)
 class StdoutFeedStorage:
 
@@ -118,8 +341,11 @@ class FileFeedStorage:
 
 class S3FeedStorage(BlockingFeedStorage):
 
-    def __init__(self, uri, access_key=None, secret_key=None, acl=None, *,
-                 feed_options=None):
+    # S3 rejects multipart upload parts, other than the last one, under 5 MiB
+    min_part_size = 5 * 1024 * 1024
+
+    def __init__(self, uri, access_key=None, secret_key=None, acl=None,
+                 endpoint_url=None, *, feed_options=None, part_size=0):
         if not is_botocore_available():
             raise NotConfigured('missing botocore library')
         u = urlparse(uri)
@@ -128,11 +354,14 @@ class S3FeedStorage(BlockingFeedStorage):
         self.secret_key = u.password or secret_key
         self.keyname = u.path[1:]  # remove first "/"
         self.acl = acl
+        self.endpoint_url = endpoint_url
+        self.part_size = part_size and max(part_size, self.min_part_size)
         import botocore.session
         session = botocore.session.get_session()
         self.s3_client = session.create_client(
             's3', aws_access_key_id=self.access_key,
-            aws_secret_access_key=self.secret_key)
+            aws_secret_access_key=self.secret_key,
+            endpoint_url=self.endpoint_url)
         if feed_options and feed_options.get('overwrite', True) is False:
             logger.warning('S3 does not support appending to files. To '
                            'suppress this warning, remove the overwrite '
@@ -140,6 +369,12 @@ class S3FeedStorage(BlockingFeedStorage):
 
     @classmethod
     def from_crawler(cls, crawler, uri, *, feed_options=None):
+        # subclasses may not support the newer arguments
+        argument_names = get_func_args(cls)
+        kwargs = {
+            'endpoint_url': crawler.settings['AWS_ENDPOINT_URL'] or None,
+            'part_size': _streaming_part_size(crawler.settings, 'FEED_STORAGE_S3_PART_SIZE'),
+        }
         return build_storage(
             cls,
             uri,
@@ -147,9 +382,19 @@ class S3FeedStorage(BlockingFeedStorage):
             secret_key=crawler.settings['AWS_SECRET_ACCESS_KEY'],
             acl=crawler.settings['FEED_STORAGE_S3_ACL'] or None,
             feed_options=feed_options,
+            **{name: value for name, value in kwargs.items() if name in argument_names},
         )
 
+    def open(self, spider):
+        if not self.part_size:
+            return super().open(spider)
+        return _S3MultipartUpload(self.s3_client, self.bucketname, self.keyname,
+                                  self.acl, self.part_size)
+
     def _store_in_thread(self, file):
+        if isinstance(file, _StreamingUpload):
+            file.finish()
+            return
         file.seek(0)
         kwargs = {'ACL': self.acl} if self.acl else {}
         self.s3_client.put_object(
@@ -160,27 +405,44 @@ class S3FeedStorage(BlockingFeedStorage):
 
 class GCSFeedStorage(BlockingFeedStorage):
 
-    def __init__(self, uri, project_id, acl):
+    def __init__(self, uri, project_id, acl, part_size=0):
         self.project_id = project_id
         self.acl = acl
+        self.part_size = part_size
         u = urlparse(uri)
         self.bucket_name = u.hostname
         self.blob_name = u.path[1:]  # remove first "/"
 
     @classmethod
     def from_crawler(cls, crawler, uri):
+        kwargs = {}
+        # subclasses may not support the newer arguments
+        if 'part_size' in get_func_args(cls):
+            kwargs['part_size'] = _streaming_part_size(crawler.settings, 'FEED_STORAGE_GCS_PART_SIZE')
         return cls(
             uri,
             crawler.settings['GCS_PROJECT_ID'],
-            crawler.settings['FEED_STORAGE_GCS_ACL'] or None
+            crawler.settings['FEED_STORAGE_GCS_ACL'] or None,
+            **kwargs
         )
 
-    def _store_in_thread(self, file):
-        file.seek(0)
+    def open(self, spider):
+        if not self.part_size:
+            return super().open(spider)
+        return _GCSResumableUpload(self._get_blob, self.acl, self.part_size)
+
+    def _get_blob(self):
         from google.cloud.storage import Client
         client = Client(project=self.project_id)
         bucket = client.get_bucket(self.bucket_name)
-        blob = bucket.blob(self.blob_name)
+        return bucket.blob(self.blob_name)
+
+    def _store_in_thread(self, file):
+        if isinstance(file, _StreamingUpload):
+            file.finish()
+            return
+        file.seek(0)
+        blob = self._get_blob()
         blob.upload_from_file(file, predefined_acl=self.acl)
 
 
@@ -214,11 +476,93 @@ class FTPFeedStorage(BlockingFeedStorage):
         )
 
 
+class _FeedWriter:
+    """Runs the exporter calls of a feed, in order, in a thread of its own
+
+    The queue of pending calls is bounded: when it is full, :meth:`full`
+    makes the scraper back out, and the calls that do not fit wait in the
+    reactor thread until there is room, so that the reactor is never
+    blocked.
+    """
+
+    def __init__(self, queue_size):
+        self.queue = Queue(queue_size)
+        # (call, Deferred fired once it is queued), in the reactor thread
+        self.overflow = deque()
+        self.thread = threading.Thread(target=self._run, name='FeedWriter', daemon=True)
+        self.thread.start()
+
+    def call(self, f, *args):
+        """Queue a call of ``f`` with ``args``, and return ``None``, or a
+        Deferred fired once the call is queued if the queue is full"""
+        return self._put((f, args, None))
+
+    def call_deferred(self, f, *args):
+        """Like :meth:`call`, but return a Deferred fired with the result"""
+        d = defer.Deferred()
+        self._put((f, args, d))
+        return d
+
+    def full(self):
+        return bool(self.overflow) or self.queue.full()
+
+    def stop(self):
+        self._put(None)
+
+    def _put(self, call):
+        if not self.overflow:
+            try:
+                self.queue.put_nowait(call)
+                return None
+            except Full:
+                pass
+        queued = defer.Deferred()
+        self.overflow.append((call, queued))
+        # the writer thread may have made room in the meantime, without
+        # seeing the overflow
+        self._drain()
+        return queued
+
+    def _drain(self):
+        while self.overflow:
+            call, queued = self.overflow[0]
+            try:
+                self.queue.put_nowait(call)
+            except Full:
+                return
+            self.overflow.popleft()
+            queued.callback(None)
+
+    def _run(self):
+        from twisted.internet import reactor
+        while True:
+            call = self.queue.get()
+            if self.overflow:
+                reactor.callFromThread(self._drain)
+            if call is None:
+                return
+            f, args, d = call
+            try:
+                result = f(*args)
+            except Exception:
+                if d is None:
+                    logger.error("Error exporting item", exc_info=True)
+                else:
+                    reactor.callFromThread(d.errback, Failure())
+            else:
+                if d is not None:
+                    reactor.callFromThread(d.callback, result)
+
+
 class _FeedSlot:
-    def __init__(self, file, exporter, storage, uri, format, store_empty, batch_id, uri_template):
+    def __init__(self, file, exporter, storage, uri, format, store_empty, batch_id, uri_template,
+                 writer=None, compressed_file=None):
         self.file = file
+        # file object the exporter writes to, that compresses into file
+        self.compressed_file = compressed_file
         self.exporter = exporter
         self.storage = storage
+        self.writer = writer
         # feed params
         self.batch_id = batch_id
         self.format = format
@@ -228,6 +572,27 @@ class _FeedSlot:
         # flags
         self.itemcount = 0
         self._exporting = False
+        # batch rotation and timing
+        self.started = time()
+        self.closed = None
+        self.start_position = self._tell()
+        self.rotation_call = None
+
+    def _tell(self):
+        try:
+            return self.file.tell()
+        except (AttributeError, OSError, ValueError):
+            return None
+
+    def bytes_written(self):
+        """Return how many bytes have been written to the file of this batch
+        so far, or ``None`` if the file does not support :meth:`tell`"""
+        if self.start_position is None:
+            return None
+        position = self._tell()
+        if position is None:
+            return None
+        return position - self.start_position
 
     def start_exporting(self):
         if not self._exporting:
@@ -238,6 +603,13 @@ class _FeedSlot:
         if self._exporting:
             self.exporter.finish_exporting()
             self._exporting = False
+        if self.compressed_file is not None and not self.compressed_file.closed:
+            # writes the end of the compressed stream
+            self.compressed_file.close()
+
+    def export_item(self, item):
+        self.start_exporting()
+        self.exporter.export_item(item)
 
 
 class FeedExporter:
@@ -255,6 +627,10 @@ class FeedExporter:
         self.settings = crawler.settings
         self.feeds = {}
         self.slots = []
+        # uri template -> _FeedWriter, with FEED_EXPORT_ASYNC
+        self.writers = {}
+        # batches being closed, which can take a while with FEED_EXPORT_ASYNC
+        self._pending_deferreds = []
 
         if not self.settings['FEEDS'] and not self.settings['FEED_URI']:
             raise NotConfigured
@@ -285,8 +661,16 @@ class FeedExporter:
                 raise NotConfigured
             if not self._exporter_supported(feed_options['format']):
                 raise NotConfigured
+            if not self._compression_supported(feed_options.get('compression')):
+                raise NotConfigured
 
     def open_spider(self, spider):
+        if self.settings.getbool('FEED_EXPORT_ASYNC'):
+            queue_size = self.settings.getint('FEED_EXPORT_QUEUE_SIZE')
+            self.writers = {uri: _FeedWriter(queue_size) for uri in self.feeds}
+            scraper = getattr(getattr(self.crawler, 'engine', None), 'scraper', None)
+            if scraper is not None:
+                scraper.slot.backout_checks.append(self._writers_full)
         for uri, feed_options in self.feeds.items():
             uri_params = self._get_uri_params(spider, feed_options['uri_params'])
             self.slots.append(self._start_new_batch(
@@ -302,19 +686,47 @@ class FeedExporter:
         for slot in self.slots:
             d = self._close_slot(slot, spider)
             deferred_list.append(d)
+        deferred_list.extend(self._pending_deferreds)
+        for writer in self.writers.values():
+            writer.stop()
         return defer.DeferredList(deferred_list) if deferred_list else None
 
-    def _close_slot(self, slot, spider):
+    def _remove_pending_deferred(self, result, d):
+        self._pending_deferreds.remove(d)
+        return result
+
+    def _writers_full(self):
+        return any(writer.full() for writer in self.writers.values())
+
+    def _close_slot(self, slot, spider, background=False):
+        """Finish the batch of ``slot`` and store it.
+
+        If ``background`` is ``True``, the exporter is finished in a thread
+        instead of the reactor thread.
+        """
+        slot.closed = time()
+        if slot.rotation_call is not None and slot.rotation_call.active():
+            slot.rotation_call.cancel()
         if not slot.itemcount and not slot.store_empty:
             # We need to call slot.storage.store nonetheless to get the file
             # properly closed.
+            slot.finish_exporting()
             return defer.maybeDeferred(slot.storage.store, slot.file)
-        slot.finish_exporting()
         logfmt = "%s %%(format)s feed (%%(itemcount)d items) in: %%(uri)s"
         log_args = {'format': slot.format,
                     'itemcount': slot.itemcount,
                     'uri': slot.uri}
-        d = defer.maybeDeferred(slot.storage.store, slot.file)
+        if slot.writer is not None:
+            # Store the file once the queued items have been exported
+            d = slot.writer.call_deferred(slot.finish_exporting)
+            d.addCallback(lambda _: slot.storage.store(slot.file))
+        elif background:
+            d = threads.deferToThread(slot.finish_exporting)
+            d.addCallback(lambda _: slot.storage.store(slot.file))
+        else:
+            slot.finish_exporting()
+            d = defer.maybeDeferred(slot.storage.store, slot.file)
+        d.addCallback(self._record_batch_times, slot, spider)
 
         # Use `largs=log_args` to copy log_args into function's scope
         # instead of using `log_args` from the outer scope
@@ -326,6 +738,23 @@ class FeedExporter:
         )
         return d
 
+    def _record_batch_times(self, result, slot, spider):
+        stats = self.crawler.stats
+        open_time = slot.closed - slot.started
+        store_time = time() - slot.closed
+        stats.inc_value('feedexport/batches', spider=spider)
+        stats.max_value('feedexport/batch_open_time_max', open_time, spider=spider)
+        stats.max_value('feedexport/batch_store_time_max', store_time, spider=spider)
+        stats.inc_value('feedexport/batch_store_time_total', store_time, spider=spider)
+        logger.debug(
+            "Batch %(batch_id)d of %(uri)s was open for %(open_time).3fs "
+            "and stored in %(store_time).3fs",
+            {'batch_id': slot.batch_id, 'uri': slot.uri,
+             'open_time': open_time, 'store_time': store_time},
+            extra={'spider': spider},
+        )
+        return result
+
     def _handle_store_error(self, f, largs, logfmt, spider, slot_type):
         logger.error(
             logfmt % "Error storing", largs,
@@ -342,7 +771,8 @@ class FeedExporter:
     def _start_new_batch(self, batch_id, uri, feed_options, spider, uri_template):
         """
         Redirect the output data stream to a new file.
-        Execute multiple times if FEED_EXPORT_BATCH_ITEM_COUNT setting or FEEDS.batch_item_count is specified
+        Execute multiple times if batches are enabled, through the FEED_EXPORT_BATCH_ITEM_COUNT,
+        FEED_EXPORT_BATCH_MAX_SIZE or FEED_EXPORT_BATCH_INTERVAL settings or their feed options
         :param batch_id: sequence number of current batch
         :param uri: uri of the new batch to start
         :param feed_options: dict with parameters of feed
@@ -351,8 +781,12 @@ class FeedExporter:
         """
         storage = self._get_storage(uri, feed_options)
         file = storage.open(spider)
+        compressed_file = None
+        if feed_options.get('compression'):
+            compressed_file = _FEED_COMPRESSIONS[feed_options['compression']](
+                file, feed_options.get('compression_level'))
         exporter = self._get_exporter(
-            file=file,
+            file=compressed_file if compressed_file is not None else file,
             format=feed_options['format'],
             fields_to_export=feed_options['fields'],
             encoding=feed_options['encoding'],
@@ -368,34 +802,80 @@ class FeedExporter:
             store_empty=feed_options['store_empty'],
             batch_id=batch_id,
             uri_template=uri_template,
+            writer=self.writers.get(uri_template),
+            compressed_file=compressed_file,
         )
         if slot.store_empty:
-            slot.start_exporting()
+            if slot.writer is None:
+                slot.start_exporting()
+            else:
+                slot.writer.call(slot.start_exporting)
+        if feed_options['batch_interval']:
+            from twisted.internet import reactor
+            slot.rotation_call = reactor.callLater(
+                feed_options['batch_interval'], self._rotate_on_interval, slot, spider)
         return slot
 
     def item_scraped(self, item, spider):
         slots = []
+        # the calls that wait for room in the queue of a feed writer
+        queued = []
         for slot in self.slots:
-            slot.start_exporting()
-            slot.exporter.export_item(item)
+            if slot.writer is None:
+                slot.export_item(item)
+            else:
+                d = slot.writer.call(slot.export_item, item)
+                if d is not None:
+                    queued.append(d)
             slot.itemcount += 1
-            # create new slot for each slot with itemcount == FEED_EXPORT_BATCH_ITEM_COUNT and close the old one
-            if (
-                self.feeds[slot.uri_template]['batch_item_count']
-                and slot.itemcount >= self.feeds[slot.uri_template]['batch_item_count']
-            ):
-                uri_params = self._get_uri_params(spider, self.feeds[slot.uri_template]['uri_params'], slot)
-                self._close_slot(slot, spider)
-                slots.append(self._start_new_batch(
-                    batch_id=slot.batch_id + 1,
-                    uri=slot.uri_template % uri_params,
-                    feed_options=self.feeds[slot.uri_template],
-                    spider=spider,
-                    uri_template=slot.uri_template,
-                ))
+            # close the batches that are full and start new ones
+            reason = self._batch_full(slot)
+            if reason:
+                slots.append(self._rotate_batch(slot, spider, reason))
             else:
                 slots.append(slot)
         self.slots = slots
+        return defer.DeferredList(queued) if queued else None
+
+    def _batch_full(self, slot):
+        """Return why the batch of ``slot`` must be closed, if it must"""
+        feed_options = self.feeds[slot.uri_template]
+        if feed_options['batch_item_count'] and slot.itemcount >= feed_options['batch_item_count']:
+            return 'item_count'
+        if feed_options['batch_max_size']:
+            size = slot.bytes_written()
+            if size is not None and size >= feed_options['batch_max_size']:
+                return 'max_size'
+        return None
+
+    def _rotate_batch(self, slot, spider, reason):
+        """Close the batch of ``slot`` in the background and return the slot
+        of the next batch"""
+        self.crawler.stats.inc_value(f'feedexport/batch_rotations/{reason}', spider=spider)
+        feed_options = self.feeds[slot.uri_template]
+        uri_params = self._get_uri_params(spider, feed_options['uri_params'], slot)
+        d = self._close_slot(slot, spider, background=True)
+        if not d.called:
+            self._pending_deferreds.append(d)
+            d.addBoth(self._remove_pending_deferred, d)
+        return self._start_new_batch(
+            batch_id=slot.batch_id + 1,
+            uri=slot.uri_template % uri_params,
+            feed_options=feed_options,
+            spider=spider,
+            uri_template=slot.uri_template,
+        )
+
+    def _rotate_on_interval(self, slot, spider):
+        if slot not in self.slots:
+            return
+        if not slot.itemcount:
+            # nothing to deliver yet, wait for another interval
+            from twisted.internet import reactor
+            slot.rotation_call = reactor.callLater(
+                self.feeds[slot.uri_template]['batch_interval'], self._rotate_on_interval, slot, spider)
+            return
+        self.slots[self.slots.index(slot)] = self._rotate_batch(slot, spider, 'interval')
 
     def _load_components(self, setting_prefix):
         conf = without_none_values(self.settings.getwithbase(setting_prefix))
@@ -412,9 +892,21 @@ class FeedExporter:
             return True
         logger.error("Unknown feed format: %(format)s", {'format': format})
 
+    def _compression_supported(self, compression):
+        if not compression:
+            return True
+        if compression not in _FEED_COMPRESSIONS:
+            logger.error("Unknown feed compression: %(compression)s", {'compression': compression})
+        elif compression == 'zstd' and zstandard is None:
+            logger.error("Feed compression %(compression)s requires the zstandard library",
+                         {'compression': compression})
+        else:
+            return True
+
     def _settings_are_valid(self):
         """
-        If FEED_EXPORT_BATCH_ITEM_COUNT setting or FEEDS.batch_item_count is specified uri has to contain
+        If batches are enabled, through the FEED_EXPORT_BATCH_ITEM_COUNT, FEED_EXPORT_BATCH_MAX_SIZE or
+        FEED_EXPORT_BATCH_INTERVAL settings or their feed options, uri has to contain
         %(batch_time)s or %(batch_id)d to distinguish different files of partial output
         """
         for uri_template, values in self.feeds.items():
@@ -426,6 +918,16 @@ class FeedExporter:
                     ''.format(uri_template)
                 )
                 return False
+            batched = values['batch_max_size'] or values['batch_interval']
+            if batched and not re.search(r'%\(batch_time\)s|%\(batch_id\)', uri_template):
+                logger.error(
+                    '%(batch_time)s or %(batch_id)d must be in the feed URI ({}) if FEED_EXPORT_BATCH_MAX_SIZE '
+                    'or FEED_EXPORT_BATCH_INTERVAL, or their batch_max_size or batch_interval feed options, '
+                    'are greater than 0. For more info see: '
+                    'https://docs.scrapy.org/en/latest/topics/feed-exports.html#feed-export-batch-max-size'
+                    ''.format(uri_template)
+                )
+                return False
         return True
 
     def _storage_supported(self, uri, feed_options):
@@ -2,20 +2,34 @@ import gzip
 import logging
 import os
 import pickle
+import re
+import shutil
+import sqlite3
+import struct
+import zlib
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
 from email.utils import mktime_tz, parsedate_tz
 from importlib import import_module
 from time import time
 from weakref import WeakKeyDictionary
 
+from twisted.internet import defer, threads
+from twisted.python.threadpool import ThreadPool
 from w3lib.http import headers_raw_to_dict, headers_dict_to_raw
 
-from scrapy.http import Headers, Response
+from scrapy.http import Headers, Request, Response
 from scrapy.responsetypes import responsetypes
+from scrapy.utils.datatypes import LocalCache
 from scrapy.utils.httpobj import urlparse_cached
 from scrapy.utils.project import data_path
 from scrapy.utils.python import to_bytes, to_unicode
 from scrapy.utils.request import request_fingerprint
 
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
 
 logger = logging.getLogger(__name__)
 
@@ -150,6 +164,19 @@ class RFC2616Policy:
         # Use the cached response if the server says it hasn't changed.
         return response.status == 304
 
+    def freshness_expiry(self, cachedresponse, request):
+        """Return the time at which the cached response becomes stale, or
+        ``None`` if it cannot be revalidated with a conditional request"""
+        if b'Last-Modified' not in cachedresponse.headers and b'ETag' not in cachedresponse.headers:
+            return None
+        cc = self._parse_cachecontrol(cachedresponse)
+        if b'no-cache' in cc:
+            return None
+        now = time()
+        freshnesslifetime = self._compute_freshness_lifetime(cachedresponse, request, now)
+        currentage = self._compute_current_age(cachedresponse, request, now)
+        return now + max(0, freshnesslifetime - currentage)
+
     def _set_conditional_validators(self, request, cachedresponse):
         if b'Last-Modified' in cachedresponse.headers:
             request.headers[b'If-Modified-Since'] = cachedresponse.headers[b'Last-Modified']
@@ -254,6 +281,34 @@ class DbmCacheStorage:
         self.db[f'{key}_data'] = pickle.dumps(data, protocol=4)
         self.db[f'{key}_time'] = str(time())
 
+    def spider_names(self):
+        """Return the names of the spiders with a cache database."""
+        # some dbm modules add their own extensions to the file name
+        return _spider_names(self.cachedir, r'(.+?)\.db(\.\w+)?$')
+
+    def iter_entries(self, spider):
+        """Yield a ``(key, timestamp, size, request, response)`` tuple for
+        each response cached for the open spider, including expired ones.
+
+        The URL of the request is not stored, the response URL is used
+        instead. Bodies are read along with the rest of each response, one
+        response at a time, but are not part of the yielded responses."""
+        for tkey in self.db.keys():
+            tkey = to_unicode(tkey)
+            if not tkey.endswith('_time'):
+                continue
+            key = tkey[:-len('_time')]
+            rawdata = self.db[f'{key}_data']
+            data = pickle.loads(rawdata)
+            yield _cache_entry(key, float(self.db[tkey]), len(rawdata), data['url'], 'GET', {},
+                               data['status'], data['url'], data['headers'])
+
+    def delete_entries(self, spider, keys):
+        """Delete the responses cached for the given request fingerprints."""
+        for key in keys:
+            del self.db[f'{key}_data']
+            del self.db[f'{key}_time']
+
     def _read_data(self, spider, request):
         key = self._request_key(request)
         db = self.db
@@ -271,17 +326,149 @@ class DbmCacheStorage:
         return request_fingerprint(request)
 
 
+class SqliteCacheStorage:
+    """Storage backend that keeps the cached responses of each spider in a
+    SQLite database in WAL mode, so that several crawler processes can read
+    the same cache while another one writes to it."""
+
+    def __init__(self, settings):
+        self.cachedir = data_path(settings['HTTPCACHE_DIR'], createdir=True)
+        self.expiration_secs = settings.getint('HTTPCACHE_EXPIRATION_SECS')
+        self.batch_size = settings.getint('HTTPCACHE_SQLITE_BATCH_SIZE')
+        self.db = None
+        self._pending = 0
+
+    def open_spider(self, spider):
+        dbpath = os.path.join(self.cachedir, f'{spider.name}.sqlite')
+        self.db = sqlite3.connect(dbpath, timeout=60)
+        self.db.execute('PRAGMA journal_mode=WAL')
+        self.db.execute('PRAGMA synchronous=NORMAL')
+        self.db.execute(
+            'CREATE TABLE IF NOT EXISTS responses ('
+            'fingerprint TEXT PRIMARY KEY, timestamp REAL NOT NULL, '
+            'url TEXT, method TEXT, request_headers BLOB, request_body BLOB, '
+            'status INTEGER, response_url TEXT, headers BLOB, body BLOB)'
+        )
+        self.db.execute('CREATE INDEX IF NOT EXISTS responses_timestamp ON responses (timestamp)')
+        self.db.commit()
+
+        logger.debug("Using SQLite cache storage in %(cachepath)s" % {'cachepath': dbpath}, extra={'spider': spider})
+
+    def close_spider(self, spider):
+        self.db.commit()
+        self.db.close()
+
+    def retrieve_response(self, spider, request):
+        """Return response if present in cache, or None otherwise."""
+        row = self.db.execute(
+            'SELECT timestamp, status, response_url, headers, body FROM responses WHERE fingerprint = ?',
+            (request_fingerprint(request),),
+        ).fetchone()
+        if row is None:
+            return  # not cached
+        timestamp, status, url, rawheaders, body = row
+        if 0 < self.expiration_secs < time() - timestamp:
+            return  # expired
+        headers = Headers(headers_raw_to_dict(rawheaders))
+        respcls = responsetypes.from_args(headers=headers, url=url)
+        response = respcls(url=url, headers=headers, status=status, body=body)
+        return response
+
+    def store_response(self, spider, request, response):
+        """Store the given response in the cache."""
+        self.db.execute(
+            'INSERT OR REPLACE INTO responses VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)',
+            (request_fingerprint(request), time(), request.url, request.method,
+             headers_dict_to_raw(request.headers), request.body, response.status,
+             response.url, headers_dict_to_raw(response.headers), response.body),
+        )
+        self._pending += 1
+        if self._pending >= self.batch_size:
+            self.db.commit()
+            self._pending = 0
+
+    def delete_expired(self, expiration_secs=None):
+        """Delete the responses stored more than *expiration_secs* seconds
+        ago (``HTTPCACHE_EXPIRATION_SECS`` by default) and return how many
+        were deleted."""
+        if expiration_secs is None:
+            expiration_secs = self.expiration_secs
+        if expiration_secs <= 0:
+            return 0
+        cursor = self.db.execute('DELETE FROM responses WHERE timestamp < ?', (time() - expiration_secs,))
+        self.db.commit()
+        self._pending = 0
+        return cursor.rowcount
+
+    def spider_names(self):
+        """Return the names of the spiders with a cache database."""
+        return _spider_names(self.cachedir, r'(.+)\.sqlite$')
+
+    def iter_entries(self, spider):
+        """Yield a ``(key, timestamp, size, request, response)`` tuple for
+        each response cached for the open spider, including expired ones.
+        Bodies are not loaded."""
+        cursor = self.db.execute(
+            'SELECT fingerprint, timestamp, '
+            'length(request_headers) + length(request_body) + length(headers) + length(body), '
+            'url, method, request_headers, status, response_url, headers FROM responses'
+        )
+        for key, timestamp, size, url, method, rawreqheaders, status, response_url, rawheaders in cursor:
+            yield _cache_entry(key, timestamp, size or 0, url, method, headers_raw_to_dict(rawreqheaders),
+                               status, response_url, headers_raw_to_dict(rawheaders))
+
+    def delete_entries(self, spider, keys):
+        """Delete the responses cached for the given request fingerprints."""
+        self.db.executemany('DELETE FROM responses WHERE fingerprint = ?', ((key,) for key in keys))
+        self.db.commit()
+        self._pending = 0
+
+    def compact(self):
+        """Give the space of deleted responses back to the file system."""
+        self.db.commit()
+        self._pending = 0
+        self.db.execute('VACUUM')
+        self.db.execute('PRAGMA wal_checkpoint(TRUNCATE)')
+
+
 class FilesystemCacheStorage:
 
+    _max_dict_training_rounds = 4
+    # dictionaries, compressors and decompressors are kept for this many
+    # domains, least recently used first out
+    _max_codec_domains = 16
+    # sample paths are kept for this many domains that have no dictionary yet
+    _max_sampled_domains = 1000
+    # zstd recommends about 100 times the dictionary size of training data
+    _max_dict_training_size_factor = 100
+
     def __init__(self, settings):
         self.cachedir = data_path(settings['HTTPCACHE_DIR'])
         self.expiration_secs = settings.getint('HTTPCACHE_EXPIRATION_SECS')
         self.use_gzip = settings.getbool('HTTPCACHE_GZIP')
         self._open = gzip.open if self.use_gzip else open
+        self.use_zstd_dict = settings.getbool('HTTPCACHE_ZSTD_DICT_ENABLED')
+        if self.use_zstd_dict and zstandard is None:
+            logger.warning("HTTPCACHE_ZSTD_DICT_ENABLED requires the zstandard library, "
+                           "storing response bodies without zstd compression")
+            self.use_zstd_dict = False
+        if self.use_zstd_dict:
+            self.zstd_level = settings.getint('HTTPCACHE_ZSTD_LEVEL')
+            self.zstd_dict_samples = settings.getint('HTTPCACHE_ZSTD_DICT_SAMPLES')
+            self.zstd_dict_size = settings.getint('HTTPCACHE_ZSTD_DICT_SIZE')
+            self._dictionaries = LocalCache(self._max_codec_domains)  # domain -> ZstdCompressionDict or None
+            self._samples = LocalCache(self._max_sampled_domains)  # domain -> [response body path] or None
+            self._compressors = LocalCache(self._max_codec_domains)
+            self._decompressors = LocalCache(self._max_codec_domains)
 
     def open_spider(self, spider):
         logger.debug("Using filesystem cache storage in %(cachedir)s" % {'cachedir': self.cachedir},
                      extra={'spider': spider})
+        if self.use_zstd_dict:
+            self._dictionaries.clear()
+            self._samples.clear()
+            self._compressors.clear()
+            self._decompressors.clear()
 
     def close_spider(self, spider):
         pass
@@ -292,8 +479,19 @@ class FilesystemCacheStorage:
         if metadata is None:
             return  # not cached
         rpath = self._get_request_path(spider, request)
-        with self._open(os.path.join(rpath, 'response_body'), 'rb') as f:
-            body = f.read()
+        zstdpath = os.path.join(rpath, 'response_body.zst')
+        if self.use_zstd_dict and os.path.exists(zstdpath):
+            with open(zstdpath, 'rb') as f:
+                body = self._zstd_decompress(spider, request, f.read())
+            if body is None:
+                return None  # cannot be decompressed
+        else:
+            try:
+                with self._open(os.path.join(rpath, 'response_body'), 'rb') as f:
+                    body = f.read()
+            except FileNotFoundError:
+                # compressed with a zstd dictionary, which is not enabled
+                return None
         with self._open(os.path.join(rpath, 'response_headers'), 'rb') as f:
             rawheaders = f.read()
         url = metadata.get('response_url')
@@ -321,13 +519,183 @@ class FilesystemCacheStorage:
             pickle.dump(metadata, f, protocol=4)
         with self._open(os.path.join(rpath, 'response_headers'), 'wb') as f:
             f.write(headers_dict_to_raw(response.headers))
-        with self._open(os.path.join(rpath, 'response_body'), 'wb') as f:
-            f.write(response.body)
+        if self.use_zstd_dict:
+            self._store_zstd_body(spider, request, rpath, response.body)
+        else:
+            with self._open(os.path.join(rpath, 'response_body'), 'wb') as f:
+                f.write(response.body)
         with self._open(os.path.join(rpath, 'request_headers'), 'wb') as f:
             f.write(headers_dict_to_raw(request.headers))
         with self._open(os.path.join(rpath, 'request_body'), 'wb') as f:
             f.write(request.body)
 
+    def _store_zstd_body(self, spider, request, rpath, body):
+        """Store the response body compressed with the zstd dictionary of
+        the request domain, or uncompressed while the first
+        ``HTTPCACHE_ZSTD_DICT_SAMPLES`` responses of the domain are being
+        collected to train that dictionary."""
+        domain = self._get_domain(request)
+        zdict = self._get_dictionary(spider, domain)
+        bodypath = os.path.join(rpath, 'response_body')
+        if zdict is not None:
+            self._write_zstd_body(domain, zdict, bodypath, body)
+            return
+        with self._open(bodypath, 'wb') as f:
+            f.write(body)
+        zstdpath = bodypath + '.zst'
+        if os.path.exists(zstdpath):
+            os.remove(zstdpath)
+        # the samples are read back from the cache when the dictionary is
+        # trained, so that their bodies are not kept in memory meanwhile
+        if domain not in self._samples:
+            self._samples[domain] = []
+        samples = self._samples[domain]
+        if body and samples is not None:
+            samples.append(bodypath)
+            if len(samples) % self.zstd_dict_samples == 0:
+                self._train_dictionary(spider, domain)
+
+    def _write_zstd_body(self, domain, zdict, bodypath, body):
+        compressor = self._get_cached(
+            self._compressors, domain, lambda: zstandard.ZstdCompressor(level=self.zstd_level, dict_data=zdict))
+        with open(bodypath + '.zst', 'wb') as f:
+            f.write(compressor.compress(body))
+        if os.path.exists(bodypath):
+            os.remove(bodypath)
+
+    def _read_samples(self, samples):
+        max_size = self._max_dict_training_size_factor * self.zstd_dict_size
+        bodies, size = [], 0
+        for bodypath in samples:
+            if size >= max_size:
+                break
+            body = self._read_sample(bodypath)
+            if body:
+                bodies.append(body)
+                size += len(body)
+        return bodies
+
+    def _read_sample(self, bodypath):
+        # samples may have been overwritten since, and compressed
+        try:
+            with self._open(bodypath, 'rb') as f:
+                return f.read()
+        except FileNotFoundError:
+            return None
+
+    def _train_dictionary(self, spider, domain):
+        samples = self._samples[domain]
+        try:
+            zdict = zstandard.train_dictionary(
+                self.zstd_dict_size, self._read_samples(samples), level=self.zstd_level)
+        except zstandard.ZstdError as e:
+            # too few or too small samples, retry with more of them a few times
+            logger.debug("Could not train a zstd dictionary for %(domain)s: %(error)s",
+                         {'domain': domain, 'error': e}, extra={'spider': spider})
+            if len(samples) >= self._max_dict_training_rounds * self.zstd_dict_samples:
+                self._samples[domain] = None
+            return
+        # domains with a dictionary do not need samples anymore
+        del self._samples[domain]
+        dictpath = self._get_dictionary_path(spider, domain)
+        os.makedirs(os.path.dirname(dictpath), exist_ok=True)
+        with open(dictpath, 'wb') as f:
+            f.write(zdict.as_bytes())
+        self._dictionaries[domain] = zdict
+        # recompress the samples with the dictionary they were used to train
+        for bodypath in samples:
+            body = self._read_sample(bodypath)
+            if body is not None:
+                self._write_zstd_body(domain, zdict, bodypath, body)
+
+    def _zstd_decompress(self, spider, request, data):
+        """Return the decompressed body, or ``None`` if it cannot be
+        decompressed, e.g. because the dictionary file is missing"""
+        domain = self._get_domain(request)
+        zdict = self._get_dictionary(spider, domain)
+        if zdict is None:
+            logger.warning("Missing zstd dictionary of %(domain)s, ignoring its compressed cached responses",
+                           {'domain': domain}, extra={'spider': spider})
+            return None
+        decompressor = self._get_cached(
+            self._decompressors, domain, lambda: zstandard.ZstdDecompressor(dict_data=zdict))
+        try:
+            return decompressor.decompress(data)
+        except zstandard.ZstdError as e:
+            logger.warning("Ignoring cached response of %(request)s: %(error)s",
+                           {'request': request, 'error': e}, extra={'spider': spider})
+            return None
+
+    def _get_dictionary(self, spider, domain):
+        return self._get_cached(self._dictionaries, domain, lambda: self._load_dictionary(spider, domain))
+
+    def _load_dictionary(self, spider, domain):
+        dictpath = self._get_dictionary_path(spider, domain)
+        if not os.path.exists(dictpath):
+            return None
+        with open(dictpath, 'rb') as f:
+            return zstandard.ZstdCompressionDict(f.read())
+
+    def _get_cached(self, cache, domain, factory):
+        if domain in cache:
+            cache.move_to_end(domain)
+            return cache[domain]
+        value = cache[domain] = factory()
+        return value
+
+    def _get_dictionary_path(self, spider, domain):
+        return os.path.join(self.cachedir, spider.name, 'zstd_dictionaries', domain)
+
+    def _get_domain(self, request):
+        return urlparse_cached(request).hostname or '-'
+
+    def spider_names(self):
+        """Return the names of the spiders with a cache directory."""
+        return _spider_names(self.cachedir)
+
+    def iter_entries(self, spider):
+        """Yield a ``(key, timestamp, size, request, response)`` tuple for
+        each response cached for the open spider, including expired ones.
+
+        Bodies are not loaded. The cache directory is read by several
+        threads."""
+        spiderdir = os.path.join(self.cachedir, spider.name)
+        if not os.path.isdir(spiderdir):
+            return
+        prefixdirs = [os.path.join(spiderdir, name) for name in os.listdir(spiderdir) if len(name) == 2]
+        with ThreadPoolExecutor() as executor:
+            for entries in executor.map(self._read_entries, prefixdirs):
+                yield from entries
+
+    def delete_entries(self, spider, keys):
+        """Delete the responses cached for the given request fingerprints."""
+        rpaths = [os.path.join(self.cachedir, spider.name, key[0:2], key) for key in keys]
+        with ThreadPoolExecutor() as executor:
+            for _ in executor.map(shutil.rmtree, rpaths):
+                pass
+
+    def _read_entries(self, prefixdir):
+        entries = []
+        for key in os.listdir(prefixdir):
+            rpath = os.path.join(prefixdir, key)
+            metapath = os.path.join(rpath, 'pickled_meta')
+            try:
+                timestamp = os.stat(metapath).st_mtime
+                with self._open(metapath, 'rb') as f:
+                    metadata = pickle.load(f)
+                with self._open(os.path.join(rpath, 'request_headers'), 'rb') as f:
+                    rawreqheaders = f.read()
+                with self._open(os.path.join(rpath, 'response_headers'), 'rb') as f:
+                    rawheaders = f.read()
+                size = sum(entry.stat().st_size for entry in os.scandir(rpath))
+            except FileNotFoundError:
+                continue  # incomplete or just deleted
+            entries.append(_cache_entry(
+                key, timestamp, size, metadata['url'], metadata['method'],
+                headers_raw_to_dict(rawreqheaders), metadata['status'],
+                metadata['response_url'], headers_raw_to_dict(rawheaders)))
+        return entries
+
     def _get_request_path(self, spider, request):
         key = request_fingerprint(request)
         return os.path.join(self.cachedir, spider.name, key[0:2], key)
@@ -344,6 +712,478 @@ class FilesystemCacheStorage:
             return pickle.load(f)
 
 
+class LogStructuredCacheStorage:
+    """Append-only storage backend that keeps all the cached responses of a
+    spider in a few large segment files instead of one directory per
+    response.
+
+    Each record is made of a fixed-size header (see ``_header``) followed by
+    the pickled request/response data, optionally compressed with zlib. An
+    in-memory index, rebuilt on ``open_spider`` by reading the record
+    headers, maps request fingerprints to the location of their latest
+    record.
+    """
+
+    _header = struct.Struct('>4sBd20sII')  # magic, flags, timestamp, key, size, crc32
+    _magic = b'SCLS'
+    _flag_compressed = 1
+    _flag_deleted = 2
+
+    def __init__(self, settings):
+        self.cachedir = data_path(settings['HTTPCACHE_DIR'])
+        self.expiration_secs = settings.getint('HTTPCACHE_EXPIRATION_SECS')
+        self.use_gzip = settings.getbool('HTTPCACHE_GZIP')
+        self.segment_size = settings.getint('HTTPCACHE_LOG_SEGMENT_SIZE')
+        self.compact_ratio = settings.getfloat('HTTPCACHE_LOG_COMPACT_RATIO')
+        self.index = {}
+        self._garbage = {}
+        self._segments = []
+        self._readers = {}
+        self._writer = None
+
+    def open_spider(self, spider):
+        self.spiderdir = os.path.join(self.cachedir, spider.name)
+        os.makedirs(self.spiderdir, exist_ok=True)
+        self._load()
+        logger.debug("Using log-structured cache storage in %(cachedir)s" % {'cachedir': self.spiderdir},
+                     extra={'spider': spider})
+
+    def close_spider(self, spider):
+        if self.compact_ratio and self.garbage_ratio() >= self.compact_ratio:
+            self.compact()
+        self._close_files()
+
+    def retrieve_response(self, spider, request):
+        """Return response if present in cache, or None otherwise."""
+        data = self._read_data(request_fingerprint(request))
+        if data is None:
+            return  # not cached
+        url = data['response_url']
+        status = data['status']
+        headers = Headers(data['headers'])
+        body = data['body']
+        respcls = responsetypes.from_args(headers=headers, url=url)
+        response = respcls(url=url, headers=headers, status=status, body=body)
+        return response
+
+    def store_response(self, spider, request, response):
+        """Store the given response in the cache."""
+        data = {
+            'url': request.url,
+            'method': request.method,
+            'request_headers': dict(request.headers),
+            'request_body': request.body,
+            'status': response.status,
+            'response_url': response.url,
+            'headers': dict(response.headers),
+            'body': response.body,
+        }
+        self._append(request_fingerprint(request), pickle.dumps(data, protocol=4))
+
+    def delete(self, key):
+        """Remove the record stored for the given request fingerprint."""
+        if key in self.index:
+            self._append(key, b'', flags=self._flag_deleted)
+
+    def spider_names(self):
+        """Return the names of the spiders with a cache directory."""
+        return _spider_names(self.cachedir)
+
+    def iter_entries(self, spider):
+        """Yield a ``(key, timestamp, size, request, response)`` tuple for
+        each response cached for the open spider, including expired ones.
+
+        Record headers do not include the request and response headers, so
+        each record is read in full, one at a time, but bodies are not part
+        of the yielded responses. Corrupted records are skipped."""
+        for key, location in list(self.index.items()):
+            record = self._read_valid_record(key, location)
+            if record is None:
+                continue
+            data = pickle.loads(record[1])
+            yield _cache_entry(key, location[3], location[2], data['url'], data['method'],
+                               data['request_headers'], data['status'], data['response_url'],
+                               data['headers'])
+
+    def delete_entries(self, spider, keys):
+        """Delete the responses cached for the given request fingerprints."""
+        for key in keys:
+            self.delete(key)
+
+    def garbage_ratio(self):
+        """Return the fraction of the segment files used by records that
+        have been overwritten or deleted."""
+        total = sum(self._segment_sizes().values())
+        return sum(self._garbage.values()) / total if total else 0
+
+    def compact(self):
+        """Copy the live, non-expired records of the segments that contain
+        overwritten or deleted records into a new segment, and remove those
+        segments."""
+        sealed = [n for n in self._segments if self._garbage.get(n)]
+        if not sealed:
+            return
+        self._rotate()
+        for number in sealed:
+            for key, location in list(self.index.items()):
+                if location[0] != number:
+                    continue
+                if self._is_expired(location[3]):
+                    del self.index[key]
+                    continue
+                record = self._read_valid_record(key, location)
+                if record is not None:
+                    self._append(key, record[1], flags=record[0], timestamp=location[3])
+            # older segments first, so that a deleted record is never
+            # resurrected by removing its tombstone before the record itself
+            reader = self._readers.pop(number, None)
+            if reader is not None:
+                reader.close()
+            os.remove(self._segment_path(number))
+            self._segments.remove(number)
+            self._garbage.pop(number, None)
+
+    def _segment_path(self, number):
+        return os.path.join(self.spiderdir, f'{number:08d}.log')
+
+    def _segment_sizes(self):
+        return {n: os.path.getsize(self._segment_path(n)) for n in self._segments}
+
+    def _load(self):
+        self._close_files()
+        self.index = {}
+        self._garbage = {}
+        self._segments = sorted(
+            int(name[:-4]) for name in os.listdir(self.spiderdir)
+            if name.endswith('.log') and name[:-4].isdigit()
+        )
+        for number in self._segments:
+            self._scan_segment(number)
+
+    def _scan_segment(self, number):
+        path = self._segment_path(number)
+        with open(path, 'rb') as f:
+            file_size = os.fstat(f.fileno()).st_size
+            offset = 0
+            while offset < file_size:
+                header = self._read_header(f, offset, file_size)
+                if header is None:
+                    # a corrupted record is skipped, unless nothing valid
+                    # follows it, i.e. it is a partially written tail
+                    next_offset = self._find_record(f, offset + 1, file_size)
+                    if next_offset is None:
+                        break
+                    logger.warning("Skipping %(size)d corrupted bytes of HTTP cache segment %(path)s "
+                                   "at offset %(offset)s",
+                                   {'size': next_offset - offset, 'path': path, 'offset': offset})
+                    self._garbage[number] = self._garbage.get(number, 0) + next_offset - offset
+                    offset = next_offset
+                    continue
+                flags, timestamp, key, size, crc = header
+                length = self._header.size + size
+                previous = self.index.pop(key, None)
+                if previous is not None:
+                    self._garbage[previous[0]] = self._garbage.get(previous[0], 0) + previous[2]
+                if flags & self._flag_deleted:
+                    self._garbage[number] = self._garbage.get(number, 0) + length
+                else:
+                    self.index[key] = (number, offset, length, timestamp)
+                offset += length
+        if offset < file_size:
+            logger.warning("Truncating partially written record at the end of HTTP cache segment "
+                           "%(path)s at offset %(offset)s", {'path': path, 'offset': offset})
+            with open(path, 'r+b') as f:
+                f.truncate(offset)
+
+    def _read_header(self, f, offset, file_size):
+        """Return the ``(flags, timestamp, key, size, crc)`` of the record at
+        ``offset``, or ``None`` if there is no complete record there"""
+        f.seek(offset)
+        header = f.read(self._header.size)
+        if len(header) < self._header.size:
+            return None
+        magic, flags, timestamp, rawkey, size, crc = self._header.unpack(header)
+        if magic != self._magic or offset + self._header.size + size > file_size:
+            return None
+        return flags, timestamp, rawkey.hex(), size, crc
+
+    def _find_record(self, f, offset, file_size):
+        """Return the offset of the first record from ``offset`` whose
+        checksum matches, or ``None``"""
+        chunk_size = 1024 * 1024
+        while offset < file_size:
+            f.seek(offset)
+            chunk = f.read(chunk_size + len(self._magic) - 1)
+            position = chunk.find(self._magic)
+            while position != -1:
+                header = self._read_header(f, offset + position, file_size)
+                if header is not None and zlib.crc32(f.read(header[3])) == header[4]:
+                    return offset + position
+                position = chunk.find(self._magic, position + 1)
+            offset += chunk_size
+        return None
+
+    def _append(self, key, payload, flags=0, timestamp=None):
+        if payload and self.use_gzip and not flags & self._flag_compressed:
+            payload = zlib.compress(payload)
+            flags |= self._flag_compressed
+        if timestamp is None:
+            timestamp = time()
+        header = self._header.pack(self._magic, flags, timestamp, bytes.fromhex(key),
+                                   len(payload), zlib.crc32(payload))
+        writer = self._get_writer(len(header) + len(payload))
+        number = self._segments[-1]
+        offset = writer.tell()
+        writer.write(header + payload)
+        writer.flush()
+        length = len(header) + len(payload)
+        previous = self.index.pop(key, None)
+        if previous is not None:
+            self._garbage[previous[0]] = self._garbage.get(previous[0], 0) + previous[2]
+        if flags & self._flag_deleted:
+            self._garbage[number] = self._garbage.get(number, 0) + length
+        else:
+            self.index[key] = (number, offset, length, timestamp)
+
+    def _get_writer(self, size):
+        if self._writer is not None and self.segment_size and self._writer.tell() + size > self.segment_size:
+            self._rotate()
+        if self._writer is None:
+            if not self._segments:
+                self._segments.append(1)
+            self._writer = open(self._segment_path(self._segments[-1]), 'ab')
+        return self._writer
+
+    def _rotate(self):
+        if self._writer is not None:
+            self._writer.close()
+            self._writer = None
+        self._segments.append(self._segments[-1] + 1 if self._segments else 1)
+        open(self._segment_path(self._segments[-1]), 'ab').close()
+
+    def _is_expired(self, timestamp):
+        return 0 < self.expiration_secs < time() - timestamp
+
+    def _read_data(self, key):
+        location = self.index.get(key)
+        if location is None:
+            return  # not found
+        if self._is_expired(location[3]):
+            return  # expired
+        record = self._read_valid_record(key, location)
+        if record is None:
+            return  # corrupted
+        return pickle.loads(record[1])
+
+    def _read_valid_record(self, key, location):
+        """Like :meth:`_read_record`, but log a corrupted record, drop it
+        from the index and return ``None``"""
+        try:
+            return self._read_record(location)
+        except (ValueError, struct.error, zlib.error) as e:
+            logger.warning("Ignoring HTTP cache record %(key)s: %(error)s", {'key': key, 'error': e})
+            del self.index[key]
+            self._garbage[location[0]] = self._garbage.get(location[0], 0) + location[2]
+            return None
+
+    def _read_record(self, location):
+        number, offset, length, timestamp = location
+        if self._writer is not None:
+            self._writer.flush()
+        reader = self._readers.get(number)
+        if reader is None:
+            reader = self._readers[number] = open(self._segment_path(number), 'rb')
+        reader.seek(offset)
+        record = reader.read(length)
+        magic, flags, timestamp, rawkey, size, crc = self._header.unpack_from(record)
+        payload = record[self._header.size:]
+        if zlib.crc32(payload) != crc:
+            raise ValueError(f'Corrupted HTTP cache record in {self._segment_path(number)} at offset {offset}')
+        if flags & self._flag_compressed:
+            payload = zlib.decompress(payload)
+        return flags & ~self._flag_compressed, payload
+
+    def _close_files(self):
+        for reader in self._readers.values():
+            reader.close()
+        self._readers = {}
+        if self._writer is not None:
+            self._writer.close()
+            self._writer = None
+
+
+class ThreadedCacheStorage:
+    """Wraps a storage backend so that its methods run in a dedicated
+    thread instead of the reactor thread, and return Deferreds.
+
+    All calls to the wrapped storage happen in the same thread, in order, so
+    storages do not need to be thread-safe. Responses stored during the same
+    reactor iteration are written in a single batch; until they are written,
+    they are served from memory.
+    """
+
+    def __init__(self, storage):
+        self.storage = storage
+        self._threadpool = None
+        self._pending = {}
+        self._flush_call = None
+
+    def open_spider(self, spider):
+        self._threadpool = ThreadPool(minthreads=1, maxthreads=1,
+                                      name=f'{type(self.storage).__name__}')
+        self._threadpool.start()
+        return self._call(self.storage.open_spider, spider)
+
+    def close_spider(self, spider):
+        self._flush()
+        d = self._call(self.storage.close_spider, spider)
+        d.addBoth(self._stop_threadpool)
+        return d
+
+    def retrieve_response(self, spider, request):
+        key = request_fingerprint(request)
+        if key in self._pending:
+            response = self._pending[key][2]
+            return defer.succeed(response.replace(flags=list(response.flags)))
+        return self._call(self.storage.retrieve_response, spider, request)
+
+    def store_response(self, spider, request, response):
+        # copy the response, later middlewares may modify it before it is written
+        self._pending[request_fingerprint(request)] = (spider, request, response.replace())
+        if self._flush_call is None:
+            from twisted.internet import reactor
+            self._flush_call = reactor.callLater(0, self._flush)
+
+    def _flush(self):
+        if self._flush_call is not None:
+            if self._flush_call.active():
+                self._flush_call.cancel()
+            self._flush_call = None
+        if not self._pending:
+            return
+        batch, self._pending = list(self._pending.values()), {}
+        d = self._call(self._store_batch, batch)
+        d.addErrback(lambda failure: logger.error(
+            "Error storing responses in the HTTP cache",
+            exc_info=(failure.type, failure.value, failure.getTracebackObject())))
+
+    def _store_batch(self, batch):
+        for spider, request, response in batch:
+            self.storage.store_response(spider, request, response)
+
+    def _call(self, f, *args):
+        from twisted.internet import reactor
+        return threads.deferToThreadPool(reactor, self._threadpool, f, *args)
+
+    def _stop_threadpool(self, result):
+        self._threadpool.stop()
+        self._threadpool = None
+        return result
+
+    def __getattr__(self, name):
+        return getattr(self.storage, name)
+
+
+class MemoryCacheStorage:
+    """Wraps a storage backend with an in-memory, least recently used cache
+    of responses, bounded by the total size of the cached responses.
+
+    Responses are added to the memory cache when they are stored. They are
+    also added when they are retrieved from the wrapped storage if cached
+    responses never expire, since the time at which the wrapped storage
+    stored them is unknown.
+    """
+
+    def __init__(self, storage, max_size, expiration_secs=0, stats=None):
+        self.storage = storage
+        self.max_size = max_size
+        self.expiration_secs = expiration_secs
+        self.stats = stats
+        self.size = 0
+        self._responses = OrderedDict()  # fingerprint -> (timestamp, size, response)
+
+    def open_spider(self, spider):
+        return self.storage.open_spider(spider)
+
+    def close_spider(self, spider):
+        self._responses.clear()
+        self.size = 0
+        return self.storage.close_spider(spider)
+
+    def retrieve_response(self, spider, request):
+        key = request_fingerprint(request)
+        entry = self._responses.get(key)
+        if entry is not None and 0 < self.expiration_secs < time() - entry[0]:
+            self._remove(key)
+            entry = None
+        if entry is not None:
+            self._responses.move_to_end(key)
+            self._inc_stats('hit', spider)
+            return entry[2].replace()
+        self._inc_stats('miss', spider)
+        response = self.storage.retrieve_response(spider, request)
+        if isinstance(response, defer.Deferred):
+            return response.addCallback(self._retrieved, spider, key)
+        return self._retrieved(response, spider, key)
+
+    def store_response(self, spider, request, response):
+        self._add(spider, request_fingerprint(request), response)
+        return self.storage.store_response(spider, request, response)
+
+    def _retrieved(self, response, spider, key):
+        if response is not None and not self.expiration_secs:
+            self._add(spider, key, response)
+        return response
+
+    def _add(self, spider, key, response):
+        if key in self._responses:
+            self._remove(key)
+        size = self._response_size(response)
+        if size > self.max_size:
+            return
+        respcls = responsetypes.from_args(headers=response.headers, url=response.url)
+        response = response.replace(cls=respcls, request=None, flags=None)
+        self._responses[key] = (time(), size, response)
+        self.size += size
+        while self.size > self.max_size:
+            self._remove(next(iter(self._responses)))
+            self._inc_stats('eviction', spider)
+
+    def _remove(self, key):
+        _, size, _ = self._responses.pop(key)
+        self.size -= size
+
+    def _response_size(self, response):
+        return (len(response.url) + len(response.body)
+                + sum(len(k) + sum(len(v) for v in vs) for k, vs in response.headers.items()))
+
+    def _inc_stats(self, key, spider):
+        if self.stats is not None:
+            self.stats.inc_value(f'httpcache/memory/{key}', spider=spider)
+
+    def __getattr__(self, name):
+        return getattr(self.storage, name)
+
+
+def _spider_names(cachedir, pattern=None):
+    """Return the spider names taken from the file names in *cachedir* that
+    match *pattern*, or from its subdirectories if *pattern* is ``None``."""
+    if not os.path.isdir(cachedir):
+        return []
+    if pattern is None:
+        return sorted(name for name in os.listdir(cachedir) if os.path.isdir(os.path.join(cachedir, name)))
+    matches = (re.match(pattern, name) for name in os.listdir(cachedir))
+    return sorted({match.group(1) for match in matches if match})
+
+
+def _cache_entry(key, timestamp, size, url, method, request_headers, status, response_url, headers):
+    request = Request(url, method=method, headers=request_headers)
+    headers = Headers(headers)
+    respcls = responsetypes.from_args(headers=headers, url=response_url)
+    response = respcls(url=response_url, headers=headers, status=status)
+    return key, timestamp, size, request, response
+
+
 def parse_cachecontrol(header):
     """Parse Cache-Control header
 
@@ -4,23 +4,213 @@ Item pipeline
 See documentation in docs/item-pipeline.rst
 """
 
+import inspect
+import logging
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from multiprocessing.util import Finalize
+
+from twisted.internet import defer, threads
+from twisted.python.failure import Failure
+
 from scrapy.middleware import MiddlewareManager
 from scrapy.utils.conf import build_component_list
-from scrapy.utils.defer import deferred_f_from_coro_f
+from scrapy.utils.defer import deferred_f_from_coro_f, deferred_from_concurrent_future
+
+
+logger = logging.getLogger(__name__)
+
+
+# pipelines of the current process, when it is a worker of a process pool
+_worker_pipelines = None
+
+
+def _init_worker(pipelines):
+    global _worker_pipelines
+    _worker_pipelines = pipelines
+    # workers exit when the executor is shut down, which waits for them
+    Finalize(None, _close_worker_pipelines, exitpriority=10)
+
+
+def _close_worker_pipelines():
+    for pipe in _worker_pipelines:
+        if not hasattr(pipe, 'close_spider'):
+            continue
+        try:
+            # spiders cannot be sent to other processes
+            pipe.close_spider(None)
+        except Exception:
+            logger.exception("Error closing %(pipeline)s in a worker process",
+                             {'pipeline': pipe.__class__.__name__})
+
+
+def _call_worker_pipeline(index, methodname, *args):
+    return getattr(_worker_pipelines[index], methodname)(*args)
+
+
+class ItemBatch:
+    """Items waiting to go through the ``process_items`` method of a pipeline
+
+    Items are sent in a single call once ``size`` items are waiting, or
+    ``max_linger`` seconds after the first one was added, whatever happens
+    first. :meth:`add` returns a Deferred per item, which fires with the
+    result for that item.
+    """
+
+    def __init__(self, process_items, size, max_linger):
+        self.process_items = deferred_f_from_coro_f(process_items)
+        self.size = size
+        self.max_linger = max_linger
+        self.items = []
+        self.deferreds = []
+        self.spider = None
+        self.flush_call = None
+
+    def __len__(self):
+        return len(self.items)
+
+    def add(self, item, spider):
+        d = defer.Deferred()
+        self.items.append(item)
+        self.deferreds.append(d)
+        self.spider = spider
+        if len(self.items) >= self.size:
+            self.flush()
+        elif self.flush_call is None:
+            from twisted.internet import reactor
+            self.flush_call = reactor.callLater(self.max_linger, self.flush)
+        return d
+
+    def flush(self):
+        """Send the waiting items to ``process_items`` right away"""
+        if self.flush_call is not None:
+            if self.flush_call.active():
+                self.flush_call.cancel()
+            self.flush_call = None
+        if not self.items:
+            return
+        items, deferreds = self.items, self.deferreds
+        self.items, self.deferreds = [], []
+        dfd = defer.maybeDeferred(self.process_items, items, self.spider)
+        dfd.addCallbacks(self._process_results, self._process_failure,
+                         callbackArgs=(deferreds,), errbackArgs=(deferreds,))
+
+    def _process_results(self, results, deferreds):
+        results = list(results)
+        if len(results) != len(deferreds):
+            error = ValueError(f"process_items returned {len(results)} results for {len(deferreds)} items")
+            return self._process_failure(Failure(error), deferreds)
+        for d, result in zip(deferreds, results):
+            if isinstance(result, (Exception, Failure)):
+                # e.g. DropItem, failing only the corresponding item
+                d.errback(result)
+            else:
+                d.callback(result)
+
+    def _process_failure(self, failure, deferreds):
+        for d in deferreds:
+            d.errback(failure)
 
 
 class ItemPipelineManager(MiddlewareManager):
 
     component_name = 'item pipeline'
 
+    def __init__(self, *middlewares, batch_size=100, batch_max_linger=1.0, offload_workers=None):
+        self.batch_size = batch_size
+        self.batch_max_linger = batch_max_linger
+        # pipeline -> ItemBatch, for pipelines with process_items
+        self.batches = {}
+        # pipelines with an offload attribute, run in a process or thread pool
+        self.offload_workers = offload_workers
+        self.offloaded = {'process': [], 'thread': []}
+        self.executors = {}
+        super().__init__(*middlewares)
+
+    @classmethod
+    def from_settings(cls, settings, crawler=None):
+        manager = super().from_settings(settings, crawler)
+        manager.batch_size = settings.getint('ITEM_PIPELINE_BATCH_SIZE')
+        manager.batch_max_linger = settings.getfloat('ITEM_PIPELINE_BATCH_MAX_LINGER')
+        manager.offload_workers = settings.getint('ITEM_PIPELINE_OFFLOAD_WORKERS') or None
+        return manager
+
     @classmethod
     def _get_mwlist_from_settings(cls, settings):
         return build_component_list(settings.getwithbase('ITEM_PIPELINES'))
 
     def _add_middleware(self, pipe):
         super(ItemPipelineManager, self)._add_middleware(pipe)
-        if hasattr(pipe, 'process_item'):
-            self.methods['process_item'].append(deferred_f_from_coro_f(pipe.process_item))
+        if hasattr(pipe, 'process_items'):
+            process_items = self._get_process_method(pipe, 'process_items')
+            self.methods['process_item'].append(
+                lambda item, spider: self._add_to_batch(pipe, process_items, item, spider))
+        elif hasattr(pipe, 'process_item'):
+            self.methods['process_item'].append(self._get_process_method(pipe, 'process_item'))
+
+    def _get_process_method(self, pipe, methodname):
+        method = getattr(pipe, methodname)
+        offload = getattr(pipe, 'offload', None)
+        if not offload:
+            return deferred_f_from_coro_f(method)
+        if offload not in self.offloaded:
+            raise ValueError(f"Unknown offload value for {pipe.__class__.__name__}: {offload!r}, "
+                             f"expected 'process' or 'thread'")
+        if inspect.iscoroutinefunction(method):
+            raise TypeError(f"{pipe.__class__.__name__}.{methodname} cannot be offloaded "
+                            f"to a {offload} pool, as it is a coroutine")
+        pipelines = self.offloaded[offload]
+        if pipe not in pipelines:
+            pipelines.append(pipe)
+        index = pipelines.index(pipe)
+
+        def offloaded_method(arg, spider):
+            executor = self.executors[offload]
+            if offload == 'process':
+                # spiders cannot be sent to other processes
+                future = executor.submit(_call_worker_pipeline, index, methodname, arg, None)
+            else:
+                future = executor.submit(method, arg, spider)
+            return deferred_from_concurrent_future(future)
+        return offloaded_method
+
+    def _add_to_batch(self, pipe, process_items, item, spider):
+        if pipe not in self.batches:
+            # pipelines may override the batch settings
+            self.batches[pipe] = ItemBatch(
+                process_items,
+                getattr(pipe, 'batch_size', self.batch_size),
+                getattr(pipe, 'batch_max_linger', self.batch_max_linger),
+            )
+        return self.batches[pipe].add(item, spider)
+
+    def open_spider(self, spider):
+        dfd = super().open_spider(spider)
+        # the pipelines are copied to the worker processes once open
+        dfd.addCallback(self._start_executors)
+        return dfd
+
+    def _start_executors(self, result):
+        if self.offloaded['process']:
+            self.executors['process'] = ProcessPoolExecutor(
+                self.offload_workers, initializer=_init_worker, initargs=(self.offloaded['process'],))
+        if self.offloaded['thread']:
+            self.executors['thread'] = ThreadPoolExecutor(
+                self.offload_workers, thread_name_prefix='item-pipeline')
+        return result
+
+    def close_spider(self, spider):
+        # shutting down waits for pending items, outside the reactor thread
+        executors, self.executors = self.executors, {}
+        dfd = defer.DeferredList([threads.deferToThread(executor.shutdown)
+                                  for executor in executors.values()])
+        dfd.addCallback(lambda _: super(ItemPipelineManager, self).close_spider(spider))
+        return dfd
+
+    def flush_batches(self):
+        """Send the items waiting for pipelines with a ``process_items``
+        method without waiting for their batches to fill up"""
+        for batch in self.batches.values():
+            batch.flush()
 
     def process_item(self, item, spider):
         return self._process_chain('process_item', item, spider) #这里就是 调用所有middleware中的process_item 传入item spider
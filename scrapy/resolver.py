@@ -1,11 +1,23 @@
+import logging
+from bisect import bisect_left
+from collections import Counter
+
+import attr
 from twisted.internet import defer
+from twisted.internet.abstract import isIPAddress
 from twisted.internet.base import ThreadedResolver
+from twisted.internet.error import DNSLookupError
 from twisted.internet.interfaces import IHostResolution, IHostnameResolver, IResolutionReceiver, IResolverSimple
+from twisted.names import client, dns, hosts, resolve
+from twisted.python.failure import Failure
 from zope.interface.declarations import implementer, provider
 
 from scrapy.utils.datatypes import LocalCache
 
 
+logger = logging.getLogger(__name__)
+
+
 # TODO: cache misses
 dnscache = LocalCache(10000) #就是一个带有limit的 OrderedDict
 
@@ -119,6 +131,165 @@ class CachingHostnameResolver:
         else:
             resolutionReceiver.resolutionBegan(HostResolution(hostName))
             for addr in addresses:
-                resolutionReceiver.addressResolved(addr)
+                # addresses are cached by host, the port is the one asked for
+                resolutionReceiver.addressResolved(attr.evolve(addr, port=portNumber))
             resolutionReceiver.resolutionComplete()
             return resolutionReceiver
+
+
+@implementer(IResolverSimple)
+class CachingAsyncResolver:
+    """
+    Experimental caching resolver. IPv4 only. Sends non-blocking DNS queries
+    over UDP instead of blocking a thread of the reactor thread pool per
+    query, caches answers for as long as their TTL allows and failures for
+    :setting:`DNS_NEGATIVE_CACHE_TTL` seconds.
+    """
+
+    # upper bounds (in milliseconds) of the latency histogram buckets
+    latency_buckets = (1, 5, 10, 25, 50, 100, 250, 500, 1000, 2500, 5000)
+    max_cname_chain = 10
+
+    def __init__(self, reactor, cache_size, timeout, negative_ttl=60,
+                 servers=None, resolvconf=None, hostsfile=None, crawler=None):
+        self.reactor = reactor
+        # a Crawler, or the CrawlerProcess that installs the resolver for
+        # all its crawlers
+        self.crawler = crawler
+        self.timeout = timeout
+        self.negative_ttl = negative_ttl
+        self.cache = LocalCache(cache_size)
+        if resolvconf is None and not servers:
+            resolvconf = '/etc/resolv.conf'
+        self.resolver = resolve.ResolverChain([
+            hosts.Resolver(hostsfile or b'/etc/hosts'),
+            client.Resolver(resolvconf, servers, reactor=reactor),
+        ])
+        self.latency_histogram = Counter()
+        self._waiting = {}
+
+    @classmethod
+    def from_crawler(cls, crawler, reactor):
+        settings = crawler.settings
+        if settings.getbool('DNSCACHE_ENABLED'):
+            cache_size = settings.getint('DNSCACHE_SIZE')
+        else:
+            cache_size = 0
+        servers = []
+        for server in settings.getlist('DNS_SERVERS'):
+            host, sep, port = server.rpartition(':')
+            if not sep:
+                host, port = server, 53
+            servers.append((host, int(port)))
+        return cls(
+            reactor,
+            cache_size,
+            settings.getfloat('DNS_TIMEOUT'),
+            negative_ttl=settings.getfloat('DNS_NEGATIVE_CACHE_TTL'),
+            servers=servers or None,
+            crawler=crawler,
+        )
+
+    def install_on_reactor(self):
+        self.reactor.installResolver(self)
+        self.reactor.addSystemEventTrigger('before', 'shutdown', self.log_latency_histogram)
+
+    def _inc_stats(self, key):
+        crawlers = getattr(self.crawler, 'crawlers', None)
+        if crawlers is None:
+            crawlers = [self.crawler] if self.crawler is not None else []
+        for crawler in crawlers:
+            if getattr(crawler, 'stats', None) is not None:
+                crawler.stats.inc_value(key)
+
+    def getHostByName(self, name, timeout=None):
+        if isIPAddress(name):
+            return defer.succeed(name)
+        try:
+            expires, address = self.cache[name]
+        except KeyError:
+            pass
+        else:
+            if expires > self.reactor.seconds():
+                if address is None:
+                    self._inc_stats('dnscache/negative_hit')
+                    return defer.fail(DNSLookupError(name))
+                self._inc_stats('dnscache/hit')
+                return defer.succeed(address)
+            del self.cache[name]
+        self._inc_stats('dnscache/miss')
+        # concurrent lookups of the same name share a single query
+        d = defer.Deferred()
+        if name in self._waiting:
+            self._waiting[name].append(d)
+            return d
+        self._waiting[name] = [d]
+        started = self.reactor.seconds()
+        self._lookup(name, self.max_cname_chain).addBoth(self._resolved, name, started)
+        return d
+
+    def _lookup(self, name, level):
+        d = self.resolver.lookupAddress(name, timeout=(self.timeout,))
+        d.addCallback(self._extract_address, name, level)
+        return d
+
+    def _extract_address(self, result, name, level):
+        answers = result[0]
+        target = dns.Name(name)
+        ttls = []
+        while level:
+            for record in answers:
+                if record.name == target and record.type == dns.A:
+                    return record.payload.dottedQuad(), min(ttls + [record.ttl])
+            cnames = [r for r in answers if r.name == target and r.type == dns.CNAME]
+            if not cnames:
+                break
+            target = cnames[0].payload.name
+            ttls.append(cnames[0].ttl)
+            level -= 1
+            if level and not any(r.name == target for r in answers):
+                d = self._lookup(target.name.decode('ascii'), level)
+                d.addCallback(lambda r: (r[0], min(ttls + [r[1]])))
+                return d
+        raise DNSLookupError(name)
+
+    def _resolved(self, result, name, started):
+        self._record_latency(self.reactor.seconds() - started)
+        now = self.reactor.seconds()
+        if isinstance(result, Failure):
+            logger.debug("DNS lookup of %(name)s failed: %(error)s",
+                         {'name': name, 'error': result.value})
+            result = Failure(DNSLookupError(name))
+            if self.cache.limit and self.negative_ttl:
+                self.cache[name] = (now + self.negative_ttl, None)
+                self._inc_stats('dnscache/negative_stored')
+        else:
+            address, ttl = result
+            if self.cache.limit and ttl:
+                self.cache[name] = (now + ttl, address)
+            result = address
+        for d in self._waiting.pop(name):
+            if isinstance(result, Failure):
+                d.errback(result)
+            else:
+                d.callback(result)
+
+    def _record_latency(self, seconds):
+        index = bisect_left(self.latency_buckets, seconds * 1000)
+        if index < len(self.latency_buckets):
+            bound = self.latency_buckets[index]
+            self.latency_histogram[bound] += 1
+            self._inc_stats(f'dns_latency/le_{bound}ms')
+        else:
+            self.latency_histogram[float('inf')] += 1
+            self._inc_stats(f'dns_latency/gt_{self.latency_buckets[-1]}ms')
+
+    def log_latency_histogram(self):
+        if not self.latency_histogram:
+            return
+        lines = []
+        for bound in sorted(self.latency_histogram):
+            label = f'<= {bound} ms' if bound != float('inf') else f'> {self.latency_buckets[-1]} ms'
+            lines.append(f'{label}: {self.latency_histogram[bound]}')
+        logger.info("DNS resolution latency histogram:\n%(histogram)s",
+                    {'histogram': '\n'.join(lines)})
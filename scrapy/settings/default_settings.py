@@ -37,6 +37,7 @@ CLOSESPIDER_ERRORCOUNT = 0
 COMMANDS_MODULE = ''
 
 COMPRESSION_ENABLED = True
+COMPRESSION_THREADPOOL_MAXSIZE = 0
 
 CONCURRENT_ITEMS = 100
 
@@ -60,7 +61,11 @@ DEPTH_PRIORITY = 0
 
 DNSCACHE_ENABLED = True
 DNSCACHE_SIZE = 10000
+DNS_NEGATIVE_CACHE_TTL = 60
+DNS_PREFETCH_CONCURRENCY = 8
+DNS_PREFETCH_ENABLED = False
 DNS_RESOLVER = 'scrapy.resolver.CachingThreadedResolver'
+DNS_SERVERS = []
 DNS_TIMEOUT = 60
 
 DOWNLOAD_DELAY = 0
@@ -124,6 +129,7 @@ EXTENSIONS = {}
 
 EXTENSIONS_BASE = {
     'scrapy.extensions.corestats.CoreStats': 0,
+    'scrapy.extensions.dnsprefetch.DnsPrefetch': 0,
     'scrapy.extensions.telnet.TelnetConsole': 0,
     'scrapy.extensions.memusage.MemoryUsage': 0,
     'scrapy.extensions.memdebug.MemoryDebugger': 0,
@@ -150,6 +156,8 @@ FEED_STORAGES_BASE = {
     'stdout': 'scrapy.extensions.feedexport.StdoutFeedStorage',
 }
 FEED_EXPORT_BATCH_ITEM_COUNT = 0
+FEED_EXPORT_BATCH_INTERVAL = 0
+FEED_EXPORT_BATCH_MAX_SIZE = 0
 FEED_EXPORTERS = {}
 FEED_EXPORTERS_BASE = {
     'json': 'scrapy.exporters.JsonItemExporter',
@@ -159,12 +167,17 @@ FEED_EXPORTERS_BASE = {
     'xml': 'scrapy.exporters.XmlItemExporter',
     'marshal': 'scrapy.exporters.MarshalItemExporter',
     'pickle': 'scrapy.exporters.PickleItemExporter',
+    'parquet': 'scrapy.exporters.ParquetItemExporter',
 }
 FEED_EXPORT_INDENT = 0
+FEED_EXPORT_ASYNC = False
+FEED_EXPORT_QUEUE_SIZE = 1000
 
 FEED_STORAGE_FTP_ACTIVE = False
 FEED_STORAGE_GCS_ACL = ''
+FEED_STORAGE_GCS_PART_SIZE = 0
 FEED_STORAGE_S3_ACL = ''
+FEED_STORAGE_S3_PART_SIZE = 0
 
 FILES_STORE_S3_ACL = 'private'
 FILES_STORE_GCS_ACL = ''
@@ -175,6 +188,7 @@ FTP_PASSIVE_MODE = True
 
 GCS_PROJECT_ID = None
 
+HTTPCACHE_ASYNC = False
 HTTPCACHE_ENABLED = False
 HTTPCACHE_DIR = 'httpcache'
 HTTPCACHE_IGNORE_MISSING = False
@@ -187,6 +201,17 @@ HTTPCACHE_IGNORE_RESPONSE_CACHE_CONTROLS = []
 HTTPCACHE_DBM_MODULE = 'dbm'
 HTTPCACHE_POLICY = 'scrapy.extensions.httpcache.DummyPolicy'
 HTTPCACHE_GZIP = False
+HTTPCACHE_MEMORY_SIZE = 0
+HTTPCACHE_REPLAY = False
+HTTPCACHE_REVALIDATE_AHEAD = False
+HTTPCACHE_REVALIDATE_PRIORITY = -100
+HTTPCACHE_LOG_SEGMENT_SIZE = 256 * 1024 * 1024   # 256m
+HTTPCACHE_LOG_COMPACT_RATIO = 0.5
+HTTPCACHE_SQLITE_BATCH_SIZE = 100
+HTTPCACHE_ZSTD_DICT_ENABLED = False
+HTTPCACHE_ZSTD_DICT_SAMPLES = 100
+HTTPCACHE_ZSTD_DICT_SIZE = 110 * 1024   # 110k
+HTTPCACHE_ZSTD_LEVEL = 3
 
 HTTPPROXY_ENABLED = True
 HTTPPROXY_AUTH_ENCODING = 'latin-1'
@@ -198,6 +223,9 @@ ITEM_PROCESSOR = 'scrapy.pipelines.ItemPipelineManager'
 
 ITEM_PIPELINES = {}
 ITEM_PIPELINES_BASE = {}
+ITEM_PIPELINE_BATCH_MAX_LINGER = 1.0
+ITEM_PIPELINE_BATCH_SIZE = 100
+ITEM_PIPELINE_OFFLOAD_WORKERS = 0
 
 LOG_ENABLED = True
 LOG_ENCODING = 'utf-8'
@@ -260,6 +288,10 @@ SCHEDULER_MEMORY_QUEUE = 'scrapy.squeues.LifoMemoryQueue'
 SCHEDULER_PRIORITY_QUEUE = 'scrapy.pqueues.ScrapyPriorityQueue'
 
 SCRAPER_SLOT_MAX_ACTIVE_SIZE = 5000000
+SCRAPER_SLOT_MAX_ITEMPROC_SIZE = 0
+SCRAPER_SLOT_STATS_INTERVAL = 0
+
+SPIDER_CALLBACK_WORKERS = 0
 
 SPIDER_LOADER_CLASS = 'scrapy.spiderloader.SpiderLoader'
 SPIDER_LOADER_WARN_ONLY = False
@@ -0,0 +1,103 @@
+"""Incremental decompression helpers that can stop early once the
+decompressed output exceeds a maximum size (decompression bombs)."""
+
+import zlib
+from io import BytesIO
+
+try:
+    import brotli
+except ImportError:
+    pass
+
+try:
+    import zstandard
+except ImportError:
+    pass
+
+
+_CHUNK_SIZE = 65536  # 64 KiB
+
+
+class _DecompressionMaxSizeExceeded(ValueError):
+    pass
+
+
+def _check_max_size(size, max_size):
+    if max_size and size > max_size:
+        raise _DecompressionMaxSizeExceeded(
+            f"The number of bytes decompressed so far ({size} B) exceed the "
+            f"specified maximum ({max_size} B)."
+        )
+
+
+def _zlib_decompress(decompressor, data, max_size):
+    output = []
+    size = 0
+    view = memoryview(data)
+    # the input is given in chunks too, unconsumed_tail copies what is left
+    # of it on every call
+    for start in range(0, len(data), _CHUNK_SIZE):
+        chunk = decompressor.decompress(view[start:start + _CHUNK_SIZE], _CHUNK_SIZE)
+        while chunk:
+            output.append(chunk)
+            size += len(chunk)
+            _check_max_size(size, max_size)
+            chunk = decompressor.decompress(decompressor.unconsumed_tail, _CHUNK_SIZE)
+    output.append(decompressor.flush())
+    _check_max_size(size + len(output[-1]), max_size)
+    return b''.join(output)
+
+
+def _inflate(data, *, max_size=0):
+    try:
+        return _zlib_decompress(zlib.decompressobj(), data, max_size)
+    except zlib.error:
+        # ugly hack to work with raw deflate content that may
+        # be sent by microsoft servers. For more information, see:
+        # http://carsten.codimi.de/gzip.yaws/
+        # http://www.port80software.com/200ok/archive/2005/10/31/868.aspx
+        # http://www.gzip.org/zlib/zlib_faq.html#faq38
+        return _zlib_decompress(zlib.decompressobj(-15), data, max_size)
+
+
+def _brotli_output_is_bounded():
+    """Return True if the installed brotli can limit the output of each
+    decompression call, which needs brotli 1.2.0 or later"""
+    return hasattr(brotli.Decompressor(), 'can_accept_more_data')
+
+
+def _unbrotli(data, *, max_size=0):
+    decompressor = brotli.Decompressor()
+    output = bytearray()
+    if not hasattr(decompressor, 'can_accept_more_data'):
+        # brotli < 1.2.0 and brotlipy cannot limit the output of a call, so
+        # each input chunk may inflate to any size before it is checked
+        process = getattr(decompressor, 'process', None) or decompressor.decompress
+        for start in range(0, len(data), _CHUNK_SIZE):
+            output += process(data[start:start + _CHUNK_SIZE])
+            _check_max_size(len(output), max_size)
+        return bytes(output)
+    for start in range(0, len(data), _CHUNK_SIZE):
+        chunk = decompressor.process(data[start:start + _CHUNK_SIZE], output_buffer_limit=_CHUNK_SIZE)
+        # output beyond the limit stays in the decompressor until it is
+        # asked for with empty input
+        while chunk:
+            output += chunk
+            _check_max_size(len(output), max_size)
+            if decompressor.is_finished():
+                break
+            chunk = decompressor.process(b'', output_buffer_limit=_CHUNK_SIZE)
+    return bytes(output)
+
+
+def _unzstd(data, *, max_size=0):
+    # Using its streaming API since its simple API could handle only cases
+    # where there is content size data embedded in the frame
+    reader = zstandard.ZstdDecompressor().stream_reader(BytesIO(data))
+    output = bytearray()
+    chunk = reader.read(_CHUNK_SIZE)
+    while chunk:
+        output += chunk
+        _check_max_size(len(output), max_size)
+        chunk = reader.read(_CHUNK_SIZE)
+    return bytes(output)
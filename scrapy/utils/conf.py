@@ -119,6 +119,8 @@ def get_sources(use_closest=True): #返回一个可能拥有scrapy.cfg的列表
 def feed_complete_default_values_from_settings(feed, settings):
     out = feed.copy()
     out.setdefault("batch_item_count", settings.getint('FEED_EXPORT_BATCH_ITEM_COUNT'))
+    out.setdefault("batch_max_size", settings.getint('FEED_EXPORT_BATCH_MAX_SIZE'))
+    out.setdefault("batch_interval", settings.getfloat('FEED_EXPORT_BATCH_INTERVAL'))
     out.setdefault("encoding", settings["FEED_EXPORT_ENCODING"])
     out.setdefault("fields", settings.getlist("FEED_EXPORT_FIELDS") or None)
     out.setdefault("store_empty", settings.getbool("FEED_STORE_EMPTY"))
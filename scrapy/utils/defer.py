@@ -166,3 +166,20 @@ def maybeDeferred_coro(f, *args, **kw):
         return defer.fail(result)
     else:
         return defer.succeed(result)
+
+
+def deferred_from_concurrent_future(future):
+    """Return a Deferred that fires in the reactor thread with the result of a
+    :class:`concurrent.futures.Future`, e.g. of a thread or process pool"""
+    from twisted.internet import reactor
+    dfd = defer.Deferred()
+
+    def done(future):
+        exc = future.exception()
+        if exc is None:
+            reactor.callFromThread(dfd.callback, future.result())
+        else:
+            reactor.callFromThread(dfd.errback, failure.Failure(exc))
+
+    future.add_done_callback(done)
+    return dfd
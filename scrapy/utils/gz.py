@@ -1,7 +1,7 @@
 import struct
-from gzip import GzipFile
-from io import BytesIO
+import zlib
 
+from scrapy.utils._compression import _CHUNK_SIZE, _check_max_size
 from scrapy.utils.decorators import deprecated
 
 
@@ -14,31 +14,77 @@ def read1(gzf, size=-1):
     return gzf.read1(size)
 
 
-def gunzip(data):
+# gzip header flags, see RFC 1952
+_FHCRC = 2
+_FEXTRA = 4
+_FNAME = 8
+_FCOMMENT = 16
+
+
+def _gzip_header_size(data):
+    """Return the size of the gzip member header at the start of *data*."""
+    if data[:2] != b'\x1f\x8b':
+        raise OSError(f'Not a gzipped file ({data[:2]!r})')
+    if data[2:3] != b'\x08':
+        raise OSError('Unknown compression method')
+    if len(data) < 10:
+        raise EOFError('Compressed file ended before the end of the gzip header')
+    flags = data[3]
+    pos = 10
+    try:
+        if flags & _FEXTRA:
+            extra_size, = struct.unpack('<H', data[pos:pos + 2])
+            pos += 2 + extra_size
+        if flags & _FNAME:
+            pos = data.index(b'\0', pos) + 1
+        if flags & _FCOMMENT:
+            pos = data.index(b'\0', pos) + 1
+    except (struct.error, ValueError):
+        raise EOFError('Compressed file ended before the end of the gzip header')
+    if flags & _FHCRC:
+        pos += 2
+    if pos > len(data):
+        raise EOFError('Compressed file ended before the end of the gzip header')
+    return pos
+
+
+def gunzip(data, *, max_size=0):
     """Gunzip the given data and return as much data as possible.
 
     This is resilient to CRC checksum errors.
+
+    If *max_size* is set, decompression stops and
+    ``_DecompressionMaxSizeExceeded`` is raised as soon as the decompressed
+    data grows beyond *max_size* bytes.
     """
-    f = GzipFile(fileobj=BytesIO(data))
-    output_list = []
-    chunk = b'.'
-    while chunk:
-        try:
-            chunk = f.read1(8196)
-            output_list.append(chunk)
-        except (IOError, EOFError, struct.error):
-            # complete only if there is some data, otherwise re-raise
-            # see issue 87 about catching struct.error
-            # some pages are quite small so output_list is empty and f.extrabuf
-            # contains the whole page content
-            if output_list or getattr(f, 'extrabuf', None):
-                try:
-                    output_list.append(f.extrabuf[-f.extrasize:])
-                finally:
-                    break
-            else:
-                raise
-    return b''.join(output_list)
+    output = []
+    size = 0
+    try:
+        # a gzip file may contain several members, optionally padded with
+        # null bytes
+        while data:
+            decompressor = zlib.decompressobj(-zlib.MAX_WBITS)
+            view = memoryview(data)
+            pos = _gzip_header_size(data)
+            # the input is given in chunks too, unconsumed_tail copies what
+            # is left of it on every call
+            while not decompressor.eof and pos < len(data):
+                chunk = decompressor.decompress(view[pos:pos + _CHUNK_SIZE], _CHUNK_SIZE)
+                pos += _CHUNK_SIZE
+                while chunk:
+                    output.append(chunk)
+                    size += len(chunk)
+                    _check_max_size(size, max_size)
+                    chunk = decompressor.decompress(decompressor.unconsumed_tail, _CHUNK_SIZE)
+            if not decompressor.eof:
+                raise EOFError('Compressed file ended before the end-of-stream marker was reached')
+            # skip the CRC32 and ISIZE trailer without checking them
+            data = (decompressor.unused_data + view[pos:])[8:].lstrip(b'\0')
+    except (OSError, EOFError, zlib.error):
+        # complete only if there is some data, otherwise re-raise
+        if not output:
+            raise
+    return b''.join(output)
 
 
 def gzip_magic_number(response):
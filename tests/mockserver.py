@@ -2,12 +2,15 @@ import argparse
 import json
 import os
 import random
+import re
 import sys
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
 from pathlib import Path
 from shutil import rmtree
 from subprocess import Popen, PIPE
 from tempfile import mkdtemp
-from urllib.parse import urlencode
+from urllib.parse import parse_qs, urlencode, urlparse
 
 from OpenSSL import SSL
 from twisted.internet import defer, reactor, ssl
@@ -282,6 +285,91 @@ class MockFTPServer:
         return 'ftp://127.0.0.1:2121/' + path
 
 
+class _S3RequestHandler(BaseHTTPRequestHandler):
+
+    protocol_version = 'HTTP/1.1'
+
+    def log_message(self, format, *args):
+        pass
+
+    def _parse(self):
+        url = urlparse(self.path)
+        bucket, _, key = url.path.lstrip('/').partition('/')
+        body = self.rfile.read(int(self.headers.get('Content-Length') or 0))
+        return (bucket, key), parse_qs(url.query, keep_blank_values=True), body
+
+    def _respond(self, status=200, body=b'', headers=None):
+        self.send_response(status)
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_PUT(self):
+        s3 = self.server.s3
+        path, query, body = self._parse()
+        s3.requests.append(('PUT', path, sorted(query)))
+        if 'uploadId' in query:
+            upload = s3.uploads[query['uploadId'][0]]
+            upload['parts'][int(query['partNumber'][0])] = body
+        else:
+            s3.objects[path] = body
+        self._respond(headers={'ETag': f'"{len(body)}"'})
+
+    def do_POST(self):
+        s3 = self.server.s3
+        path, query, body = self._parse()
+        s3.requests.append(('POST', path, sorted(query)))
+        if 'uploads' in query:
+            upload_id = str(len(s3.uploads) + 1)
+            s3.uploads[upload_id] = {'path': path, 'parts': {}}
+            result = (f'<InitiateMultipartUploadResult><Bucket>{path[0]}</Bucket><Key>{path[1]}</Key>'
+                      f'<UploadId>{upload_id}</UploadId></InitiateMultipartUploadResult>')
+        else:
+            upload = s3.uploads.pop(query['uploadId'][0])
+            numbers = [int(n) for n in re.findall(rb'<PartNumber>(\d+)</PartNumber>', body)]
+            s3.objects[path] = b''.join(upload['parts'][n] for n in numbers)
+            result = (f'<CompleteMultipartUploadResult><Bucket>{path[0]}</Bucket><Key>{path[1]}</Key>'
+                      f'<ETag>"done"</ETag></CompleteMultipartUploadResult>')
+        self._respond(body=result.encode(), headers={'Content-Type': 'application/xml'})
+
+    def do_DELETE(self):
+        s3 = self.server.s3
+        path, query, body = self._parse()
+        s3.requests.append(('DELETE', path, sorted(query)))
+        s3.uploads.pop(query['uploadId'][0], None)
+        self._respond(204)
+
+
+class MockS3Server:
+    """Minimal S3-compatible HTTP server, running in a thread, that supports
+    path-style object uploads and multipart uploads.
+
+    Stored objects are available in :attr:`objects`, keyed by
+    ``(bucket, key)``, unfinished multipart uploads in :attr:`uploads`, and
+    every received request in :attr:`requests`."""
+
+    def __enter__(self):
+        self.objects = {}
+        self.uploads = {}
+        self.requests = []
+        self.server = ThreadingHTTPServer(('127.0.0.1', 0), _S3RequestHandler)
+        self.server.s3 = self
+        self.thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+        self.thread.start()
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.server.shutdown()
+        self.server.server_close()
+        self.thread.join()
+
+    @property
+    def endpoint_url(self):
+        return 'http://127.0.0.1:%d' % self.server.server_address[1]
+
+
 def ssl_context_factory(keyfile='keys/localhost.key', certfile='keys/localhost.crt', cipher_string=None):
     factory = ssl.DefaultOpenSSLContextFactory(
         os.path.join(os.path.dirname(__file__), keyfile),
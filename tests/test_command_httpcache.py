@@ -0,0 +1,141 @@
+import os
+import sys
+import time
+from shutil import rmtree
+from tempfile import mkdtemp
+from unittest import mock
+
+from twisted.internet import defer
+from twisted.trial import unittest
+
+from scrapy.extensions.httpcache import FilesystemCacheStorage
+from scrapy.http import Request, Response
+from scrapy.settings import Settings
+from scrapy.spiders import Spider
+from scrapy.utils.misc import load_object
+from scrapy.utils.testproc import ProcessTest
+
+
+class HttpCacheCommandTest(ProcessTest, unittest.TestCase):
+
+    command = 'httpcache'
+    storage_class = 'scrapy.extensions.httpcache.FilesystemCacheStorage'
+
+    def setUp(self):
+        self.cachedir = mkdtemp()
+        self.settings = {
+            'HTTPCACHE_DIR': self.cachedir,
+            'HTTPCACHE_STORAGE': self.storage_class,
+            'HTTPCACHE_POLICY': 'scrapy.extensions.httpcache.RFC2616Policy',
+            'HTTPCACHE_EXPIRATION_SECS': 3600,
+        }
+        self.expired = Request('http://www.example.com/expired')
+        self.uncacheable = Request('http://www.example.com/uncacheable')
+        self.cacheable = Request('http://www.example.org/cacheable')
+        self._store('spider1', self.expired, Response(self.expired.url, headers={'ETag': '"1"'}), age=7200)
+        self._store('spider1', self.uncacheable, Response(self.uncacheable.url))
+        self._store('spider1', self.cacheable, Response(self.cacheable.url, headers={'ETag': '"2"'}))
+        self._store('spider2', self.cacheable, Response(self.cacheable.url, headers={'ETag': '"2"'}))
+
+    def tearDown(self):
+        rmtree(self.cachedir)
+
+    def _storage(self):
+        return load_object(self.storage_class)(Settings(self.settings))
+
+    def _store(self, name, request, response, age=0):
+        storage = self._storage()
+        spider = Spider(name)
+        storage.open_spider(spider)
+        stored = time.time() - age
+        with mock.patch('scrapy.extensions.httpcache.time', return_value=stored):
+            storage.store_response(spider, request, response)
+        if isinstance(storage, FilesystemCacheStorage):
+            # it uses the modification time of the files
+            rpath = storage._get_request_path(spider, request)
+            for filename in os.listdir(rpath):
+                os.utime(os.path.join(rpath, filename), (stored, stored))
+        storage.close_spider(spider)
+
+    def _retrieve(self, name, request):
+        storage = self._storage()
+        spider = Spider(name)
+        storage.open_spider(spider)
+        try:
+            return storage.retrieve_response(spider, request)
+        finally:
+            storage.close_spider(spider)
+
+    def _execute(self, *args, **kwargs):
+        settings = []
+        for name, value in self.settings.items():
+            settings += ['-s', f'{name}={value}']
+        return self.execute(settings + list(args), **kwargs)
+
+    def _rows(self, out):
+        encoding = getattr(sys.stdout, 'encoding') or 'utf-8'
+        return [line.split() for line in out.decode(encoding).splitlines()[1:]]
+
+    @defer.inlineCallbacks
+    def test_report(self):
+        _, out, _ = yield self._execute()
+        rows = self._rows(out)
+        self.assertEqual([row[:-3] + row[-2:] for row in rows], [  # without bytes
+            ['spider1', 'www.example.com', '2', '1', '1'],
+            ['spider1', 'www.example.org', '1', '0', '0'],
+            ['spider2', 'www.example.org', '1', '0', '0'],
+            ['total', '4', '1', '1'],
+        ])
+        self.assertGreater(int(rows[-1][-3]), 0)
+        self.settings['HTTPCACHE_EXPIRATION_SECS'] = 0
+        self.assertIsNotNone(self._retrieve('spider1', self.uncacheable))
+
+    @defer.inlineCallbacks
+    def test_single_spider(self):
+        _, out, _ = yield self._execute('spider2')
+        self.assertEqual([row[0] for row in self._rows(out)], ['spider2', 'total'])
+
+    @defer.inlineCallbacks
+    def test_missing_spider(self):
+        code, _, err = yield self._execute('spider2', 'spider3', check_code=False)
+        self.assertEqual(code, 2)
+        self.assertIn(b'No HTTP cache found for: spider3', err)
+        self.assertEqual(self._storage().spider_names(), ['spider1', 'spider2'])
+
+    @defer.inlineCallbacks
+    def test_delete(self):
+        _, out, _ = yield self._execute('--delete-expired', '--delete-uncacheable', '--compact')
+        self.assertIn(b'Deleted 2 responses', out)
+        self.settings['HTTPCACHE_EXPIRATION_SECS'] = 0
+        self.assertIsNone(self._retrieve('spider1', self.expired))
+        self.assertIsNone(self._retrieve('spider1', self.uncacheable))
+        self.assertIsNotNone(self._retrieve('spider1', self.cacheable))
+        self.assertIsNotNone(self._retrieve('spider2', self.cacheable))
+
+    @defer.inlineCallbacks
+    def test_unsupported_storage(self):
+        self.settings['HTTPCACHE_STORAGE'] = 'scrapy.extensions.httpcache.MemoryCacheStorage'
+        code, _, err = yield self._execute(check_code=False)
+        self.assertEqual(code, 2)
+        self.assertIn(b'does not support listing', err)
+
+
+class LogStructuredHttpCacheCommandTest(HttpCacheCommandTest):
+
+    storage_class = 'scrapy.extensions.httpcache.LogStructuredCacheStorage'
+
+    @defer.inlineCallbacks
+    def test_delete(self):
+        yield super().test_delete()
+        segments = os.listdir(os.path.join(self.cachedir, 'spider1'))
+        self.assertEqual(len(segments), 1)
+
+
+class SqliteHttpCacheCommandTest(HttpCacheCommandTest):
+
+    storage_class = 'scrapy.extensions.httpcache.SqliteCacheStorage'
+
+
+class DbmHttpCacheCommandTest(HttpCacheCommandTest):
+
+    storage_class = 'scrapy.extensions.httpcache.DbmCacheStorage'
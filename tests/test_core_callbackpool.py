@@ -0,0 +1,114 @@
+import os
+import threading
+
+from twisted.internet import defer
+from twisted.trial.unittest import TestCase
+
+from scrapy import Request, Spider, signals
+from scrapy.core.callbackpool import CallbackPool
+from scrapy.utils.test import get_crawler
+
+from tests.mockserver import MockServer
+
+
+class TagSpiderMiddleware:
+    """Marks the output of callbacks, to check that spider middlewares still
+    run in the main process"""
+
+    def process_spider_output(self, response, result, spider):
+        for output in result:
+            if isinstance(output, dict):
+                output['middleware_pid'] = os.getpid()
+            yield output
+
+
+class OffloadSpider(Spider):
+    name = 'offload'
+    offloaded_callbacks = ['parse', 'parse_page']
+    custom_settings = {
+        'SPIDER_CALLBACK_WORKERS': 2,
+        'SPIDER_MIDDLEWARES': {TagSpiderMiddleware: 100},
+    }
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        # cannot be pickled, workers only have it if __init__ runs in them
+        self.lock = threading.Lock()
+
+    def start_requests(self):
+        yield Request(self.mockserver.url('/'))
+
+    def parse(self, response):
+        with self.lock:
+            yield {'callback': 'parse', 'pid': os.getpid(), 'text': response.text, 'tag': self.tag}
+        for i in range(3):
+            yield response.follow(f'/status?n=20{i}', self.parse_page, cb_kwargs={'number': i})
+        yield response.follow('/status?n=200&main', self.parse_main)
+
+    def parse_page(self, response, number):
+        yield {'callback': 'parse_page', 'pid': os.getpid(), 'number': number, 'url': response.url}
+
+    def parse_main(self, response):
+        yield {'callback': 'parse_main', 'pid': os.getpid()}
+
+
+class ErrorOffloadSpider(OffloadSpider):
+    name = 'erroroffload'
+
+    def parse(self, response):
+        raise ValueError('parse failed')
+
+
+class CallbackPoolTest(TestCase):
+
+    def setUp(self):
+        self.mockserver = MockServer()
+        self.mockserver.__enter__()
+
+    def tearDown(self):
+        self.mockserver.__exit__(None, None, None)
+
+    @defer.inlineCallbacks
+    def crawl(self, spidercls):
+        crawler = get_crawler(spidercls)
+        items = []
+        errors = []
+        crawler.signals.connect(lambda item: items.append(item), signals.item_scraped, weak=False)
+        crawler.signals.connect(lambda failure: errors.append(failure), signals.spider_error, weak=False)
+        yield crawler.crawl(mockserver=self.mockserver, tag='spider attribute')
+        return crawler, items, errors
+
+    @defer.inlineCallbacks
+    def test_offloaded_callbacks(self):
+        crawler, items, errors = yield self.crawl(OffloadSpider)
+        self.assertEqual(errors, [])
+        by_callback = {}
+        for item in items:
+            by_callback.setdefault(item['callback'], []).append(item)
+        self.assertEqual(len(by_callback['parse']), 1)
+        self.assertEqual(by_callback['parse'][0]['text'], 'Scrapy mock HTTP server\n')
+        # attributes that the spider has when the pool starts are copied,
+        # after running __init__ with the spider arguments
+        self.assertEqual(by_callback['parse'][0]['tag'], 'spider attribute')
+        self.assertEqual(sorted(item['number'] for item in by_callback['parse_page']), [0, 1, 2])
+        self.assertEqual(sorted(item['url'].rsplit('/', 1)[1] for item in by_callback['parse_page']),
+                         ['status?n=200', 'status?n=201', 'status?n=202'])
+        offloaded = by_callback['parse'] + by_callback['parse_page']
+        self.assertNotIn(os.getpid(), {item['pid'] for item in offloaded})
+        self.assertEqual([item['pid'] for item in by_callback['parse_main']], [os.getpid()])
+        self.assertEqual({item['middleware_pid'] for item in items}, {os.getpid()})
+
+    @defer.inlineCallbacks
+    def test_error(self):
+        crawler, items, errors = yield self.crawl(ErrorOffloadSpider)
+        self.assertEqual(items, [])
+        self.assertEqual(len(errors), 1)
+        self.assertTrue(errors[0].check(ValueError))
+        self.assertEqual(crawler.stats.get_value('spider_exceptions/ValueError'), 1)
+
+    def test_no_offloaded_callbacks(self):
+        spider = Spider('default')
+        pool = CallbackPool(spider)
+        self.assertIsNone(pool.executor)
+        self.assertFalse(pool.offloads(spider._parse))
+        pool.close()
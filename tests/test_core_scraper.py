@@ -0,0 +1,103 @@
+import sys
+
+from twisted.internet import defer
+from twisted.python.failure import Failure
+from twisted.trial.unittest import TestCase
+
+from scrapy import Request, Spider
+from scrapy.core.scraper import Slot
+from scrapy.http import HtmlResponse, Response
+from scrapy.utils.test import get_crawler
+
+from tests.mockserver import MockServer
+
+
+class SlotTest(TestCase):
+
+    def test_response_size(self):
+        slot = Slot()
+        request = Request('http://example.com')
+        body = b'<html><body>' + b'<p>text</p>' * 1000 + b'</body></html>'
+        response = HtmlResponse('http://example.com', body=body, encoding='utf-8', request=request)
+        slot.add_response_request(response, request)
+        self.assertEqual(slot.active_size, len(body))
+        slot.next_response_request_deferred()
+
+        text = response.text
+        slot.update_response(response, request)
+        self.assertEqual(slot.active_size, len(body) + sys.getsizeof(text))
+
+        response.selector
+        slot.update_response(response, request)
+        expected = len(body) + sys.getsizeof(text) + len(body) * Slot.SELECTOR_SIZE_FACTOR
+        self.assertEqual(slot.active_size, expected)
+        self.assertEqual(slot.active_size_peak, expected)
+
+        slot.finish_response(response, request)
+        self.assertEqual(slot.active_size, 0)
+        self.assertEqual(slot.active_size_peak, expected)
+        self.assertTrue(slot.is_idle())
+
+    def test_min_response_size(self):
+        slot = Slot()
+        request = Request('http://example.com')
+        response = Response('http://example.com', body=b'small')
+        failure = Failure(ValueError())
+        slot.add_response_request(response, request)
+        self.assertEqual(slot.active_size, Slot.MIN_RESPONSE_SIZE)
+        slot.add_response_request(failure, Request('http://example.com/2'))
+        self.assertEqual(slot.active_size, 2 * Slot.MIN_RESPONSE_SIZE)
+
+    def test_items(self):
+        slot = Slot(max_active_size=10 ** 6, max_itemproc_size=2)
+        item = {'name': 'x' * 1000, 'tags': ['a', 'b']}
+        sizes = [slot.add_item(item), slot.add_item(item)]
+        self.assertGreater(sizes[0], 1000)
+        self.assertEqual(slot.active_size, sum(sizes))
+        self.assertFalse(slot.needs_backout())
+        sizes.append(slot.add_item(item))
+        self.assertTrue(slot.needs_backout())
+        for size in sizes:
+            self.assertEqual(slot.finish_item('result', size), 'result')
+        self.assertEqual((slot.itemproc_size, slot.active_size), (0, 0))
+        self.assertEqual(slot.itemproc_size_peak, 3)
+
+    def test_needs_backout(self):
+        slot = Slot(max_active_size=2000)
+        self.assertFalse(slot.needs_backout())
+        slot.add_item({'body': 'x' * 2000})
+        self.assertTrue(slot.needs_backout())
+        # no limit on the number of items by default
+        slot = Slot()
+        for _ in range(100):
+            slot.add_item({})
+        self.assertFalse(slot.needs_backout())
+
+
+class ItemSpider(Spider):
+    name = 'items'
+
+    def start_requests(self):
+        yield Request(self.mockserver.url('/'))
+
+    def parse(self, response):
+        for i in range(10):
+            yield {'number': i, 'title': response.css('title::text').get()}
+
+
+class ScraperStatsTest(TestCase):
+
+    def setUp(self):
+        self.mockserver = MockServer()
+        self.mockserver.__enter__()
+
+    def tearDown(self):
+        self.mockserver.__exit__(None, None, None)
+
+    @defer.inlineCallbacks
+    def test_stats(self):
+        crawler = get_crawler(ItemSpider)
+        yield crawler.crawl(mockserver=self.mockserver)
+        self.assertEqual(crawler.stats.get_value('item_scraped_count'), 10)
+        self.assertGreater(crawler.stats.get_value('scraper/slot/active_size_max'), Slot.MIN_RESPONSE_SIZE)
+        self.assertGreaterEqual(crawler.stats.get_value('scraper/slot/itemproc_size_max'), 1)
@@ -213,6 +213,73 @@ class MiddlewareUsingDeferreds(ManagerTestCase):
         self.assertFalse(download_func.called)
 
 
+class SynchronousChainTest(ManagerTestCase):
+    """Middlewares that return plain values are called without Deferreds"""
+
+    def test_synchronous(self):
+        req = Request('http://example.com/index.html')
+        resp = Response(req.url)
+        dfd = self.mwman.download(lambda **kwargs: resp, req, self.spider)
+        # the chain ran within the download call
+        self.assertTrue(dfd.called)
+        results = []
+        dfd.addBoth(results.append)
+        self.assertIs(results[0], resp)
+
+    def test_deferred_then_synchronous(self):
+        req = Request('http://example.com/index.html')
+        resp = Response(req.url)
+        pending = Deferred()
+        calls = []
+
+        class SyncMiddleware:
+            def process_response(self, request, response, spider):
+                calls.append(('sync', response))
+                return response.replace(flags=['sync'])
+
+        class DeferredMiddleware:
+            def process_response(self, request, response, spider):
+                calls.append(('deferred', response))
+                return pending
+
+        # process_response methods are called in reverse order
+        self.mwman._add_middleware(SyncMiddleware())
+        self.mwman._add_middleware(DeferredMiddleware())
+        dfd = self.mwman.download(lambda **kwargs: resp, req, self.spider)
+        results = []
+        dfd.addBoth(results.append)
+        self.assertEqual(results, [])
+        self.assertEqual(calls, [('deferred', resp)])
+
+        deferred_resp = Response(req.url, flags=['deferred'])
+        pending.callback(deferred_resp)
+        self.assertEqual(calls, [('deferred', resp), ('sync', deferred_resp)])
+        self.assertEqual(results[0].flags, ['sync'])
+
+    def test_exception(self):
+        req = Request('http://example.com/index.html')
+        resp = Response(req.url)
+
+        class RaiseMiddleware:
+            def process_request(self, request, spider):
+                raise ValueError
+
+        class ExceptionMiddleware:
+            def process_exception(self, request, exception, spider):
+                if isinstance(exception, ValueError):
+                    return resp
+
+        self.mwman._add_middleware(ExceptionMiddleware())
+        self.mwman._add_middleware(RaiseMiddleware())
+        download_func = mock.MagicMock()
+        dfd = self.mwman.download(download_func, req, self.spider)
+        self.assertTrue(dfd.called)
+        results = []
+        dfd.addBoth(results.append)
+        self.assertIs(results[0], resp)
+        self.assertFalse(download_func.called)
+
+
 @mark.usefixtures('reactor_pytest')
 class MiddlewareUsingCoro(ManagerTestCase):
     """Middlewares using asyncio coroutines should work"""
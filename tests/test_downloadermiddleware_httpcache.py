@@ -1,14 +1,23 @@
+import os
 import time
 import tempfile
 import shutil
 import unittest
 import email.utils
 from contextlib import contextmanager
+from unittest import mock
+
+import pytest
+
+from twisted.internet import defer, reactor
+from twisted.internet.task import deferLater
+from twisted.trial.unittest import TestCase as TrialTestCase
 
 from scrapy.http import Response, HtmlResponse, Request
 from scrapy.spiders import Spider
 from scrapy.settings import Settings
 from scrapy.exceptions import IgnoreRequest
+from scrapy.utils.request import request_fingerprint
 from scrapy.utils.test import get_crawler
 from scrapy.downloadermiddlewares.httpcache import HttpCacheMiddleware
 
@@ -154,6 +163,299 @@ class FilesystemStorageGzipTest(FilesystemStorageTest):
         return super()._get_settings(**new_settings)
 
 
+class FilesystemStorageZstdDictTest(FilesystemStorageTest):
+
+    def setUp(self):
+        try:
+            import zstandard  # noqa: F401
+        except ImportError:
+            raise unittest.SkipTest("no zstd support (zstandard)")
+        super().setUp()
+
+    def _get_settings(self, **new_settings):
+        new_settings.setdefault('HTTPCACHE_ZSTD_DICT_ENABLED', True)
+        new_settings.setdefault('HTTPCACHE_ZSTD_DICT_SAMPLES', 50)
+        new_settings.setdefault('HTTPCACHE_ZSTD_DICT_SIZE', 4096)
+        return super()._get_settings(**new_settings)
+
+    def _pages(self, domain, count):
+        for i in range(count):
+            request = Request(f'http://{domain}/{i}')
+            body = (b'<html><head><title>Page %d</title></head><body>' % i
+                    + b''.join(b'<div class="item-%d">item %d of page %d</div>' % (j, j * i, i)
+                               for j in range(50))
+                    + b'</body></html>')
+            yield request, self.response.replace(url=request.url, body=body)
+
+    def _body_path(self, storage, request):
+        return os.path.join(storage._get_request_path(self.spider, request), 'response_body')
+
+    def test_dictionary_training(self):
+        pages = list(self._pages('www.example.com', 60))
+        with self._storage(HTTPCACHE_EXPIRATION_SECS=0) as storage:
+            for request, response in pages[:49]:
+                storage.store_response(self.spider, request, response)
+            self.assertTrue(os.path.exists(self._body_path(storage, pages[0][0])))
+            for request, response in pages[49:]:
+                storage.store_response(self.spider, request, response)
+            dictpath = storage._get_dictionary_path(self.spider, 'www.example.com')
+            self.assertTrue(os.path.exists(dictpath))
+            for request, response in pages:
+                bodypath = self._body_path(storage, request)
+                self.assertFalse(os.path.exists(bodypath))
+                self.assertLess(os.path.getsize(bodypath + '.zst'), len(response.body) / 4)
+                self.assertEqualResponse(response, storage.retrieve_response(self.spider, request))
+        with self._storage(HTTPCACHE_EXPIRATION_SECS=0) as storage:
+            for request, response in pages:
+                self.assertEqualResponse(response, storage.retrieve_response(self.spider, request))
+
+    def test_dictionary_per_domain(self):
+        with self._storage(HTTPCACHE_EXPIRATION_SECS=0) as storage:
+            for request, response in self._pages('www.example.com', 50):
+                storage.store_response(self.spider, request, response)
+            request, response = next(self._pages('www.example.org', 1))
+            storage.store_response(self.spider, request, response)
+            self.assertTrue(os.path.exists(self._body_path(storage, request)))
+            self.assertFalse(os.path.exists(
+                storage._get_dictionary_path(self.spider, 'www.example.org')))
+            self.assertEqualResponse(response, storage.retrieve_response(self.spider, request))
+
+    def test_training_failure(self):
+        import zstandard
+        train_dictionary = mock.Mock(side_effect=zstandard.ZstdError)
+        with self._storage(HTTPCACHE_EXPIRATION_SECS=0, HTTPCACHE_ZSTD_DICT_SAMPLES=2) as storage, \
+                mock.patch('zstandard.train_dictionary', train_dictionary):
+            for i in range(8):
+                request = Request(f'http://www.example.com/{i}')
+                storage.store_response(self.spider, request, self.response)
+            self.assertEqual(train_dictionary.call_count, 4)
+            self.assertIsNone(storage._samples['www.example.com'])
+            self.assertIsNone(storage._get_dictionary(self.spider, 'www.example.com'))
+            self.assertEqualResponse(self.response, storage.retrieve_response(self.spider, request))
+
+    def test_bounded_codecs(self):
+        with self._storage(HTTPCACHE_EXPIRATION_SECS=0, HTTPCACHE_ZSTD_DICT_SAMPLES=50) as storage, \
+                mock.patch.object(storage._compressors, 'limit', 2), \
+                mock.patch.object(storage._dictionaries, 'limit', 2):
+            pages = {}
+            for domain in ('a.example', 'b.example', 'c.example'):
+                pages[domain] = list(self._pages(domain, 50))
+                for request, response in pages[domain]:
+                    storage.store_response(self.spider, request, response)
+                self.assertNotIn(domain, storage._samples)
+            self.assertEqual(list(storage._compressors), ['b.example', 'c.example'])
+            self.assertLessEqual(len(storage._dictionaries), 2)
+            for domain in pages:
+                request, response = pages[domain][0]
+                self.assertEqualResponse(response, storage.retrieve_response(self.spider, request))
+
+    def test_missing_dictionary(self):
+        pages = list(self._pages('www.example.com', 50))
+        with self._storage(HTTPCACHE_EXPIRATION_SECS=0) as storage:
+            for request, response in pages:
+                storage.store_response(self.spider, request, response)
+            os.remove(storage._get_dictionary_path(self.spider, 'www.example.com'))
+        with self._storage(HTTPCACHE_EXPIRATION_SECS=0) as storage, \
+                self.assertLogs('scrapy.extensions.httpcache', level='WARNING'):
+            self.assertIsNone(storage.retrieve_response(self.spider, pages[0][0]))
+
+    def test_samples_not_in_memory(self):
+        with self._storage(HTTPCACHE_EXPIRATION_SECS=0) as storage:
+            pages = list(self._pages('www.example.com', 10))
+            for request, response in pages:
+                storage.store_response(self.spider, request, response)
+            self.assertEqual(storage._samples['www.example.com'],
+                             [self._body_path(storage, request) for request, _ in pages])
+
+    def test_missing_zstandard(self):
+        with mock.patch('scrapy.extensions.httpcache.zstandard', None), \
+                self.assertLogs('scrapy.extensions.httpcache', level='WARNING') as logs, \
+                self._storage() as storage:
+            self.assertFalse(storage.use_zstd_dict)
+            storage.store_response(self.spider, self.request, self.response)
+            self.assertEqualResponse(self.response, storage.retrieve_response(self.spider, self.request))
+        self.assertIn('zstandard', logs.output[0])
+
+
+class MemoryStorageTest(FilesystemStorageTest):
+
+    def _get_settings(self, **new_settings):
+        new_settings.setdefault('HTTPCACHE_MEMORY_SIZE', 1024)
+        return super()._get_settings(**new_settings)
+
+    def _response(self, i, size=100):
+        return self.response.replace(url=f'http://www.example.com/{i}', body=b'x' * size)
+
+    def test_served_from_memory(self):
+        with self._storage(HTTPCACHE_EXPIRATION_SECS=0) as storage:
+            storage.store_response(self.spider, self.request, self.response)
+            shutil.rmtree(os.path.join(self.tmpdir, self.spider.name))
+            response = storage.retrieve_response(self.spider, self.request)
+            self.assertEqualResponse(self.response, response)
+            response.flags.append('cached')
+            self.assertEqual(storage.retrieve_response(self.spider, self.request).flags, [])
+        self.assertEqual(self.crawler.stats.get_value('httpcache/memory/hit'), 2)
+
+    def test_retrieved_responses(self):
+        with self._storage(HTTPCACHE_EXPIRATION_SECS=0) as storage:
+            storage.store_response(self.spider, self.request, self.response)
+        with self._storage(HTTPCACHE_EXPIRATION_SECS=0) as storage:
+            self.assertEqualResponse(self.response, storage.retrieve_response(self.spider, self.request))
+            self.assertEqualResponse(self.response, storage.retrieve_response(self.spider, self.request))
+        self.assertEqual(self.crawler.stats.get_value('httpcache/memory/miss'), 1)
+        self.assertEqual(self.crawler.stats.get_value('httpcache/memory/hit'), 1)
+        with self._storage(HTTPCACHE_EXPIRATION_SECS=60) as storage:
+            storage.retrieve_response(self.spider, self.request)
+            self.assertEqual(storage.size, 0)
+
+    def test_eviction(self):
+        requests = [Request(f'http://www.example.com/{i}') for i in range(20)]
+        with self._storage(HTTPCACHE_EXPIRATION_SECS=0) as storage:
+            for i, request in enumerate(requests):
+                storage.store_response(self.spider, request, self._response(i))
+                storage.retrieve_response(self.spider, requests[0])
+                self.assertLessEqual(storage.size, 1024)
+            self.assertIn(request_fingerprint(requests[0]), storage._responses)
+            self.assertNotIn(request_fingerprint(requests[1]), storage._responses)
+            storage.store_response(self.spider, requests[1], self._response(1, size=2048))
+            self.assertNotIn(request_fingerprint(requests[1]), storage._responses)
+        self.assertGreater(self.crawler.stats.get_value('httpcache/memory/eviction'), 0)
+
+
+class LogStructuredStorageTest(DefaultStorageTest):
+
+    storage_class = 'scrapy.extensions.httpcache.LogStructuredCacheStorage'
+
+    def _response(self, i):
+        return self.response.replace(body=b'test body %d' % i)
+
+    def test_reopen(self):
+        with self._storage(HTTPCACHE_EXPIRATION_SECS=0) as storage:
+            storage.store_response(self.spider, self.request, self.response)
+        with self._storage(HTTPCACHE_EXPIRATION_SECS=0) as storage:
+            self.assertEqualResponse(self.response, storage.retrieve_response(self.spider, self.request))
+
+    def test_overwrite_and_delete(self):
+        request2 = Request('http://www.example.com/2')
+        with self._storage(HTTPCACHE_EXPIRATION_SECS=0, HTTPCACHE_LOG_COMPACT_RATIO=0) as storage:
+            storage.store_response(self.spider, self.request, self._response(1))
+            storage.store_response(self.spider, self.request, self._response(2))
+            storage.store_response(self.spider, request2, self._response(3))
+            storage.delete(request_fingerprint(request2))
+            self.assertGreater(storage.garbage_ratio(), 0)
+        with self._storage(HTTPCACHE_EXPIRATION_SECS=0) as storage:
+            self.assertEqual(storage.retrieve_response(self.spider, self.request).body, b'test body 2')
+            self.assertIsNone(storage.retrieve_response(self.spider, request2))
+
+    def test_segment_rotation_and_compaction(self):
+        requests = [Request(f'http://www.example.com/{i}') for i in range(20)]
+        with self._storage(HTTPCACHE_EXPIRATION_SECS=0, HTTPCACHE_LOG_SEGMENT_SIZE=500,
+                           HTTPCACHE_LOG_COMPACT_RATIO=0) as storage:
+            for i, request in enumerate(requests):
+                storage.store_response(self.spider, request, self._response(i))
+            for request in requests[:15]:
+                storage.delete(request_fingerprint(request))
+            segments = len(storage._segments)
+            self.assertGreater(segments, 1)
+            storage.compact()
+            self.assertLess(len(storage._segments), segments)
+            self.assertEqual(storage.garbage_ratio(), 0)
+            for i, request in enumerate(requests):
+                response = storage.retrieve_response(self.spider, request)
+                if i < 15:
+                    self.assertIsNone(response)
+                else:
+                    self.assertEqual(response.body, b'test body %d' % i)
+        with self._storage(HTTPCACHE_EXPIRATION_SECS=0) as storage:
+            self.assertEqual(len(storage.index), 5)
+
+    def test_truncated_segment(self):
+        with self._storage(HTTPCACHE_EXPIRATION_SECS=0) as storage:
+            storage.store_response(self.spider, self.request, self.response)
+            storage.store_response(self.spider, Request('http://www.example.com/2'), self.response)
+            path = storage._segment_path(storage._segments[-1])
+        with open(path, 'r+b') as f:
+            f.truncate(os.path.getsize(path) - 3)
+        with self._storage(HTTPCACHE_EXPIRATION_SECS=0) as storage:
+            self.assertEqualResponse(self.response, storage.retrieve_response(self.spider, self.request))
+            self.assertIsNone(storage.retrieve_response(self.spider, Request('http://www.example.com/2')))
+
+    def test_corrupted_record(self):
+        request2 = Request('http://www.example.com/2')
+        with self._storage(HTTPCACHE_EXPIRATION_SECS=0) as storage:
+            storage.store_response(self.spider, self.request, self._response(1))
+            storage.store_response(self.spider, request2, self._response(2))
+            path = storage._segment_path(storage._segments[-1])
+            _, offset, length, _ = storage.index[request_fingerprint(self.request)]
+        with open(path, 'r+b') as f:
+            f.seek(offset + length - 1)
+            byte = f.read(1)
+            f.seek(offset + length - 1)
+            f.write(b'\xff' if byte != b'\xff' else b'\x00')
+        with self._storage(HTTPCACHE_EXPIRATION_SECS=0) as storage, \
+                self.assertLogs('scrapy.extensions.httpcache', level='WARNING'):
+            # a cache miss
+            self.assertIsNone(storage.retrieve_response(self.spider, self.request))
+            self.assertNotIn(request_fingerprint(self.request), storage.index)
+            self.assertEqual(storage.retrieve_response(self.spider, request2).body, b'test body 2')
+
+    def test_corrupted_header(self):
+        requests = [Request(f'http://www.example.com/{i}') for i in range(3)]
+        with self._storage(HTTPCACHE_EXPIRATION_SECS=0) as storage:
+            for i, request in enumerate(requests):
+                storage.store_response(self.spider, request, self._response(i))
+            path = storage._segment_path(storage._segments[-1])
+            _, offset, _, _ = storage.index[request_fingerprint(requests[1])]
+        size = os.path.getsize(path)
+        with open(path, 'r+b') as f:
+            f.seek(offset)
+            f.write(b'XXXX')
+        with self.assertLogs('scrapy.extensions.httpcache', level='WARNING'), \
+                self._storage(HTTPCACHE_EXPIRATION_SECS=0) as storage:
+            # the records after the corrupted one are kept
+            self.assertEqual(os.path.getsize(path), size)
+            self.assertEqual(storage.retrieve_response(self.spider, requests[0]).body, b'test body 0')
+            self.assertIsNone(storage.retrieve_response(self.spider, requests[1]))
+            self.assertEqual(storage.retrieve_response(self.spider, requests[2]).body, b'test body 2')
+            self.assertGreater(storage.garbage_ratio(), 0)
+
+
+class LogStructuredStorageGzipTest(LogStructuredStorageTest):
+
+    def _get_settings(self, **new_settings):
+        new_settings.setdefault('HTTPCACHE_GZIP', True)
+        return super()._get_settings(**new_settings)
+
+
+class SqliteStorageTest(DefaultStorageTest):
+
+    storage_class = 'scrapy.extensions.httpcache.SqliteCacheStorage'
+
+    def test_delete_expired(self):
+        with self._storage(HTTPCACHE_EXPIRATION_SECS=0) as storage:
+            storage.store_response(self.spider, self.request, self.response)
+            storage.db.execute('UPDATE responses SET timestamp = timestamp - 3600')
+            storage.store_response(self.spider, Request('http://www.example.com/2'), self.response)
+            self.assertEqual(storage.delete_expired(), 0)
+            self.assertEqual(storage.delete_expired(60), 1)
+            self.assertIsNone(storage.retrieve_response(self.spider, self.request))
+            self.assertIsNotNone(storage.retrieve_response(self.spider, Request('http://www.example.com/2')))
+
+    def test_concurrent_reader(self):
+        with self._storage(HTTPCACHE_EXPIRATION_SECS=0, HTTPCACHE_SQLITE_BATCH_SIZE=2) as storage:
+            reader = HttpCacheMiddleware(self._get_settings(HTTPCACHE_EXPIRATION_SECS=0),
+                                         self.crawler.stats).storage
+            reader.open_spider(self.spider)
+            try:
+                storage.store_response(self.spider, self.request, self.response)
+                # not committed yet
+                self.assertIsNone(reader.retrieve_response(self.spider, self.request))
+                storage.store_response(self.spider, Request('http://www.example.com/2'), self.response)
+                self.assertEqualResponse(self.response, reader.retrieve_response(self.spider, self.request))
+            finally:
+                reader.close_spider(self.spider)
+
+
 class DummyPolicyTest(_BaseTest):
 
     policy_class = 'scrapy.extensions.httpcache.DummyPolicy'
@@ -187,6 +489,10 @@ class DummyPolicyTest(_BaseTest):
             self.assertEqualResponse(self.response, response)
             assert 'cached' in response.flags
 
+    def test_middleware_replay(self):
+        with self._middleware(HTTPCACHE_REPLAY=True) as mw:
+            self.assertRaises(IgnoreRequest, mw.process_request, self.request, self.spider)
+
     def test_middleware_ignore_schemes(self):
         # http responses are cached by default
         req, res = Request('http://test.com/'), Response('http://test.com/')
@@ -480,6 +786,75 @@ class RFC2616PolicyTest(DefaultStorageTest):
             mw.process_request(req0, self.spider)
             assert mw.process_exception(req0, Exception('foo'), self.spider) is None
 
+    def test_revalidate_ahead(self):
+        stale = Response('http://example.com/stale', body=b'stale body',
+                         headers={'Date': self.yesterday, 'Expires': self.yesterday, 'ETag': 'foo'})
+        fresh = Response('http://example.com/fresh', body=b'fresh body',
+                         headers={'Expires': self.tomorrow, 'ETag': 'bar'})
+        unvalidated = Response('http://example.com/unvalidated', headers={'Expires': self.yesterday})
+        with self._middleware(HTTPCACHE_EXPIRATION_SECS=0) as mw:
+            for response in (stale, fresh, unvalidated):
+                self._process_requestresponse(mw, Request(response.url), response)
+
+        settings = self._get_settings(HTTPCACHE_EXPIRATION_SECS=0, HTTPCACHE_REVALIDATE_AHEAD=True)
+        mw = HttpCacheMiddleware(settings, self.crawler.stats)
+        mw.crawler = mock.Mock()
+        mw.spider_opened(self.spider)
+        try:
+            # Only the stale response is revalidated right away, the fresh
+            # one when it becomes stale
+            self.assertEqual(mw.crawler.engine.crawl.call_count, 1)
+            req0 = mw.crawler.engine.crawl.call_args[0][0]
+            self.assertEqual(req0.url, stale.url)
+            self.assertEqual(req0.priority, -100)
+            self.assertTrue(req0.dont_filter)
+            self.assertEqual([url for _, _, url, _ in mw._revalidations], [fresh.url])
+            self.assertTrue(mw._revalidation_call.active())
+
+            self.assertIsNone(mw.process_request(req0, self.spider))
+            self.assertEqual(req0.headers['If-None-Match'], b'foo')
+            self.crawler.stats.set_value('httpcache/revalidate/bytes_saved', 0, spider=self.spider)
+            res304 = Response(req0.url, status=304, headers={'Expires': self.tomorrow})
+            self.assertRaises(IgnoreRequest, mw.process_response, req0, res304, self.spider)
+            self.assertEqual(self.crawler.stats.get_value('httpcache/revalidate/bytes_saved'),
+                             len(stale.body))
+
+            # The cached response is fresh again for the spider requests
+            res1 = mw.process_request(Request(stale.url), self.spider)
+            self.assertEqual(res1.body, stale.body)
+            self.assertEqual(res1.headers['ETag'], b'foo')
+            self.assertIn('cached', res1.flags)
+            # so are not revalidated twice
+            self.assertRaises(IgnoreRequest, mw.process_request, req0, self.spider)
+        finally:
+            mw.spider_closed(self.spider)
+        self.assertFalse(mw._revalidation_call.active())
+
+    def test_revalidate_ahead_batches(self):
+        stale = [Response(f'http://example.com/{i}', headers={'Expires': self.yesterday, 'ETag': 'foo'})
+                 for i in range(3)]
+        with self._middleware(HTTPCACHE_EXPIRATION_SECS=0) as mw:
+            for response in stale:
+                self._process_requestresponse(mw, Request(response.url), response)
+
+        settings = self._get_settings(HTTPCACHE_EXPIRATION_SECS=0, HTTPCACHE_REVALIDATE_AHEAD=True)
+        mw = HttpCacheMiddleware(settings, self.crawler.stats)
+        mw.crawler = mock.Mock()
+        with mock.patch.object(mw, 'REVALIDATION_BATCH_SIZE', 2):
+            mw.spider_opened(self.spider)
+            try:
+                self.assertEqual(mw.crawler.engine.crawl.call_count, 2)
+                self.assertEqual(len(mw._revalidations), 1)
+                self.assertEqual(mw._revalidation_call.getTime() - reactor.seconds(),
+                                 pytest.approx(mw.REVALIDATION_BATCH_INTERVAL, abs=0.1))
+                mw._revalidation_call.cancel()
+                mw._schedule_revalidations(self.spider)
+                self.assertEqual(mw.crawler.engine.crawl.call_count, 3)
+                self.assertEqual({call[0][0].url for call in mw.crawler.engine.crawl.call_args_list},
+                                 {response.url for response in stale})
+            finally:
+                mw.spider_closed(self.spider)
+
     def test_ignore_response_cache_controls(self):
         sampledata = [
             (200, {'Date': self.yesterday, 'Expires': self.tomorrow}),
@@ -504,3 +879,97 @@ class RFC2616PolicyTest(DefaultStorageTest):
 
 if __name__ == '__main__':
     unittest.main()
+
+
+class ThreadedStorageTest(TrialTestCase):
+
+    storage_class = 'scrapy.extensions.httpcache.SqliteCacheStorage'
+
+    def setUp(self):
+        self.crawler = get_crawler(Spider)
+        self.spider = self.crawler._create_spider('example.com')
+        self.tmpdir = tempfile.mkdtemp()
+        self.request = Request('http://www.example.com', headers={'User-Agent': 'test'})
+        self.response = Response('http://www.example.com', headers={'Content-Type': 'text/html'},
+                                 body=b'test body', status=202)
+        self.crawler.stats.open_spider(self.spider)
+        settings = Settings({
+            'HTTPCACHE_ENABLED': True,
+            'HTTPCACHE_ASYNC': True,
+            'HTTPCACHE_DIR': self.tmpdir,
+            'HTTPCACHE_STORAGE': self.storage_class,
+        })
+        self.mw = HttpCacheMiddleware(settings, self.crawler.stats)
+
+    def tearDown(self):
+        self.crawler.stats.close_spider(self.spider, '')
+        shutil.rmtree(self.tmpdir)
+
+    @defer.inlineCallbacks
+    def test_middleware(self):
+        yield self.mw.spider_opened(self.spider)
+        try:
+            d = self.mw.process_request(self.request, self.spider)
+            self.assertIsInstance(d, defer.Deferred)
+            self.assertIsNone((yield d))
+            self.mw.process_response(self.request, self.response, self.spider)
+            # served from the pending batch
+            cached = yield self.mw.process_request(self.request, self.spider)
+            self.assertIn('cached', cached.flags)
+            self.assertNotIn('cached', self.response.flags)
+            self.assertEqual(cached.body, self.response.body)
+            yield deferLater(reactor, 0, lambda: None)
+            self.assertEqual(self.mw.storage._pending, {})
+            # served from the storage
+            cached = yield self.mw.process_request(self.request, self.spider)
+            self.assertIn('cached', cached.flags)
+            self.assertEqual(cached.body, self.response.body)
+        finally:
+            yield self.mw.spider_closed(self.spider)
+
+    @defer.inlineCallbacks
+    def test_revalidate_ahead(self):
+        yesterday = email.utils.formatdate(time.time() - 86400)
+        response = Response('http://www.example.com', headers={'Expires': yesterday, 'ETag': 'foo'})
+        yield self.mw.spider_opened(self.spider)
+        self.mw.process_response(self.request, response, self.spider)
+        yield self.mw.spider_closed(self.spider)
+
+        settings = Settings({
+            'HTTPCACHE_ENABLED': True,
+            'HTTPCACHE_ASYNC': True,
+            'HTTPCACHE_DIR': self.tmpdir,
+            'HTTPCACHE_STORAGE': self.storage_class,
+            'HTTPCACHE_POLICY': 'scrapy.extensions.httpcache.RFC2616Policy',
+            'HTTPCACHE_REVALIDATE_AHEAD': True,
+        })
+        mw = HttpCacheMiddleware(settings, self.crawler.stats)
+        mw.crawler = mock.Mock()
+        yield mw.spider_opened(self.spider)
+        try:
+            self.assertEqual(mw.crawler.engine.crawl.call_count, 1)
+            self.assertEqual(mw.crawler.engine.crawl.call_args[0][0].url, self.request.url)
+        finally:
+            yield mw.spider_closed(self.spider)
+
+    @defer.inlineCallbacks
+    def test_close_flushes_pending(self):
+        yield self.mw.spider_opened(self.spider)
+        self.mw.process_response(self.request, self.response, self.spider)
+        yield self.mw.spider_closed(self.spider)
+        yield self.mw.spider_opened(self.spider)
+        try:
+            cached = yield self.mw.process_request(self.request, self.spider)
+            self.assertEqual(cached.body, self.response.body)
+        finally:
+            yield self.mw.spider_closed(self.spider)
+
+
+class ThreadedFilesystemStorageTest(ThreadedStorageTest):
+
+    storage_class = 'scrapy.extensions.httpcache.FilesystemCacheStorage'
+
+
+class ThreadedDbmStorageTest(ThreadedStorageTest):
+
+    storage_class = 'scrapy.extensions.httpcache.DbmCacheStorage'
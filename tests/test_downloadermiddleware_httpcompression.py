@@ -1,13 +1,22 @@
+import threading
+import tracemalloc
+import zlib
 from io import BytesIO
 from unittest import TestCase, SkipTest
 from os.path import join
 from gzip import GzipFile
 
+from testfixtures import LogCapture
+from twisted.internet import defer
+from twisted.trial.unittest import TestCase as TrialTestCase
+
+from scrapy.exceptions import IgnoreRequest
 from scrapy.spiders import Spider
 from scrapy.http import Response, Request, HtmlResponse
 from scrapy.downloadermiddlewares.httpcompression import HttpCompressionMiddleware, ACCEPTED_ENCODINGS
 from scrapy.responsetypes import responsetypes
 from scrapy.utils.gz import gunzip
+from scrapy.utils.test import get_crawler
 from tests import tests_datadir
 from w3lib.encoding import resolve_encoding
 
@@ -278,3 +287,160 @@ class HttpCompressionTest(TestCase):
         newresponse = self.mw.process_response(request, response, self.spider)
         self.assertIs(newresponse, response)
         self.assertEqual(response.body, b'')
+
+    def _bomb_response(self, encoding, size=10 * 1024 * 1024):
+        plainbody = b'\0' * size
+        if encoding == 'gzip':
+            f = BytesIO()
+            with GzipFile(fileobj=f, mode='wb') as zf:
+                zf.write(plainbody)
+            body = f.getvalue()
+        elif encoding == 'deflate':
+            body = zlib.compress(plainbody)
+        elif encoding == 'br':
+            try:
+                import brotli
+            except ImportError:
+                raise SkipTest("no brotli")
+            body = brotli.compress(plainbody)
+        elif encoding == 'zstd':
+            try:
+                import zstandard
+            except ImportError:
+                raise SkipTest("no zstd support (zstandard)")
+            body = zstandard.ZstdCompressor().compress(plainbody)
+        headers = {'Content-Type': 'application/octet-stream',
+                   'Content-Encoding': encoding}
+        return Response('http://scrapytest.org', body=body, headers=headers)
+
+    def _test_max_size(self, encoding):
+        request = Request('http://scrapytest.org')
+        crawler = get_crawler(Spider, {'DOWNLOAD_MAXSIZE': 1024 * 1024})
+        mw = HttpCompressionMiddleware.from_crawler(crawler)
+        self.assertRaises(IgnoreRequest, mw.process_response,
+                          request, self._bomb_response(encoding), self.spider)
+
+        spider = Spider('foo', download_maxsize=1024 * 1024)
+        self.assertRaises(IgnoreRequest, self.mw.process_response,
+                          request, self._bomb_response(encoding), spider)
+
+        request = Request('http://scrapytest.org',
+                          meta={'download_maxsize': 1024 * 1024})
+        self.assertRaises(IgnoreRequest, self.mw.process_response,
+                          request, self._bomb_response(encoding), self.spider)
+
+        request = Request('http://scrapytest.org',
+                          meta={'download_maxsize': 0})
+        newresponse = mw.process_response(request, self._bomb_response(encoding), self.spider)
+        self.assertEqual(len(newresponse.body), 10 * 1024 * 1024)
+
+    def test_max_size_gzip(self):
+        self._test_max_size('gzip')
+
+    def test_max_size_deflate(self):
+        self._test_max_size('deflate')
+
+    def test_max_size_br(self):
+        self._test_max_size('br')
+
+    def test_max_size_zstd(self):
+        self._test_max_size('zstd')
+
+    def test_max_size_br_memory(self):
+        try:
+            import brotli
+        except ImportError:
+            raise SkipTest("no brotli")
+        if not hasattr(brotli.Decompressor(), 'can_accept_more_data'):
+            raise SkipTest("brotli < 1.2.0 cannot bound decompressed chunks")
+        # a few hundred bytes that inflate to 64 MiB
+        body = brotli.compress(b'\0' * 64 * 1024 * 1024, quality=1)
+        response = Response('http://scrapytest.org', body=body, headers={'Content-Encoding': 'br'})
+        request = Request('http://scrapytest.org', meta={'download_maxsize': 1024 * 1024})
+        tracemalloc.start()
+        try:
+            self.assertRaises(IgnoreRequest, self.mw.process_response, request, response, self.spider)
+            peak = tracemalloc.get_traced_memory()[1]
+        finally:
+            tracemalloc.stop()
+        self.assertLess(peak, 16 * 1024 * 1024)
+
+    def test_warn_size(self):
+        response = self._bomb_response('gzip', size=1024 * 1024)
+        request = Request('http://scrapytest.org')
+        crawler = get_crawler(Spider, {'DOWNLOAD_WARNSIZE': 64 * 1024})
+        mw = HttpCompressionMiddleware.from_crawler(crawler)
+        with LogCapture() as log:
+            mw.process_response(request, response, self.spider)
+        self.assertIn('larger than the download warning size', str(log))
+
+
+class HttpCompressionThreadPoolTest(TrialTestCase):
+
+    def setUp(self):
+        self.spider = Spider('foo')
+        crawler = get_crawler(Spider, {'COMPRESSION_THREADPOOL_MAXSIZE': 2})
+        self.mw = HttpCompressionMiddleware.from_crawler(crawler)
+        self.mw.spider_opened(self.spider)
+
+    def tearDown(self):
+        return self.mw.spider_closed(self.spider)
+
+    @defer.inlineCallbacks
+    def test_spider_closed(self):
+        threadpool = self.mw._threadpool
+        stop = threadpool.stop
+        stopped_in = []
+
+        def record_stop():
+            stopped_in.append(threading.current_thread())
+            stop()
+
+        threadpool.stop = record_stop
+        yield self.mw.spider_closed(self.spider)
+        self.assertIsNone(self.mw._threadpool)
+        self.assertEqual(len(stopped_in), 1)
+        self.assertIsNot(stopped_in[0], threading.current_thread())
+        self.assertFalse(threadpool.started)
+        self.assertIsNone(self.mw.spider_closed(self.spider))
+
+    def _gzip_response(self, body):
+        f = BytesIO()
+        with GzipFile(fileobj=f, mode='wb') as zf:
+            zf.write(body)
+        headers = {'Content-Type': 'text/html', 'Content-Encoding': 'gzip'}
+        return Response('http://scrapytest.org', body=f.getvalue(), headers=headers)
+
+    @defer.inlineCallbacks
+    def test_process_response_gzip(self):
+        plainbody = b'<html><head><meta charset="gb2312"></head><body>' + b'x' * 1000 + b'</body></html>'
+        request = Request('http://scrapytest.org')
+        d = self.mw.process_response(request, self._gzip_response(plainbody), self.spider)
+        self.assertIsInstance(d, defer.Deferred)
+        newresponse = yield d
+        self.assertIsInstance(newresponse, HtmlResponse)
+        self.assertEqual(newresponse.body, plainbody)
+        # the body was already decoded in the thread pool
+        self.assertIsNotNone(newresponse._cached_ubody)
+        self.assertEqual(newresponse.encoding, resolve_encoding('gb2312'))
+        self.assertNotIn('Content-Encoding', newresponse.headers)
+
+    @defer.inlineCallbacks
+    def test_process_response_text(self):
+        request = Request('http://scrapytest.org')
+        response = HtmlResponse('http://scrapytest.org', body=b'<html></html>')
+        newresponse = yield self.mw.process_response(request, response, self.spider)
+        self.assertIs(newresponse, response)
+        self.assertIsNotNone(newresponse._cached_ubody)
+
+    def test_process_response_binary(self):
+        request = Request('http://scrapytest.org')
+        response = Response('http://scrapytest.org', body=b'\x00\x01')
+        self.assertIs(self.mw.process_response(request, response, self.spider), response)
+
+    @defer.inlineCallbacks
+    def test_max_size(self):
+        request = Request('http://scrapytest.org', meta={'download_maxsize': 1024})
+        response = self._gzip_response(b'\0' * 1024 * 1024)
+        with self.assertRaises(IgnoreRequest):
+            yield self.mw.process_response(request, response, self.spider)
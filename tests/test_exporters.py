@@ -15,7 +15,7 @@ from scrapy.utils.python import to_unicode
 from scrapy.exporters import (
     BaseItemExporter, PprintItemExporter, PickleItemExporter, CsvItemExporter,
     XmlItemExporter, JsonLinesItemExporter, JsonItemExporter,
-    PythonItemExporter, MarshalItemExporter
+    PythonItemExporter, MarshalItemExporter, ParquetItemExporter
 )
 
 
@@ -117,6 +117,22 @@ class BaseItemExporterTest(unittest.TestCase):
         self.assertEqual(ie.serialize_field(a.get_field_meta('name'), 'name', a['name']), 'John\xa3')
         self.assertEqual(ie.serialize_field(a.get_field_meta('age'), 'age', a['age']), '24')
 
+    def test_serializer_plan(self):
+        ie = self._get_exporter()
+        i = self.custom_field_item_class(name='John\xa3', age='22')
+        self.assertEqual(dict(ie._get_serialized_fields(i)), {'name': 'John\xa3', 'age': '24'})
+        self.assertEqual(dict(ie._get_serialized_fields({'age': '22'})), {'age': '22'})
+        self.assertEqual(dict(ie._get_serialized_fields(self.i)), {'name': 'John\xa3', 'age': '22'})
+
+    def test_serializer_plan_without_base_init(self):
+        class Exporter(BaseItemExporter):
+            def __init__(self):
+                self.fields_to_export = None
+                self.export_empty_fields = False
+
+        i = self.custom_field_item_class(name='John\xa3', age='22')
+        self.assertEqual(dict(Exporter()._get_serialized_fields(i)), {'name': 'John\xa3', 'age': '24'})
+
 
 class BaseItemExporterDataclassTest(BaseItemExporterTest):
     item_class = TestDataClass
@@ -266,6 +282,110 @@ class MarshalItemExporterDataclassTest(MarshalItemExporterTest):
     custom_field_item_class = CustomFieldDataclass
 
 
+class ParquetItemExporterTest(BaseItemExporterTest):
+
+    def setUp(self):
+        try:
+            import pyarrow.parquet
+        except ImportError:
+            raise unittest.SkipTest("no pyarrow")
+        self.pq = pyarrow.parquet
+        super().setUp()
+
+    def _get_exporter(self, **kwargs):
+        return ParquetItemExporter(self.output, **kwargs)
+
+    def _read(self):
+        return self.pq.ParquetFile(BytesIO(self.output.getvalue()))
+
+    def _check_output(self):
+        self._assert_expected_item(self._read().read().to_pylist()[0])
+
+    def test_row_groups(self):
+        self.ie = self._get_exporter(row_group_size=2)
+        self.ie.start_exporting()
+        for i in range(5):
+            self.ie.export_item({'number': i, 'name': None if i < 2 else str(i)})
+        self.ie.finish_exporting()
+        parquet_file = self._read()
+        self.assertEqual(parquet_file.metadata.num_row_groups, 3)
+        self.assertEqual(parquet_file.read().to_pylist(),
+                         [{'number': i, 'name': None if i < 2 else str(i)} for i in range(5)])
+
+    def test_missing_and_new_fields(self):
+        self.ie = self._get_exporter(row_group_size=2)
+        self.ie.start_exporting()
+        self.ie.export_item({'a': 1})
+        self.ie.export_item({'b': 2})
+        with self.assertWarns(UserWarning):
+            self.ie.export_item({'a': 3, 'c': 4})
+            self.ie.finish_exporting()
+        self.assertEqual(self._read().read().to_pylist(),
+                         [{'a': 1, 'b': None}, {'a': None, 'b': 2}, {'a': 3, 'b': None}])
+
+    def test_schema(self):
+        import pyarrow
+        schema = pyarrow.schema([('name', pyarrow.string()), ('age', pyarrow.int32())])
+        self.ie = self._get_exporter(schema=schema)
+        self.ie.start_exporting()
+        self.ie.finish_exporting()
+        parquet_file = self._read()
+        self.assertEqual(parquet_file.schema_arrow, schema)
+        self.assertEqual(parquet_file.metadata.num_rows, 0)
+
+    def test_empty(self):
+        self.ie.start_exporting()
+        self.ie.finish_exporting()
+        parquet_file = self._read()
+        self.assertEqual(parquet_file.metadata.num_rows, 0)
+        self.assertEqual(parquet_file.schema_arrow.names, [])
+
+    def test_type_cast(self):
+        self.ie = self._get_exporter(row_group_size=2)
+        self.ie.start_exporting()
+        self.ie.export_item({'number': 1, 'name': None})
+        self.ie.export_item({'number': 2, 'name': None})
+        self.ie.export_item({'number': 3, 'name': 3})
+        self.ie.finish_exporting()
+        self.assertEqual(self._read().read().to_pylist(),
+                         [{'number': 1, 'name': None}, {'number': 2, 'name': None},
+                          {'number': 3, 'name': '3'}])
+
+    def test_type_error(self):
+        self.ie = self._get_exporter(row_group_size=2)
+        self.ie.start_exporting()
+        self.ie.export_item({'number': 1})
+        self.ie.export_item({'number': 2})
+        self.ie.export_item({'number': 3})
+        with self.assertRaisesRegex(ValueError, "'number'"):
+            self.ie.export_item({'number': 4.5})
+        # the row group that could not be converted is not exported
+        self.ie.export_item({'number': 5})
+        self.ie.finish_exporting()
+        self.assertEqual(self._read().read().to_pylist(), [{'number': 1}, {'number': 2}, {'number': 5}])
+
+    def test_nonstring_types_item(self):
+        item = self._get_nonstring_types_item()
+        self.ie.start_exporting()
+        self.ie.export_item(item)
+        self.ie.finish_exporting()
+        self.assertEqual(self._read().read().to_pylist(), [item])
+
+    def test_nested_item(self):
+        i1 = self.item_class(name='Joseph', age='22')
+        i2 = dict(name='Maria', age=[i1])
+        self.ie.start_exporting()
+        self.ie.export_item(i2)
+        self.ie.finish_exporting()
+        self.assertEqual(self._read().read().to_pylist(),
+                         [{'name': 'Maria', 'age': [{'name': 'Joseph', 'age': '22'}]}])
+
+
+class ParquetItemExporterDataclassTest(ParquetItemExporterTest):
+    item_class = TestDataClass
+    custom_field_item_class = CustomFieldDataclass
+
+
 class CsvItemExporterTest(BaseItemExporterTest):
     def _get_exporter(self, **kwargs):
         return CsvItemExporter(self.output, **kwargs)
@@ -527,6 +647,57 @@ class JsonLinesItemExporterTest(BaseItemExporterTest):
         self.assertEqual(exported, item)
 
 
+class OrjsonJsonLinesItemExporterTest(JsonLinesItemExporterTest):
+
+    def setUp(self):
+        try:
+            import orjson  # noqa: F401
+        except ImportError:
+            raise unittest.SkipTest("no orjson")
+        super().setUp()
+
+    def _get_exporter(self, **kwargs):
+        kwargs.setdefault('encoding', 'utf-8')
+        return JsonLinesItemExporter(self.output, backend='orjson', **kwargs)
+
+    def test_ensure_ascii(self):
+        with self.assertWarns(UserWarning):
+            self.ie = JsonLinesItemExporter(self.output, backend='orjson')
+        self.assertIsNone(self.ie._orjson_option)
+        self.ie.export_item({'name': 'John\xa3'})
+        self.assertEqual(self.output.getvalue(), b'{"name": "John\\u00a3"}\n')
+
+    def test_extra_keywords(self):
+        self.ie = self._get_exporter(sort_keys=True)
+        self.assertIsNotNone(self.ie._orjson_option)
+        self.ie.export_item({'b': 1, 'a': 2})
+        self.assertEqual(self.output.getvalue(), b'{"a":2,"b":1}\n')
+        with self.assertWarns(UserWarning):
+            ie = self._get_exporter(separators=(',', ':'))
+        self.assertIsNone(ie._orjson_option)
+
+    def test_fallback(self):
+        self.ie.export_item({'big': 2 ** 70})
+        self.assertEqual(json.loads(self.output.getvalue()), {'big': 2 ** 70})
+
+    def test_non_finite_floats(self):
+        self.ie.export_item({'a': None, 'b': 1.5})
+        self.ie.export_item({'a': None, 'b': [float('nan'), float('inf'), -float('inf')]})
+        self.assertEqual(self.output.getvalue(),
+                         b'{"a":null,"b":1.5}\n{"a": null, "b": [NaN, Infinity, -Infinity]}\n')
+
+    def test_encoding(self):
+        self.ie = self._get_exporter(encoding='latin-1')
+        self.ie.export_item(self.i)
+        self.assertEqual(self.output.getvalue(), '{"name":"John\xa3","age":"22"}\n'.encode('latin-1'))
+
+
+class OrjsonJsonLinesItemExporterDataclassTest(OrjsonJsonLinesItemExporterTest):
+
+    item_class = TestDataClass
+    custom_field_item_class = CustomFieldDataclass
+
+
 class JsonLinesItemExporterDataclassTest(JsonLinesItemExporterTest):
 
     item_class = TestDataClass
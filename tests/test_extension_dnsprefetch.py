@@ -0,0 +1,149 @@
+from unittest import mock
+
+from twisted.internet import defer, protocol
+from twisted.internet.endpoints import HostnameEndpoint
+from twisted.internet.error import DNSLookupError
+from twisted.internet.task import deferLater
+from twisted.trial import unittest
+
+from scrapy.exceptions import NotConfigured
+from scrapy.extensions.dnsprefetch import DnsPrefetch
+from scrapy.http import Request
+from scrapy.resolver import CachingHostnameResolver, CachingThreadedResolver, dnscache
+from scrapy.spiders import Spider
+from scrapy.utils.test import get_crawler
+
+
+class DnsPrefetchTest(unittest.TestCase):
+
+    def setUp(self):
+        self.crawler = get_crawler(Spider, {
+            'DNS_PREFETCH_ENABLED': True,
+            'DNS_PREFETCH_CONCURRENCY': 2,
+        })
+        self.spider = self.crawler._create_spider('foo')
+        self.ext = DnsPrefetch.from_crawler(self.crawler)
+        self.ext.spider_opened(self.spider)
+        self.pending = {}
+        self.ports = {}
+
+    def _resolve(self, hostname, port):
+        d = defer.Deferred()
+        self.pending[hostname] = d
+        self.ports[hostname] = port
+        return d
+
+    def _schedule(self, *urls, **meta):
+        with mock.patch.object(self.ext, '_resolve', self._resolve):
+            for url in urls:
+                self.ext.request_scheduled(Request(url, meta=meta), self.spider)
+
+    def test_disabled(self):
+        crawler = get_crawler(Spider)
+        self.assertRaises(NotConfigured, DnsPrefetch.from_crawler, crawler)
+
+    def test_new_hostnames_only(self):
+        self._schedule('http://example.com/a', 'http://example.com/b',
+                       'https://example.com/c', 'http://127.0.0.1/',
+                       'http://[::1]/')
+        self.assertEqual(list(self.pending), ['example.com'])
+        self.assertEqual(self.ports, {'example.com': 80})
+        self.assertEqual(self.crawler.stats.get_value('dns_prefetch/count'), 1)
+
+    def test_port(self):
+        self._schedule('https://a.example/', 'http://b.example:8080/')
+        self.assertEqual(self.ports, {'a.example': 443, 'b.example': 8080})
+
+    def test_proxy(self):
+        self._schedule('http://example.com/', proxy='http://proxy:8080')
+        self.assertEqual(self.pending, {})
+
+    def test_concurrency(self):
+        self._schedule('http://a.example/', 'http://b.example/', 'http://c.example/')
+        self.assertEqual(list(self.pending), ['a.example', 'b.example'])
+        with mock.patch.object(self.ext, '_resolve', self._resolve):
+            self.pending['a.example'].callback('10.0.0.1')
+            self.assertEqual(list(self.pending), ['a.example', 'b.example', 'c.example'])
+            self.pending['b.example'].errback(DNSLookupError('b.example'))
+        self.assertEqual(self.crawler.stats.get_value('dns_prefetch/count'), 3)
+        self.assertEqual(self.crawler.stats.get_value('dns_prefetch/failed'), 1)
+
+    def test_spider_closed(self):
+        self._schedule('http://a.example/', 'http://b.example/', 'http://c.example/')
+        self.ext.spider_closed(self.spider)
+        with mock.patch.object(self.ext, '_resolve', self._resolve):
+            self.pending['a.example'].callback('10.0.0.1')
+        self.assertEqual(list(self.pending), ['a.example', 'b.example'])
+
+
+class CachingHostnameResolverPrefetchTest(unittest.TestCase):
+    """Prefetching through a real CachingHostnameResolver must not leave
+    addresses with the wrong port in the DNS cache"""
+
+    def setUp(self):
+        from twisted.internet import reactor
+        self.reactor = reactor
+        self.resolver = reactor.resolver
+        self.name_resolver = reactor.nameResolver
+        self.cache_limit = dnscache.limit
+        dnscache.pop('localhost', None)
+        CachingHostnameResolver(reactor, 100).install_on_reactor()
+        self.crawler = get_crawler(Spider, {'DNS_PREFETCH_ENABLED': True})
+        self.spider = self.crawler._create_spider('foo')
+        self.ext = DnsPrefetch.from_crawler(self.crawler)
+        self.ext.spider_opened(self.spider)
+
+    def tearDown(self):
+        self.reactor.installNameResolver(self.name_resolver)
+        self.reactor.resolver = self.resolver
+        dnscache.limit = self.cache_limit
+        dnscache.pop('localhost', None)
+
+    @defer.inlineCallbacks
+    def test_connect_after_prefetch(self):
+        factory = protocol.Factory.forProtocol(protocol.Protocol)
+        port = self.reactor.listenTCP(0, factory, interface='127.0.0.1')
+        self.addCleanup(port.stopListening)
+        port_number = port.getHost().port
+
+        self.ext.request_scheduled(Request(f'http://localhost:{port_number}/'), self.spider)
+        while self.ext.active:
+            yield deferLater(self.reactor, 0.01, lambda: None)
+        self.assertEqual(self.crawler.stats.get_value('dns_prefetch/failed'), None)
+        self.assertIn('localhost', dnscache)
+
+        endpoint = HostnameEndpoint(self.reactor, 'localhost', port_number)
+        client = yield endpoint.connect(protocol.Factory.forProtocol(protocol.Protocol))
+        self.assertEqual(client.transport.getPeer().port, port_number)
+        client.transport.loseConnection()
+
+
+class CachingThreadedResolverPrefetchTest(unittest.TestCase):
+    """The default resolver is reached through reactor.nameResolver too"""
+
+    def setUp(self):
+        from twisted.internet import reactor
+        self.reactor = reactor
+        self.resolver = reactor.resolver
+        self.name_resolver = reactor.nameResolver
+        self.cache_limit = dnscache.limit
+        dnscache.pop('localhost', None)
+        CachingThreadedResolver(reactor, 100, 60).install_on_reactor()
+        self.crawler = get_crawler(Spider, {'DNS_PREFETCH_ENABLED': True})
+        self.spider = self.crawler._create_spider('foo')
+        self.ext = DnsPrefetch.from_crawler(self.crawler)
+        self.ext.spider_opened(self.spider)
+
+    def tearDown(self):
+        self.reactor.installNameResolver(self.name_resolver)
+        self.reactor.resolver = self.resolver
+        dnscache.limit = self.cache_limit
+        dnscache.pop('localhost', None)
+
+    @defer.inlineCallbacks
+    def test_prefetch(self):
+        self.ext.request_scheduled(Request('http://localhost/'), self.spider)
+        while self.ext.active:
+            yield deferLater(self.reactor, 0.01, lambda: None)
+        self.assertEqual(self.crawler.stats.get_value('dns_prefetch/failed'), None)
+        self.assertIn('localhost', dnscache)
@@ -5,6 +5,7 @@ import random
 import shutil
 import string
 import tempfile
+import threading
 import warnings
 from abc import ABC, abstractmethod
 from collections import defaultdict
@@ -19,13 +20,15 @@ from urllib.request import pathname2url
 
 import lxml.etree
 from testfixtures import LogCapture
-from twisted.internet import defer
+from twisted.internet import defer, reactor
+from twisted.internet.task import deferLater
 from twisted.trial import unittest
 from w3lib.url import file_uri_to_path, path_to_file_uri
 from zope.interface import implementer
 from zope.interface.verify import verifyObject
 
 import scrapy
+from scrapy.core.scraper import Slot
 from scrapy.crawler import CrawlerRunner
 from scrapy.exceptions import NotConfigured, ScrapyDeprecationWarning
 from scrapy.exporters import CsvItemExporter
@@ -38,6 +41,7 @@ from scrapy.extensions.feedexport import (
     IFeedStorage,
     S3FeedStorage,
     StdoutFeedStorage,
+    _S3MultipartUpload,
 )
 from scrapy.settings import Settings
 from scrapy.utils.python import to_unicode
@@ -47,7 +51,7 @@ from scrapy.utils.test import (
     skip_if_no_boto,
 )
 
-from tests.mockserver import MockFTPServer, MockServer
+from tests.mockserver import MockFTPServer, MockS3Server, MockServer
 from tests.spiders import ItemSpider
 
 
@@ -412,6 +416,110 @@ class S3FeedStorageTest(unittest.TestCase):
             )
         self.assertIn('S3 does not support appending to files', str(log))
 
+    def get_streaming_storage(self, s3, part_size):
+        crawler = get_crawler(settings_dict={
+            'AWS_ACCESS_KEY_ID': 'access_key',
+            'AWS_SECRET_ACCESS_KEY': 'secret_key',
+            'AWS_ENDPOINT_URL': s3.endpoint_url,
+            'FEED_EXPORT_ASYNC': True,
+            'FEED_STORAGE_S3_PART_SIZE': part_size,
+        })
+        return S3FeedStorage.from_crawler(crawler, 's3://mybucket/export.csv')
+
+    def test_streaming_requires_async(self):
+        skip_if_no_boto()
+        crawler = get_crawler(settings_dict={'FEED_STORAGE_S3_PART_SIZE': 1})
+        with LogCapture() as log:
+            storage = S3FeedStorage.from_crawler(crawler, 's3://mybucket/export.csv')
+        self.assertEqual(storage.part_size, 0)
+        self.assertIn('FEED_STORAGE_S3_PART_SIZE requires FEED_EXPORT_ASYNC', str(log))
+
+    def test_multipart_part_size_growth(self):
+        upload = _S3MultipartUpload(mock.Mock(), 'mybucket', 'export.csv', None, 2)
+        part_sizes = []
+        with mock.patch.object(upload, 'part_size_growth_interval', 2), \
+                mock.patch.object(upload, 'max_parts', 6), \
+                mock.patch.object(upload, '_upload_part', lambda data: part_sizes.append(len(data))):
+            upload.write(b'0' * 14)
+            with self.assertRaisesRegex(ValueError, 'FEED_STORAGE_S3_PART_SIZE'):
+                upload.write(b'0' * 16)
+        upload._executor.shutdown()
+        self.assertEqual(part_sizes, [2, 2, 4, 4, 8])
+
+    @defer.inlineCallbacks
+    def test_store_multipart(self):
+        skip_if_no_boto()
+        with MockS3Server() as s3:
+            storage = self.get_streaming_storage(s3, 1)
+            self.assertEqual(storage.part_size, 5 * 1024 * 1024)
+            file = storage.open(scrapy.Spider('default'))
+            data = os.urandom(1024 * 1024)
+            for _ in range(12):
+                file.write(data)
+            self.assertEqual(file.tell(), 12 * len(data))
+            yield storage.store(file)
+            self.assertEqual(s3.objects[('mybucket', 'export.csv')], data * 12)
+            self.assertEqual(s3.uploads, {})
+            self.assertEqual(
+                [(method, query) for method, path, query in s3.requests],
+                [
+                    ('POST', ['uploads']),
+                    ('PUT', ['partNumber', 'uploadId']),
+                    ('PUT', ['partNumber', 'uploadId']),
+                    ('PUT', ['partNumber', 'uploadId']),
+                    ('POST', ['uploadId']),
+                ]
+            )
+
+    @defer.inlineCallbacks
+    def test_store_multipart_small_feed(self):
+        skip_if_no_boto()
+        with MockS3Server() as s3:
+            storage = self.get_streaming_storage(s3, 1)
+            file = storage.open(scrapy.Spider('default'))
+            file.write(b'small feed')
+            yield storage.store(file)
+            self.assertEqual(s3.objects[('mybucket', 'export.csv')], b'small feed')
+            self.assertEqual([method for method, path, query in s3.requests], ['PUT'])
+
+    @defer.inlineCallbacks
+    def test_store_multipart_abort(self):
+        skip_if_no_boto()
+        with MockS3Server() as s3:
+            storage = self.get_streaming_storage(s3, 1)
+            file = storage.open(scrapy.Spider('default'))
+            file.write(b'0' * storage.part_size)
+            with mock.patch.object(storage.s3_client, 'complete_multipart_upload',
+                                   side_effect=ValueError('failed')):
+                yield self.assertFailure(storage.store(file), ValueError)
+            self.assertEqual(s3.objects, {})
+            self.assertEqual(s3.uploads, {})
+            self.assertEqual(s3.requests[-1][0], 'DELETE')
+
+    @defer.inlineCallbacks
+    def test_feed_export_multipart(self):
+        skip_if_no_boto()
+        with MockS3Server() as s3:
+            settings = {
+                'AWS_ACCESS_KEY_ID': 'access_key',
+                'AWS_SECRET_ACCESS_KEY': 'secret_key',
+                'AWS_ENDPOINT_URL': s3.endpoint_url,
+                'FEED_EXPORT_ASYNC': True,
+                'FEED_STORAGE_S3_PART_SIZE': 1,
+                'FEEDS': {'s3://mybucket/export.jl': {'format': 'jsonlines'}},
+            }
+            crawler = get_crawler(settings_dict=settings)
+            spider = scrapy.Spider('default')
+            exporter = FeedExporter.from_crawler(crawler)
+            exporter.open_spider(spider)
+            items = [{'foo': 'x' * 1024, 'egg': i} for i in range(6 * 1024)]
+            for item in items:
+                yield exporter.item_scraped(item, spider)
+            yield exporter.close_spider(spider)
+            stored = s3.objects[('mybucket', 'export.jl')]
+            self.assertEqual([json.loads(line) for line in stored.splitlines()], items)
+            self.assertEqual(s3.requests[0][2], ['uploads'])
+
 
 class GCSFeedStorageTest(unittest.TestCase):
 
@@ -469,6 +577,33 @@ class GCSFeedStorageTest(unittest.TestCase):
             bucket_mock.blob.assert_called_once_with('export.csv')
             blob_mock.upload_from_file.assert_called_once_with(f, predefined_acl=acl)
 
+    @defer.inlineCallbacks
+    def test_store_streaming(self):
+        storage = GCSFeedStorage('gs://mybucket/export.csv', 'myproject-123', 'publicRead', 1)
+        blob_mock = mock.Mock()
+        writer = blob_mock.open.return_value
+        with mock.patch.object(storage, '_get_blob', return_value=blob_mock):
+            file = storage.open(scrapy.Spider('default'))
+            self.assertEqual(file.part_size, 256 * 1024)
+            file.write(b'a' * 300 * 1024)
+            yield storage.store(file)
+        blob_mock.open.assert_called_once_with('wb', chunk_size=256 * 1024, predefined_acl='publicRead')
+        self.assertEqual(writer.write.call_args_list,
+                         [mock.call(b'a' * 256 * 1024), mock.call(b'a' * 44 * 1024)])
+        writer.close.assert_called_once_with()
+        blob_mock.upload_from_string.assert_not_called()
+
+    @defer.inlineCallbacks
+    def test_store_streaming_small_feed(self):
+        storage = GCSFeedStorage('gs://mybucket/export.csv', 'myproject-123', None, 1)
+        blob_mock = mock.Mock()
+        with mock.patch.object(storage, '_get_blob', return_value=blob_mock):
+            file = storage.open(scrapy.Spider('default'))
+            file.write(b'small feed')
+            yield storage.store(file)
+        blob_mock.open.assert_not_called()
+        blob_mock.upload_from_string.assert_called_once_with(b'small feed', predefined_acl=None)
+
 
 class StdoutFeedStorageTest(unittest.TestCase):
 
@@ -1596,6 +1731,25 @@ class BatchDeliveriesTest(FeedExportTestBase):
             for expected_batch, got_batch in zip(expected, data[fmt]):
                 self.assertEqual(expected_batch, got_batch)
 
+    @defer.inlineCallbacks
+    def test_batch_item_count_parquet(self):
+        try:
+            import pyarrow.parquet as pq
+        except ImportError:
+            raise unittest.SkipTest("no pyarrow")
+        items = [{'foo': f'FOO{i}'} for i in range(5)]
+        settings = {
+            'FEEDS': {
+                os.path.join(self._random_temp_filename(), 'parquet', self._file_mark): {
+                    'format': 'parquet',
+                    'batch_item_count': 2,
+                },
+            },
+        }
+        data = yield self.exported_data(items, settings)
+        got = [pq.read_table(BytesIO(batch)).to_pylist() for batch in data['parquet']]
+        self.assertEqual(got, [items[0:2], items[2:4], items[4:]])
+
     @defer.inlineCallbacks
     def test_batch_path_differ(self):
         """
@@ -1702,6 +1856,219 @@ class BatchDeliveriesTest(FeedExportTestBase):
             stub.assert_no_pending_responses()
 
 
+class AsyncFeedExportTest(FeedExportTest):
+
+    def run_and_export(self, spider_cls, settings):
+        settings['FEED_EXPORT_ASYNC'] = True
+        return super().run_and_export(spider_cls, settings)
+
+
+class AsyncBatchDeliveriesTest(BatchDeliveriesTest):
+
+    def run_and_export(self, spider_cls, settings):
+        settings['FEED_EXPORT_ASYNC'] = True
+        return super().run_and_export(spider_cls, settings)
+
+
+class FeedWriterTest(unittest.TestCase):
+
+    @defer.inlineCallbacks
+    def test_backpressure(self):
+        settings = {
+            'FEEDS': {path_to_file_uri(tempfile.mktemp()): {'format': 'jl'}},
+            'FEED_EXPORT_ASYNC': True,
+            'FEED_EXPORT_QUEUE_SIZE': 2,
+        }
+        crawler = get_crawler(settings_dict=settings)
+        crawler.engine = mock.Mock()
+        crawler.engine.scraper.slot = Slot()
+        spider = scrapy.Spider('default')
+        exporter = FeedExporter.from_crawler(crawler)
+        exporter.open_spider(spider)
+        writer = exporter.writers[list(exporter.feeds)[0]]
+        slot = crawler.engine.scraper.slot
+        self.assertFalse(slot.needs_backout())
+
+        # keep the writer busy until the queue is full
+        release = threading.Event()
+        writer.call(release.wait)
+        while not writer.queue.empty():
+            yield deferLater(reactor, 0.01, lambda: None)
+        self.assertIsNone(exporter.item_scraped({'foo': 'bar'}, spider))
+        self.assertIsNone(exporter.item_scraped({'foo': 'baz'}, spider))
+        self.assertTrue(slot.needs_backout())
+        # items that do not fit in the queue wait without blocking the reactor
+        d = exporter.item_scraped({'foo': 'qux'}, spider)
+        self.assertFalse(d.called)
+        self.assertEqual(len(writer.overflow), 1)
+        release.set()
+        yield d
+        yield exporter.close_spider(spider)
+        self.assertFalse(slot.needs_backout())
+        path = file_uri_to_path(list(exporter.feeds)[0])
+        with open(path, 'rb') as f:
+            self.assertEqual([json.loads(line) for line in f],
+                             [{'foo': 'bar'}, {'foo': 'baz'}, {'foo': 'qux'}])
+        os.remove(path)
+
+
+class BatchRotationTest(unittest.TestCase):
+
+    def setUp(self):
+        self.temp_dir = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.temp_dir, ignore_errors=True)
+
+    def get_exporter(self, feed_options, settings=None):
+        uri = build_url(os.path.join(self.temp_dir, '%(batch_id)02d.jl'))
+        settings = dict(settings or {})
+        settings['FEEDS'] = {uri: dict(feed_options, format='jl')}
+        crawler = get_crawler(settings_dict=settings)
+        self.spider = scrapy.Spider('default')
+        exporter = FeedExporter.from_crawler(crawler)
+        exporter.open_spider(self.spider)
+        return exporter
+
+    def read_batches(self):
+        batches = []
+        for name in sorted(os.listdir(self.temp_dir)):
+            with open(os.path.join(self.temp_dir, name), 'rb') as f:
+                batches.append([json.loads(line) for line in f])
+        return batches
+
+    @defer.inlineCallbacks
+    def test_batch_max_size(self):
+        exporter = self.get_exporter({'batch_max_size': 30})
+        items = [{'foo': f'FOO{i}'} for i in range(5)]  # 16 bytes each
+        for item in items:
+            exporter.item_scraped(item, self.spider)
+        yield exporter.close_spider(self.spider)
+        self.assertEqual(self.read_batches(), [items[0:2], items[2:4], items[4:]])
+        stats = exporter.crawler.stats
+        self.assertEqual(stats.get_value('feedexport/batch_rotations/max_size'), 2)
+        self.assertEqual(stats.get_value('feedexport/batches'), 3)
+        self.assertIsNotNone(stats.get_value('feedexport/batch_open_time_max'))
+        self.assertIsNotNone(stats.get_value('feedexport/batch_store_time_max'))
+
+    @defer.inlineCallbacks
+    def test_batch_max_size_setting(self):
+        exporter = self.get_exporter({}, {'FEED_EXPORT_BATCH_MAX_SIZE': 1})
+        items = [{'foo': f'FOO{i}'} for i in range(3)]
+        for item in items:
+            exporter.item_scraped(item, self.spider)
+        yield exporter.close_spider(self.spider)
+        # as with batch_item_count, the file of the last batch is created empty
+        self.assertEqual(self.read_batches(), [[item] for item in items] + [[]])
+
+    @defer.inlineCallbacks
+    def test_batch_interval(self):
+        exporter = self.get_exporter({'batch_interval': 0.1})
+        exporter.item_scraped({'foo': 'FOO0'}, self.spider)
+        exporter.item_scraped({'foo': 'FOO1'}, self.spider)
+        yield deferLater(reactor, 0.15, lambda: None)
+        # an empty batch is not rotated
+        yield deferLater(reactor, 0.15, lambda: None)
+        exporter.item_scraped({'foo': 'FOO2'}, self.spider)
+        yield exporter.close_spider(self.spider)
+        self.assertEqual(self.read_batches(), [[{'foo': 'FOO0'}, {'foo': 'FOO1'}], [{'foo': 'FOO2'}]])
+        stats = exporter.crawler.stats
+        self.assertEqual(stats.get_value('feedexport/batch_rotations/interval'), 1)
+        self.assertEqual(exporter.slots[0].batch_id, 2)
+        self.assertFalse(exporter.slots[0].rotation_call.active())
+
+    def test_uri_without_batch_placeholder(self):
+        for feed_options in ({'batch_max_size': 10}, {'batch_interval': 60}):
+            settings = {'FEEDS': {'file:///tmp/items.jl': dict(feed_options, format='jl')}}
+            crawler = get_crawler(settings_dict=settings)
+            with self.assertRaises(NotConfigured):
+                FeedExporter.from_crawler(crawler)
+
+
+class FeedCompressionTest(unittest.TestCase):
+
+    items = [{'foo': f'bar{i}', 'egg': i} for i in range(100)]
+
+    def setUp(self):
+        self.temp_dir = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.temp_dir, ignore_errors=True)
+
+    def decompress(self, compression, data):
+        if compression == 'zstd':
+            try:
+                import zstandard
+            except ImportError:
+                raise unittest.SkipTest("no zstandard")
+            return zstandard.ZstdDecompressor().stream_reader(BytesIO(data)).read()
+        import bz2
+        import gzip
+        import lzma
+        return {'gzip': gzip, 'bz2': bz2, 'xz': lzma}[compression].decompress(data)
+
+    @defer.inlineCallbacks
+    def export(self, items, feed_options, settings=None):
+        path = os.path.join(self.temp_dir, 'items')
+        settings = dict(settings or {})
+        settings['FEEDS'] = {path_to_file_uri(path): dict(feed_options, overwrite=True)}
+        crawler = get_crawler(settings_dict=settings)
+        spider = scrapy.Spider('default')
+        exporter = FeedExporter.from_crawler(crawler)
+        exporter.open_spider(spider)
+        for item in items:
+            exporter.item_scraped(item, spider)
+        yield exporter.close_spider(spider)
+        with open(path, 'rb') as f:
+            return f.read()
+
+    @defer.inlineCallbacks
+    def test_jsonlines(self):
+        for compression in ('gzip', 'bz2', 'xz', 'zstd'):
+            for level in (None, 1):
+                data = yield self.export(self.items, {
+                    'format': 'jsonlines', 'compression': compression, 'compression_level': level,
+                })
+                data = self.decompress(compression, data)
+                self.assertEqual([json.loads(line) for line in data.splitlines()], self.items)
+
+    @defer.inlineCallbacks
+    def test_csv(self):
+        data = yield self.export(self.items, {'format': 'csv', 'compression': 'gzip'})
+        rows = list(csv.DictReader(to_unicode(self.decompress('gzip', data)).splitlines()))
+        self.assertEqual(rows, [{'foo': item['foo'], 'egg': str(item['egg'])} for item in self.items])
+
+    @defer.inlineCallbacks
+    def test_parquet(self):
+        try:
+            import pyarrow.parquet as pq
+        except ImportError:
+            raise unittest.SkipTest("no pyarrow")
+        data = yield self.export(self.items, {'format': 'parquet', 'compression': 'gzip'})
+        table = pq.read_table(BytesIO(self.decompress('gzip', data)))
+        self.assertEqual(table.to_pylist(), self.items)
+
+    @defer.inlineCallbacks
+    def test_async(self):
+        data = yield self.export(self.items, {'format': 'jsonlines', 'compression': 'xz'},
+                                 {'FEED_EXPORT_ASYNC': True})
+        data = self.decompress('xz', data)
+        self.assertEqual([json.loads(line) for line in data.splitlines()], self.items)
+
+    @defer.inlineCallbacks
+    def test_no_items(self):
+        data = yield self.export([], {'format': 'jsonlines', 'compression': 'gzip'})
+        self.assertEqual(self.decompress('gzip', data), b'')
+
+    def test_unknown_compression(self):
+        settings = {'FEEDS': {'file:///tmp/items.jl': {'format': 'jl', 'compression': 'rar'}}}
+        crawler = get_crawler(settings_dict=settings)
+        with LogCapture() as log:
+            with self.assertRaises(NotConfigured):
+                FeedExporter.from_crawler(crawler)
+        self.assertIn('Unknown feed compression: rar', str(log))
+
+
 class FeedExportInitTest(unittest.TestCase):
 
     def test_unsupported_storage(self):
@@ -1,4 +1,6 @@
 import asyncio
+import os
+import threading
 
 from pytest import mark
 from twisted.internet import defer
@@ -6,6 +8,8 @@ from twisted.internet.defer import Deferred
 from twisted.trial import unittest
 
 from scrapy import Spider, signals, Request
+from scrapy.exceptions import DropItem
+from scrapy.pipelines import ItemBatch, ItemPipelineManager
 from scrapy.utils.test import get_crawler, get_from_asyncio_queue
 
 from tests.mockserver import MockServer
@@ -43,6 +47,95 @@ class AsyncDefAsyncioPipeline:
         return item
 
 
+class BatchPipeline:
+    def __init__(self):
+        self.batches = []
+
+    def process_items(self, items, spider):
+        self.batches.append([item['field'] for item in items])
+        for item in items:
+            item['pipeline_passed'] = True
+        return items
+
+
+class DropOddBatchPipeline(BatchPipeline):
+    def process_items(self, items, spider):
+        items = super().process_items(items, spider)
+        return [DropItem('odd') if item['field'] % 2 else item for item in items]
+
+
+class FailingBatchPipeline(BatchPipeline):
+    def process_items(self, items, spider):
+        raise ValueError('batch failed')
+
+
+class AsyncDefBatchPipeline(BatchPipeline):
+    batch_size = 3
+
+    async def process_items(self, items, spider):
+        await defer.succeed(42)
+        return super().process_items(items, spider)
+
+
+class ThreadOffloadPipeline:
+    offload = 'thread'
+
+    def process_item(self, item, spider):
+        item['thread'] = threading.current_thread().name
+        item['spider'] = spider.name
+        return item
+
+
+class ProcessOffloadPipeline:
+    offload = 'process'
+
+    def process_item(self, item, spider):
+        if item['field'] == 5:
+            raise DropItem('five')
+        item['pid'] = os.getpid()
+        item['spider'] = spider
+        return item
+
+
+class ClosingOffloadPipeline:
+    """Records the processes and threads in which close_spider is called"""
+
+    offload = 'process'
+
+    @classmethod
+    def from_crawler(cls, crawler):
+        pipe = cls()
+        pipe.directory = crawler.settings['CLOSED_PIPELINES_DIR']
+        return pipe
+
+    def process_item(self, item, spider):
+        item['pid'] = os.getpid()
+        return item
+
+    def close_spider(self, spider):
+        name = f'{os.getpid()}-{threading.get_ident()}'
+        with open(os.path.join(self.directory, name), 'w') as f:
+            f.write(str(spider is None))
+
+
+class ClosingThreadOffloadPipeline(ClosingOffloadPipeline):
+    offload = 'thread'
+
+
+class ProcessOffloadBatchPipeline(BatchPipeline):
+    offload = 'process'
+
+    def process_items(self, items, spider):
+        return [dict(item, pid=os.getpid()) for item in items]
+
+
+class AsyncDefOffloadPipeline:
+    offload = 'thread'
+
+    async def process_item(self, item, spider):
+        return item
+
+
 class ItemSpider(Spider):
     name = 'itemspider'
 
@@ -99,3 +192,182 @@ class PipelineTestCase(unittest.TestCase):
         crawler = self._create_crawler(AsyncDefAsyncioPipeline)
         yield crawler.crawl(mockserver=self.mockserver)
         self.assertEqual(len(self.items), 1)
+
+
+class ManyItemsSpider(ItemSpider):
+    name = 'manyitemsspider'
+
+    def parse(self, response):
+        for i in range(10):
+            yield {'field': i}
+
+
+class CrawlTestCase(unittest.TestCase):
+    def setUp(self):
+        self.mockserver = MockServer()
+        self.mockserver.__enter__()
+
+    def tearDown(self):
+        self.mockserver.__exit__(None, None, None)
+
+    def _create_crawler(self, pipeline_class, settings=None):
+        settings = dict(settings or {}, ITEM_PIPELINES={pipeline_class: 1},
+                        ITEM_PIPELINE_BATCH_SIZE=4, ITEM_PIPELINE_BATCH_MAX_LINGER=0.1)
+        crawler = get_crawler(ManyItemsSpider, settings)
+        self.items = []
+        self.dropped = []
+        self.errors = []
+        crawler.signals.connect(lambda item: self.items.append(item), signals.item_scraped, weak=False)
+        crawler.signals.connect(lambda item: self.dropped.append(item), signals.item_dropped, weak=False)
+        crawler.signals.connect(lambda item, failure: self.errors.append(failure),
+                                signals.item_error, weak=False)
+        return crawler
+
+    def _get_pipeline(self, crawler):
+        return crawler.engine.scraper.itemproc.middlewares[0]
+
+    @defer.inlineCallbacks
+    def _crawl(self, crawler):
+        pipelines = []
+        crawler.signals.connect(lambda: pipelines.append(self._get_pipeline(crawler)),
+                                signals.engine_started, weak=False)
+        yield crawler.crawl(mockserver=self.mockserver)
+        return pipelines[0]
+
+
+class BatchPipelineTestCase(CrawlTestCase):
+
+    @defer.inlineCallbacks
+    def test_batches(self):
+        crawler = self._create_crawler(BatchPipeline)
+        pipeline = yield self._crawl(crawler)
+        # the last batch is sent after batch_max_linger
+        self.assertEqual(pipeline.batches, [[0, 1, 2, 3], [4, 5, 6, 7], [8, 9]])
+        self.assertEqual([item['field'] for item in self.items], list(range(10)))
+        self.assertTrue(all(item['pipeline_passed'] for item in self.items))
+
+    @defer.inlineCallbacks
+    def test_asyncdef_pipeline_batch_size(self):
+        crawler = self._create_crawler(AsyncDefBatchPipeline)
+        pipeline = yield self._crawl(crawler)
+        self.assertEqual(pipeline.batches, [[0, 1, 2], [3, 4, 5], [6, 7, 8], [9]])
+        self.assertEqual(len(self.items), 10)
+
+    @defer.inlineCallbacks
+    def test_drop_items(self):
+        crawler = self._create_crawler(DropOddBatchPipeline)
+        yield self._crawl(crawler)
+        self.assertEqual([item['field'] for item in self.items], [0, 2, 4, 6, 8])
+        self.assertEqual([item['field'] for item in self.dropped], [1, 3, 5, 7, 9])
+
+    @defer.inlineCallbacks
+    def test_failing_batch(self):
+        crawler = self._create_crawler(FailingBatchPipeline)
+        yield self._crawl(crawler)
+        self.assertEqual(self.items, [])
+        self.assertEqual(len(self.errors), 10)
+        self.assertTrue(all(failure.check(ValueError) for failure in self.errors))
+
+
+class ItemBatchTestCase(unittest.TestCase):
+
+    def test_size(self):
+        batches = []
+        batch = ItemBatch(lambda items, spider: batches.append(items) or items, 2, 60)
+        d1 = batch.add(1, None)
+        self.assertEqual(batches, [])
+        self.assertEqual(len(batch), 1)
+        d2 = batch.add(2, None)
+        self.assertEqual(batches, [[1, 2]])
+        self.assertEqual(len(batch), 0)
+        self.assertEqual(self.successResultOf(d1), 1)
+        self.assertEqual(self.successResultOf(d2), 2)
+        self.assertIsNone(batch.flush_call)
+
+    def test_flush(self):
+        batch = ItemBatch(lambda items, spider: [item * 2 for item in items], 10, 60)
+        d = batch.add(1, None)
+        self.assertNoResult(d)
+        batch.flush()
+        self.assertEqual(self.successResultOf(d), 2)
+
+    def test_wrong_result_count(self):
+        batch = ItemBatch(lambda items, spider: items[:1], 2, 60)
+        d1 = batch.add(1, None)
+        d2 = batch.add(2, None)
+        self.failureResultOf(d1, ValueError)
+        self.failureResultOf(d2, ValueError)
+
+
+class OffloadPipelineTestCase(CrawlTestCase):
+
+    # items finish in the order in which the workers complete them
+
+    @defer.inlineCallbacks
+    def test_thread(self):
+        crawler = self._create_crawler(ThreadOffloadPipeline)
+        yield self._crawl(crawler)
+        self.assertEqual(sorted(item['field'] for item in self.items), list(range(10)))
+        self.assertTrue(all(item['thread'].startswith('item-pipeline') for item in self.items))
+        self.assertTrue(all(item['spider'] == 'manyitemsspider' for item in self.items))
+
+    @defer.inlineCallbacks
+    def test_process(self):
+        crawler = self._create_crawler(ProcessOffloadPipeline, {'ITEM_PIPELINE_OFFLOAD_WORKERS': 2})
+        yield self._crawl(crawler)
+        self.assertEqual(sorted(item['field'] for item in self.items), [0, 1, 2, 3, 4, 6, 7, 8, 9])
+        self.assertEqual([item['field'] for item in self.dropped], [5])
+        pids = {item['pid'] for item in self.items}
+        self.assertNotIn(os.getpid(), pids)
+        self.assertLessEqual(len(pids), 2)
+        # spiders are not sent to worker processes
+        self.assertTrue(all(item['spider'] is None for item in self.items))
+
+    @defer.inlineCallbacks
+    def test_process_batches(self):
+        crawler = self._create_crawler(ProcessOffloadBatchPipeline)
+        yield self._crawl(crawler)
+        self.assertEqual(sorted(item['field'] for item in self.items), list(range(10)))
+        self.assertNotIn(os.getpid(), {item['pid'] for item in self.items})
+
+    def _closed_pipelines(self, directory):
+        closed = {}
+        for name in os.listdir(directory):
+            pid, thread = name.split('-')
+            with open(os.path.join(directory, name)) as f:
+                closed[int(pid), int(thread)] = f.read() == 'True'
+        return closed
+
+    @defer.inlineCallbacks
+    def test_process_close_spider(self):
+        directory = self.mktemp()
+        os.mkdir(directory)
+        crawler = self._create_crawler(ClosingOffloadPipeline, {
+            'ITEM_PIPELINE_OFFLOAD_WORKERS': 2, 'CLOSED_PIPELINES_DIR': directory})
+        yield self._crawl(crawler)
+        closed = self._closed_pipelines(directory)
+        # each worker closes its copy, without a spider, and the main
+        # process closes the original pipeline
+        pids = {pid for pid, _ in closed}
+        self.assertIn(os.getpid(), pids)
+        self.assertLessEqual({item['pid'] for item in self.items}, pids)
+        self.assertEqual(len(pids), len(closed))
+        self.assertEqual({pid for (pid, _), no_spider in closed.items() if not no_spider}, {os.getpid()})
+
+    @defer.inlineCallbacks
+    def test_thread_close_spider(self):
+        directory = self.mktemp()
+        os.mkdir(directory)
+        crawler = self._create_crawler(ClosingThreadOffloadPipeline, {'CLOSED_PIPELINES_DIR': directory})
+        yield self._crawl(crawler)
+        # thread pool workers share the pipeline, closed once in the reactor thread
+        self.assertEqual(self._closed_pipelines(directory),
+                         {(os.getpid(), threading.get_ident()): False})
+
+    def test_coroutine(self):
+        self.assertRaises(TypeError, ItemPipelineManager, AsyncDefOffloadPipeline())
+
+    def test_unknown_offload(self):
+        pipeline = ThreadOffloadPipeline()
+        pipeline.offload = 'gpu'
+        self.assertRaises(ValueError, ItemPipelineManager, pipeline)
@@ -0,0 +1,151 @@
+from unittest import mock
+
+from twisted.internet import defer, reactor
+from twisted.internet.error import DNSLookupError
+from twisted.names import dns, error
+from twisted.names.server import DNSServerFactory
+from twisted.trial import unittest
+
+from scrapy.resolver import CachingAsyncResolver
+from scrapy.utils.test import get_crawler
+
+
+class StubDNSResolver:
+    """
+    Implements twisted.internet.interfaces.IResolver partially, answering
+    from a fixed set of records and counting the queries it receives.
+    """
+
+    records = {
+        b'example.com': [dns.RRHeader(b'example.com', ttl=300,
+                                      payload=dns.Record_A('10.0.0.1'))],
+        b'alias.example.com': [
+            dns.RRHeader(b'alias.example.com', type=dns.CNAME, ttl=30,
+                         payload=dns.Record_CNAME(b'example.com')),
+            dns.RRHeader(b'example.com', ttl=300,
+                         payload=dns.Record_A('10.0.0.1')),
+        ],
+        b'noncached.example.com': [
+            dns.RRHeader(b'noncached.example.com', ttl=0,
+                         payload=dns.Record_A('10.0.0.2'))],
+    }
+
+    def __init__(self):
+        self.queries = []
+
+    def query(self, query, timeout=None):
+        self.queries.append(query.name.name)
+        if query.type == dns.A and query.name.name in self.records:
+            return defer.succeed((self.records[query.name.name], [], []))
+        return defer.fail(error.DomainError())
+
+
+class CachingAsyncResolverTest(unittest.TestCase):
+
+    def setUp(self):
+        self.stub = StubDNSResolver()
+        factory = DNSServerFactory(clients=[self.stub])
+        protocol = dns.DNSDatagramProtocol(controller=factory)
+        self.port = reactor.listenUDP(0, protocol, interface='127.0.0.1')
+        server = f'127.0.0.1:{self.port.getHost().port}'
+        self.crawler = get_crawler(settings_dict={
+            'DNS_SERVERS': [server],
+            'DNS_TIMEOUT': 5,
+            'DNS_NEGATIVE_CACHE_TTL': 60,
+        })
+        self.resolver = CachingAsyncResolver.from_crawler(self.crawler, reactor)
+
+    def tearDown(self):
+        return self.port.stopListening()
+
+    @defer.inlineCallbacks
+    def test_ip_address(self):
+        address = yield self.resolver.getHostByName('127.0.0.2')
+        self.assertEqual(address, '127.0.0.2')
+        self.assertEqual(self.stub.queries, [])
+
+    @defer.inlineCallbacks
+    def test_positive_cache(self):
+        address = yield self.resolver.getHostByName('example.com')
+        self.assertEqual(address, '10.0.0.1')
+        address = yield self.resolver.getHostByName('example.com')
+        self.assertEqual(address, '10.0.0.1')
+        self.assertEqual(self.stub.queries, [b'example.com'])
+        self.assertEqual(sum(self.resolver.latency_histogram.values()), 1)
+
+    @defer.inlineCallbacks
+    def test_ttl_expiry(self):
+        yield self.resolver.getHostByName('example.com')
+        expires, address = self.resolver.cache['example.com']
+        self.assertGreater(expires, reactor.seconds() + 290)
+        self.resolver.cache['example.com'] = (reactor.seconds() - 1, address)
+        yield self.resolver.getHostByName('example.com')
+        self.assertEqual(self.stub.queries, [b'example.com', b'example.com'])
+
+    @defer.inlineCallbacks
+    def test_zero_ttl_not_cached(self):
+        address = yield self.resolver.getHostByName('noncached.example.com')
+        self.assertEqual(address, '10.0.0.2')
+        self.assertNotIn('noncached.example.com', self.resolver.cache)
+
+    @defer.inlineCallbacks
+    def test_cname(self):
+        address = yield self.resolver.getHostByName('alias.example.com')
+        self.assertEqual(address, '10.0.0.1')
+        expires, _ = self.resolver.cache['alias.example.com']
+        self.assertLess(expires, reactor.seconds() + 31)
+
+    @defer.inlineCallbacks
+    def test_negative_cache(self):
+        with self.assertRaises(DNSLookupError):
+            yield self.resolver.getHostByName('missing.example.com')
+        with self.assertRaises(DNSLookupError):
+            yield self.resolver.getHostByName('missing.example.com')
+        self.assertEqual(self.stub.queries, [b'missing.example.com'])
+
+    @defer.inlineCallbacks
+    def test_negative_cache_disabled(self):
+        self.resolver.negative_ttl = 0
+        for _ in range(2):
+            with self.assertRaises(DNSLookupError):
+                yield self.resolver.getHostByName('missing.example.com')
+        self.assertEqual(self.stub.queries, [b'missing.example.com'] * 2)
+
+    @defer.inlineCallbacks
+    def test_concurrent_lookups(self):
+        addresses = yield defer.gatherResults([
+            self.resolver.getHostByName('example.com') for _ in range(5)])
+        self.assertEqual(addresses, ['10.0.0.1'] * 5)
+        self.assertEqual(self.stub.queries, [b'example.com'])
+
+    @defer.inlineCallbacks
+    def test_stats(self):
+        self.resolver.latency_buckets = (1000 * 60,)
+        for _ in range(2):
+            yield self.resolver.getHostByName('example.com')
+            with self.assertRaises(DNSLookupError):
+                yield self.resolver.getHostByName('missing.example.com')
+        stats = self.crawler.stats.get_stats()
+        self.assertEqual(stats['dnscache/hit'], 1)
+        self.assertEqual(stats['dnscache/miss'], 2)
+        self.assertEqual(stats['dnscache/negative_hit'], 1)
+        self.assertEqual(stats['dnscache/negative_stored'], 1)
+        self.assertEqual(stats['dns_latency/le_60000ms'], 2)
+
+    def test_stats_crawler_process(self):
+        process = mock.Mock(crawlers={get_crawler(), get_crawler()})
+        resolver = CachingAsyncResolver(reactor, 100, 5, servers=[('127.0.0.1', 53)], crawler=process)
+        resolver._record_latency(10)
+        for crawler in process.crawlers:
+            self.assertEqual(crawler.stats.get_stats(), {'dns_latency/gt_5000ms': 1})
+
+    @defer.inlineCallbacks
+    def test_cache_disabled(self):
+        crawler = get_crawler(settings_dict={
+            'DNS_SERVERS': [f'127.0.0.1:{self.port.getHost().port}'],
+            'DNSCACHE_ENABLED': False,
+        })
+        resolver = CachingAsyncResolver.from_crawler(crawler, reactor)
+        yield resolver.getHostByName('example.com')
+        yield resolver.getHostByName('example.com')
+        self.assertEqual(self.stub.queries, [b'example.com', b'example.com'])
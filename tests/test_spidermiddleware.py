@@ -101,3 +101,63 @@ class ProcessSpiderExceptionReRaise(SpiderMiddlewareTestCase):
         result = self._scrape_response()
         self.assertIsInstance(result, Failure)
         self.assertIsInstance(result.value, ZeroDivisionError)
+
+
+class CompiledChainTest(SpiderMiddlewareTestCase):
+    """Hooks are precomputed, so that middlewares without them are skipped"""
+
+    def setUp(self):
+        super().setUp()
+        self.mwman = SpiderMiddlewareManager()
+
+    def test_missing_hooks(self):
+
+        class OutputMiddleware:
+            def process_spider_output(self, response, result, spider):
+                for r in result:
+                    yield r * 10
+
+        class InputMiddleware:
+            def process_spider_input(self, response, spider):
+                pass
+
+        output_mw = OutputMiddleware()
+        self.mwman._add_middleware(output_mw)
+        self.mwman._add_middleware(InputMiddleware())
+        self.assertEqual(self.mwman._output_methods[0], [(1, output_mw.process_spider_output)])
+        self.assertEqual(self.mwman._exception_methods[0], [])
+
+        result = self.mwman._process_callback_output(self.response, self.spider, iter([1, 2]))
+        self.assertEqual(list(result), [10, 20])
+
+    def test_exceptions_without_handlers(self):
+
+        def callback_output():
+            yield 1
+            raise ZeroDivisionError
+
+        result = self.mwman._process_callback_output(self.response, self.spider, callback_output())
+        self.assertEqual(next(result), 1)
+        self.assertRaises(ZeroDivisionError, next, result)
+
+    def test_recovered_output_order(self):
+
+        class RecoverMiddleware:
+            def process_spider_exception(self, response, exception, spider):
+                return ['recovered']
+
+        class OutputMiddleware:
+            def process_spider_output(self, response, result, spider):
+                for r in result:
+                    yield r * 10
+
+        def callback_output():
+            yield 1
+            raise ZeroDivisionError
+
+        self.mwman._add_middleware(RecoverMiddleware())
+        self.mwman._add_middleware(OutputMiddleware())
+        result = self.mwman._process_callback_output(self.response, self.spider, callback_output())
+        # recovered output does not go through the process_spider_output
+        # method of middlewares closer to the spider
+        self.assertEqual(list(result), [10, 'recovered'])
@@ -176,6 +176,8 @@ class FeedExportConfigTestCase(unittest.TestCase):
             "store_empty": True,
             "uri_params": (1, 2, 3, 4),
             "batch_item_count": 2,
+            "batch_max_size": 0,
+            "batch_interval": 0,
             "item_export_kwargs": dict(),
         })
 
@@ -199,6 +201,8 @@ class FeedExportConfigTestCase(unittest.TestCase):
             "store_empty": True,
             "uri_params": None,
             "batch_item_count": 2,
+            "batch_max_size": 0,
+            "batch_interval": 0,
             "item_export_kwargs": dict(),
         })
 
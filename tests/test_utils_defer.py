@@ -1,10 +1,14 @@
+from concurrent.futures import ThreadPoolExecutor
+
 from twisted.trial import unittest
-from twisted.internet import reactor, defer
+from twisted.internet import reactor, defer, task
 from twisted.python.failure import Failure
 
 from scrapy.utils.defer import (
+    deferred_from_concurrent_future,
     iter_errback,
     mustbe_deferred,
+    parallel,
     process_chain,
     process_chain_both,
     process_parallel,
@@ -93,6 +97,69 @@ class DeferUtilsTest(unittest.TestCase):
         return d
 
 
+class ParallelTest(unittest.TestCase):
+
+    def _callable(self, elem, pending, active):
+        active.append(elem)
+        self.max_active = max(self.max_active, len(active))
+        d = defer.Deferred()
+        d.addCallback(lambda _: active.remove(elem))
+        pending.append(d)
+        return d
+
+    def setUp(self):
+        self.max_active = 0
+
+    @defer.inlineCallbacks
+    def _drain(self, d, pending):
+        while not d.called:
+            if pending:
+                pending.pop(0).callback(None)
+            yield task.deferLater(reactor, 0, lambda: None)
+
+    @defer.inlineCallbacks
+    def test_count(self):
+        pending, active = [], []
+        d = parallel(range(10), 3, self._callable, pending, active)
+        yield self._drain(d, pending)
+        results = yield d
+        self.assertEqual(self.max_active, 3)
+        self.assertEqual(active, [])
+        self.assertEqual(len(pending), 0)
+        self.assertEqual(len(results), 3)
+
+    @defer.inlineCallbacks
+    def test_short_iterable(self):
+        pending, active = [], []
+        d = parallel(range(2), 5, self._callable, pending, active)
+        yield self._drain(d, pending)
+        results = yield d
+        self.assertEqual(self.max_active, 2)
+        self.assertEqual(len(results), 5)
+        self.assertTrue(all(success for success, _ in results))
+
+    @defer.inlineCallbacks
+    def test_empty_iterable(self):
+        results = yield parallel([], 5, self._callable, [], [])
+        self.assertEqual(len(results), 5)
+        self.assertEqual(self.max_active, 0)
+
+
+class DeferredFromConcurrentFutureTest(unittest.TestCase):
+
+    @defer.inlineCallbacks
+    def test_result(self):
+        with ThreadPoolExecutor(1) as executor:
+            result = yield deferred_from_concurrent_future(executor.submit(lambda: 42))
+        self.assertEqual(result, 42)
+
+    @defer.inlineCallbacks
+    def test_exception(self):
+        with ThreadPoolExecutor(1) as executor:
+            dfd = deferred_from_concurrent_future(executor.submit(lambda: 1 / 0))
+            yield self.assertFailure(dfd, ZeroDivisionError)
+
+
 class IterErrbackTest(unittest.TestCase):
 
     def test_iter_errback_good(self):
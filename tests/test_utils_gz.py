@@ -1,4 +1,6 @@
 import unittest
+from gzip import GzipFile
+from io import BytesIO
 from os.path import join
 
 from w3lib.encoding import html_to_unicode
@@ -51,3 +53,36 @@ class GunzipTest(unittest.TestCase):
                 expected_text = o.read().decode("utf-8")
                 self.assertEqual(len(text), len(expected_text))
                 self.assertEqual(text, expected_text)
+
+    def test_gunzip_multiple_members(self):
+        with open(join(SAMPLEDIR, 'feed-sample1.xml.gz'), 'rb') as f:
+            data = f.read()
+        with open(join(SAMPLEDIR, 'feed-sample1.xml'), 'rb') as f:
+            expected = f.read()
+        self.assertEqual(gunzip(data + data), expected + expected)
+        self.assertEqual(gunzip(data + b'\0' * 10 + data), expected + expected)
+
+    def test_gunzip_trailing_garbage(self):
+        with open(join(SAMPLEDIR, 'feed-sample1.xml.gz'), 'rb') as f:
+            data = f.read()
+        with open(join(SAMPLEDIR, 'feed-sample1.xml'), 'rb') as f:
+            expected = f.read()
+        self.assertEqual(gunzip(data + b'garbage'), expected)
+
+    def test_gunzip_header_fields(self):
+        plain = b'<html>' + b'x' * 100000 + b'</html>'
+        f = BytesIO()
+        with GzipFile(filename='page.html', fileobj=f, mode='wb') as zf:
+            zf.write(plain)
+        self.assertEqual(gunzip(f.getvalue()), plain)
+
+    def test_gunzip_truncated_header_raises(self):
+        with open(join(SAMPLEDIR, 'feed-sample1.xml.gz'), 'rb') as f:
+            data = f.read()
+        self.assertRaises(EOFError, gunzip, data[:5])
+
+    def test_gunzip_max_size(self):
+        with open(join(SAMPLEDIR, 'feed-sample1.xml.gz'), 'rb') as f:
+            data = f.read()
+        self.assertEqual(len(gunzip(data, max_size=9950)), 9950)
+        self.assertRaises(ValueError, gunzip, data, max_size=9949)